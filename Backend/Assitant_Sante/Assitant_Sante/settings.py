@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,7 +50,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Métriques par vue exposées sur /metrics (apps/metrics.py) : en tête pour mesurer toute la pile
+    'apps.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Compression gzip / brotli (apps/middleware.py) : avant les middlewares qui lisent ou modifient le corps
+    'apps.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,12 +87,49 @@ WSGI_APPLICATION = 'Assitant_Sante.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profil choisi par DJANGO_DB_ENGINE : 'sqlite' (défaut) ou 'postgres'.
+DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    # Connexions persistantes (CONN_MAX_AGE) vérifiées avant réutilisation ; DJANGO_DB_POOL=True
+    # utilise à la place le pool de psycopg 3 (incompatible avec les connexions persistantes).
+    _pool = os.environ.get('DJANGO_DB_POOL', 'False').lower() == 'true'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'assistant_sante'),
+            'USER': os.environ.get('DJANGO_DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DJANGO_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if _pool else int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': True} if _pool else {},
+        }
     }
-}
+elif DB_ENGINE == 'sqlite':
+    # WAL : les lectures ne bloquent plus les écritures ; synchronous=NORMAL suffit en WAL (pas de
+    # corruption possible, seule la dernière transaction peut être perdue en cas de coupure).
+    # BEGIN IMMEDIATE prend le verrou d'écriture dès le début de la transaction : un écrivain
+    # concurrent attend (timeout) au lieu d'échouer en "database is locked" au milieu d'une transaction.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': int(os.environ.get('DJANGO_SQLITE_TIMEOUT', '20')),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.environ.get('DJANGO_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))};"
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"DJANGO_DB_ENGINE inconnu: {DB_ENGINE!r} (sqlite ou postgres)")
 
 
 # Password validation
@@ -143,6 +186,71 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Pull incrémental (apps/sync.py) : borne haute = maintenant - ce délai (secondes), supérieur à la
+# durée maximale d'une transaction d'écriture, pour ne pas sauter une écriture validée après le pull
+SYNC_PULL_SAFETY_LAG = int(os.environ.get('SYNC_PULL_SAFETY_LAG', '30'))
+
+# Nombre maximal de paquets par requête /api/triage/batch/ (au-delà : 400)
+TRIAGE_BATCH_MAX_RECORDS = int(os.environ.get('TRIAGE_BATCH_MAX_RECORDS', '1000'))
+
+# État des sessions de triage interactif (voir apps/session_store.py).
+# BACKEND : apps.session_store.LocMemSessionStore (LRU en mémoire) ou apps.session_store.RedisSessionStore
+# CHECKPOINT_EVERY : écrire TriageSession en base toutes les N réponses (0 = seulement à la complétion).
+# Avec 1 (défaut), une session absente du store (TTL, LRU, autre worker) reprend depuis la base sans
+# perte ; sinon le client reçoit un 409 et renvoie ses réponses. Plusieurs workers : RedisSessionStore.
+TRIAGE_SESSION_STORE = {
+    'BACKEND': os.environ.get('TRIAGE_SESSION_BACKEND', 'apps.session_store.LocMemSessionStore'),
+    'TTL': int(os.environ.get('TRIAGE_SESSION_TTL', '900')),
+    'CHECKPOINT_EVERY': int(os.environ.get('TRIAGE_SESSION_CHECKPOINT_EVERY', '1')),
+    'OPTIONS': (
+        {'location': os.environ.get('TRIAGE_SESSION_REDIS_URL', 'redis://127.0.0.1:6379/0')}
+        if os.environ.get('TRIAGE_SESSION_BACKEND', '').endswith('RedisSessionStore')
+        else {'max_entries': int(os.environ.get('TRIAGE_SESSION_MAX_ENTRIES', '10000'))}
+    ),
+}
+
+# Détection des flambées par village (apps/outbreaks.py) : surcharge des valeurs par défaut
+OUTBREAK_DETECTION = {
+    'WINDOW_DAYS': 7,
+    'Z_THRESHOLD': 3.0,
+    'CUSUM_H': 4.0,
+}
+
+# Rétention de SyncQueue (apps/retention.py, commande archive_sync_queue)
+SYNC_QUEUE_RETENTION = {
+    'DAYS': int(os.environ.get('SYNC_QUEUE_RETENTION_DAYS', '30')),
+    'ARCHIVE_DIR': Path(os.environ.get('SYNC_QUEUE_ARCHIVE_DIR', BASE_DIR / 'archives' / 'syncqueue')),
+    'CHUNK_SIZE': 1000,
+}
+
+# Compression des réponses (apps/middleware.py) ; brotli utilisé si le module est installé
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+}
+
+# Worker de rejeu des opérations en échec (apps/sync_worker.py, commande run_sync_worker)
+SYNC_WORKER = {
+    'BATCH_SIZE': 100,
+    'BASE_DELAY': 30,    # secondes, doublé à chaque tentative
+    'MAX_DELAY': 3600,
+    'MAX_RETRIES': 8,
+}
+
+# Métriques Prometheus (/metrics) et profilage cProfile des requêtes lentes (apps/metrics.py)
+METRICS = {
+    'ENABLED': os.environ.get('DJANGO_METRICS_ENABLED', 'True').lower() == 'true',
+    # Profilage désactivé sans seuil ; ex. DJANGO_PROFILE_SLOW_MS=500
+    'PROFILE_SLOW_MS': int(os.environ['DJANGO_PROFILE_SLOW_MS']) if os.environ.get('DJANGO_PROFILE_SLOW_MS') else None,
+    'PROFILE_SAMPLE_RATE': float(os.environ.get('DJANGO_PROFILE_SAMPLE_RATE', '0.01')),
+    'PROFILE_DIR': Path(os.environ.get('DJANGO_PROFILE_DIR', BASE_DIR / 'profiles')),
+}
+
+# Arbres de décision JSON partagés avec l'application (voir apps/decision_trees.py)
+DECISION_TREES_DIR = Path(os.environ.get('DECISION_TREES_DIR', BASE_DIR.parent.parent / 'assets' / 'decision_trees'))
+
+# Protocoles de soins partagés avec l'application, indexés pour /api/protocols/search (apps/protocols.py)
+CARE_PROTOCOLS_FILE = Path(os.environ.get('CARE_PROTOCOLS_FILE', BASE_DIR.parent.parent / 'assets' / 'protocols' / 'care_protocols.json'))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'API Assistant Santé',
     'DESCRIPTION': "Backend triage paludisme & gestion données communautaires.",
@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.http import HttpResponse
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from apps.metrics import metrics_view
+
 def home(request):
     return HttpResponse("Bienvenue sur la page d'accueil de votre projet Django")
 
@@ -51,4 +53,5 @@ urlpatterns = [
     path('schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/', include('apps.urls')),  # Vos API ici
     path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    path('metrics', metrics_view, name='metrics'),  # format texte Prometheus (apps/metrics.py)
 ]
@@ -1,10 +1,14 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import BaseRelais, Patient, DiagnosticPaludisme, SyncQueue, TriageSession
+from .models import BaseRelais, Patient, PatientCodeSequence, DiagnosticDailyRollup, DiagnosticPaludisme, OutbreakState, SyncQueue, SyncIdempotencyKey, TriageSession
 
 admin.site.register(BaseRelais)
 admin.site.register(Patient)
+admin.site.register(PatientCodeSequence)
 admin.site.register(DiagnosticPaludisme)
+admin.site.register(DiagnosticDailyRollup)
+admin.site.register(OutbreakState)
 admin.site.register(SyncQueue)
+admin.site.register(SyncIdempotencyKey)
 admin.site.register(TriageSession)
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""Vues asynchrones (ASGI) du triage et de la synchronisation, servies sous /api/async/.
+
+Même contrat que les vues DRF de `apps/views.py` (mêmes serializers, mêmes fonctions métier).
+Sous ASGI (uvicorn), le corps de la requête est reçu par la boucle d'événements avant l'appel
+de la vue : un client mobile lent qui téléverse un lot n'occupe plus de thread pendant l'envoi.
+
+- lectures / créations simples : ORM asynchrone (`acreate`, `afirst`) ;
+- moteur de triage : appel direct (quelques microsecondes, mémoïsé) ;
+- écritures transactionnelles (complétion, sync commit) : `sync_to_async`, car l'ORM
+  asynchrone ne gère pas les transactions.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+
+from .decision_engine import triage
+from .decision_trees import TreeError, get_tree
+from .interactive import SessionStateLost, aload_state, answer_session, first_question, start_session
+from .models import TriageSession
+from .serializers import (
+	InteractiveAnswerSerializer,
+	InteractiveStartSerializer,
+	SyncBatchRequestSerializer,
+	TriageRequestSerializer,
+)
+from .sync import apply_operations, apply_operations_bulk
+
+
+class AsyncJSONView(View):
+	"""Vue asynchrone JSON : validation par `serializer_class`, erreurs au format DRF."""
+	http_method_names = ['post']
+	serializer_class = None
+
+	def validate(self, request):
+		"""(données validées, None) ou (None, réponse d'erreur 400)."""
+		try:
+			payload = json.loads(request.body or b'{}')
+		except ValueError:
+			return None, JsonResponse({'detail': 'JSON invalide'}, status=400)
+		ser = self.serializer_class(data=payload)
+		if not ser.is_valid():
+			return None, JsonResponse(ser.errors, status=400)
+		return ser.validated_data, None
+
+
+class AsyncTriageView(AsyncJSONView):
+	serializer_class = TriageRequestSerializer
+
+	async def post(self, request):
+		data, error = self.validate(request)
+		if error:
+			return error
+		symptoms = data.get('symptomes', {})
+		if not isinstance(symptoms, dict):
+			return JsonResponse({'detail': 'symptomes doit être un objet'}, status=400)
+		poids_val = data.get('poids')
+		rdt_result = data.get('rdt_result')
+		result = triage(symptoms, poids=poids_val, rdt_result=rdt_result)
+		if data.get('save'):
+			session = await TriageSession.objects.acreate(
+				patient_id=data.get('patient'),
+				relais_id=data.get('relais'),
+				symptomes=symptoms,
+				engine_output=result,
+				rdt_result=rdt_result,
+				poids_utilise=poids_val,
+			)
+			result['session_id'] = session.id
+		return JsonResponse(result, status=200)
+
+
+class AsyncInteractiveStartView(AsyncJSONView):
+	serializer_class = InteractiveStartSerializer
+
+	async def post(self, request):
+		data, error = self.validate(request)
+		if error:
+			return error
+		tree = None
+		if data.get('tree'):
+			try:
+				tree = get_tree(data['tree'])
+			except TreeError as e:
+				return JsonResponse({'detail': str(e)}, status=400)
+		session = await TriageSession.objects.acreate(
+			patient_id=data.get('patient'),
+			relais_id=data.get('relais'),
+			symptomes={},
+			engine_output={},
+			rdt_result=data.get('rdt_result'),
+			poids_utilise=data.get('poids'),
+			answered={},
+			tree=tree.key if tree else '',
+		)
+		state = await sync_to_async(start_session, thread_sensitive=False)(session)
+		return JsonResponse(first_question(session.id, state), status=201)
+
+
+class AsyncInteractiveAnswerView(AsyncJSONView):
+	serializer_class = InteractiveAnswerSerializer
+
+	async def post(self, request, session_id: int):
+		data, error = self.validate(request)
+		if error:
+			return error
+		try:
+			state = await aload_state(session_id)
+		except SessionStateLost as e:
+			return JsonResponse(e.payload(), status=409)
+		if state is None:
+			return JsonResponse({'detail': 'Session introuvable'}, status=404)
+		# Store de sessions et écritures de complétion (transaction) en un seul passage dans un thread
+		payload, status_code = await sync_to_async(answer_session)(session_id, state, data)
+		return JsonResponse(payload, status=status_code)
+
+
+class AsyncSyncCommitView(AsyncJSONView):
+	serializer_class = SyncBatchRequestSerializer
+
+	async def post(self, request):
+		data, error = self.validate(request)
+		if error:
+			return error
+		apply = apply_operations_bulk if data.get('bulk') else apply_operations
+		results = await sync_to_async(apply)(data['operations'])
+		return JsonResponse({'results': results}, status=200)
@@ -0,0 +1,82 @@
+"""GET conditionnels (ETag / Last-Modified) pour les listes et détails des ViewSets.
+
+Le validateur d'une collection est calculé par un seul agrégat (COUNT, MAX(updated_at), plus le
+MAX(updated_at) des relations imbriquées dans la représentation) sur le queryset filtré, avant
+toute sérialisation : une ressource inchangée répond 304 sans charger ni sérialiser de lignes. L'ETag couvre aussi le chemin complet (pagination, filtres) et le format
+de rendu. Le nombre de lignes y figure pour qu'une suppression change l'ETag.
+
+Last-Modified ne voit pas les suppressions : pour un client qui n'envoie que If-Modified-Since,
+la date de la dernière tombe du modèle est prise en compte (requête supplémentaire, indexée).
+Les ETags sont faibles (W/) : la représentation varie avec la compression (apps.middleware).
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .models import Tombstone
+
+
+def make_etag(*parts) -> str:
+	digest = hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=12).hexdigest()
+	return f'W/"{digest}"'
+
+
+def latest(*dates):
+	dates = [d for d in dates if d is not None]
+	return max(dates) if dates else None
+
+
+def collection_validators(queryset, related=()) -> tuple:
+	"""(nombre de lignes, MAX(updated_at)) en une requête, relations imbriquées `related` comprises."""
+	agg = queryset.order_by().aggregate(
+		count=Count('pk'), last=Max('updated_at'),
+		**{f'last_{name}': Max(f'{name}__updated_at') for name in related},
+	)
+	return agg['count'], latest(agg['last'], *(agg[f'last_{name}'] for name in related))
+
+
+def last_deletion(model):
+	return Tombstone.objects.filter(model_name=model.__name__).aggregate(last=Max('deleted_at'))['last']
+
+
+class ConditionalGetMixin:
+	"""À placer avant `viewsets.ModelViewSet` : `list` et `retrieve` répondent 304 si rien n'a changé.
+
+	`conditional_related` : relations sérialisées en entier dans la représentation (ex. `patient_detail`).
+	Leur `updated_at` entre dans le validateur, sinon modifier la ligne liée laisserait répondre 304.
+	"""
+	conditional_related = ()
+
+	def conditional(self, request, etag, last_modified, render):
+		response = get_conditional_response(
+			request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None,
+		)
+		if response is None:
+			response = render()
+		if response.status_code in (200, 304):
+			response['ETag'] = etag
+			if last_modified:
+				response['Last-Modified'] = http_date(last_modified.timestamp())
+		return response
+
+	def list(self, request, *args, **kwargs):
+		queryset = self.filter_queryset(self.get_queryset())
+		count, last = collection_validators(queryset, self.conditional_related)
+		etag = make_etag(queryset.model._meta.label, count, last.isoformat() if last else '',
+			request.get_full_path(), request.accepted_renderer.format)
+		if 'HTTP_IF_MODIFIED_SINCE' in request.META and 'HTTP_IF_NONE_MATCH' not in request.META:
+			deleted = last_deletion(queryset.model)
+			if deleted and (last is None or deleted > last):
+				last = deleted
+		return self.conditional(request, etag, last, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+	def retrieve(self, request, *args, **kwargs):
+		instance = self.get_object()
+		last = latest(instance.updated_at, *(
+			getattr(getattr(instance, name), 'updated_at', None) for name in self.conditional_related
+		))
+		etag = make_etag(instance._meta.label, instance.pk, last.isoformat(), request.accepted_renderer.format)
+		return self.conditional(request, etag, last, lambda: Response(self.get_serializer(instance).data))
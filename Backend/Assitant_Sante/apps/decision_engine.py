@@ -31,7 +31,16 @@ Approche de notation : pondérations additives simples normalisées de 0 à 1 pa
 Les signes de danger augmentent le score de PALU_GRAVE et déclenchent une recommandation de renvoi urgent.
 """
 
-from typing import Dict, List, Optional
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore[import]
+except Exception:
+    # NumPy optionnel : sans lui, le triage par lot retombe sur le moteur compilé appel par appel.
+    np = None
 
 HYPOTHESES_DEF = {
     "PALU_SIMPLE": {
@@ -72,6 +81,9 @@ HYPOTHESES_DEF = {
     },
 }
 
+# Version du protocole (pondérations, posologie) ; la changer invalide le cache de triage
+PROTOCOL_VERSION = "v1"
+
 DANGER_SIGNS = ["convulsions", "prostration", "incapacite_a_manger"]
 
 QUESTION_PRIORITIES = [
@@ -160,9 +172,225 @@ def compute_hypotheses(symptoms: Dict, poids: Optional[float] = None, rdt_result
     }
 
 
+class CompiledEngine:
+    """Version compilée (pilotée par tables) de `compute_hypotheses`.
+
+    Les définitions sont transformées une seule fois en vecteurs de poids fixes
+    et en tables d'index de symptômes. Un appel fait une seule passe sur les clés
+    connues pour construire deux masques de bits :
+    - `active` : symptômes pondérés / signes de danger vrais ;
+    - `present` : questions prioritaires déjà renseignées.
+    Les scores triés et les prochaines questions sont ensuite lus dans des tables
+    indexées par masque, remplies à la première rencontre de chaque masque avec
+    exactement la même arithmétique (même ordre d'additions) que
+    `compute_hypotheses`, d'où une sortie identique.
+    """
+
+    def __init__(self, hypotheses_def: Dict, danger_signs: List[str], question_priorities: List[str]):
+        self.codes = tuple(hypotheses_def)
+        self.labels = tuple(hypotheses_def[c]["label"] for c in self.codes)
+        self.bases = tuple(float(hypotheses_def[c]["base"]) for c in self.codes)
+
+        # Table d'index des symptômes influençant le score ou le danger
+        scored: List[str] = []
+        for spec in hypotheses_def.values():
+            for s in list(spec["positive_weights"]) + list(spec["negative_weights"]):
+                if s not in scored:
+                    scored.append(s)
+        for d in danger_signs:
+            if d not in scored:
+                scored.append(d)
+        self.symptom_index = {s: i for i, s in enumerate(scored)}
+
+        # Vecteurs de poids : par hypothèse, (bit du symptôme, poids signé) dans l'ordre de définition
+        self.weight_vectors = tuple(
+            tuple((1 << self.symptom_index[s], w) for s, w in hypotheses_def[c]["positive_weights"].items())
+            + tuple((1 << self.symptom_index[s], -w) for s, w in hypotheses_def[c]["negative_weights"].items())
+            for c in self.codes
+        )
+        self.danger_bits = tuple((1 << self.symptom_index[d], d) for d in danger_signs)
+        self.danger_mask = 0
+        for bit, _ in self.danger_bits:
+            self.danger_mask |= bit
+        self.grave_pos = self.codes.index("PALU_GRAVE") if "PALU_GRAVE" in self.codes else None
+
+        self.question_priorities = tuple(question_priorities)
+        question_bits = {q: 1 << i for i, q in enumerate(self.question_priorities)}
+
+        # Une seule table de clés à parcourir : (clé, bit présence, bit actif)
+        keys = list(self.question_priorities) + [s for s in scored if s not in question_bits]
+        self.key_table = tuple(
+            (k, question_bits.get(k, 0), (1 << self.symptom_index[k]) if k in self.symptom_index else 0)
+            for k in keys
+        )
+
+        # Matrice de poids (symptôme x hypothèse) pour le score vectorisé par lot
+        self.weight_matrix = tuple(
+            tuple(
+                sum(w for bit, w in vector if bit == 1 << j)
+                for vector in self.weight_vectors
+            )
+            for j in range(len(scored))
+        )
+
+        self._score_table: Dict[int, tuple] = {}
+        self._next_table: Dict[int, tuple] = {}
+        self._np_tables = None
+
+    def masks(self, symptoms: Dict) -> tuple:
+        """Retourner (active, present) en une passe sur les clés connues."""
+        active = 0
+        present = 0
+        for key, presence_bit, active_bit in self.key_table:
+            if key in symptoms:
+                present |= presence_bit
+                if active_bit and symptoms[key]:
+                    active |= active_bit
+        return active, present
+
+    def _scores_for(self, active: int) -> tuple:
+        entry = self._score_table.get(active)
+        if entry is not None:
+            return entry
+        scores = []
+        for base, vector in zip(self.bases, self.weight_vectors):
+            score = base
+            for bit, w in vector:
+                if active & bit:
+                    score += w  # a + (-b) == a - b en IEEE 754 : même résultat que compute_hypotheses
+            scores.append(max(score, 0.0))
+        max_score = max(scores) or 1
+        scores = [round(s / max_score, 2) for s in scores]
+        danger = tuple(d for bit, d in self.danger_bits if active & bit)
+        if danger and self.grave_pos is not None:
+            scores[self.grave_pos] = 1.0
+        ranked = [(self.codes[i], self.labels[i], scores[i]) for i in range(len(self.codes))]
+        ranked.sort(key=lambda h: h[2], reverse=True)
+        entry = (tuple(ranked), danger, ranked[0][0] if ranked else None)
+        self._score_table[active] = entry
+        return entry
+
+    def _next_for(self, present: int) -> tuple:
+        entry = self._next_table.get(present)
+        if entry is not None:
+            return entry
+        next_q: List[str] = []
+        for i, q in enumerate(self.question_priorities):
+            if not present & (1 << i):
+                next_q.append(q)
+            if len(next_q) >= 3:
+                break
+        entry = tuple(next_q)
+        self._next_table[present] = entry
+        return entry
+
+    def triage(self, symptoms: Dict, poids: Optional[float] = None, rdt_result: Optional[str] = None) -> Dict:
+        active, present = self.masks(symptoms)
+        ranked, danger, top = self._scores_for(active)
+        return build_output(ranked, danger, top, self._next_for(present), poids, rdt_result)
+
+    def triage_many(self, items: Iterable[Tuple[Dict, Optional[float], Optional[str]]]) -> List[Dict]:
+        """Trier un lot de (symptômes, poids, rdt_result) ; sortie identique à `triage` par élément.
+
+        Avec NumPy, les scores sont calculés en une fois : matrice des symptômes (N x S)
+        multipliée par la matrice de poids (S x H), puis plancher à 0, normalisation par
+        le maximum de chaque ligne, arrondi et forçage de PALU_GRAVE appliqués par colonne.
+        """
+        items = list(items)
+        if np is None or not items:
+            return [self.triage(sym, poids=poids, rdt_result=rdt) for sym, poids, rdt in items]
+
+        bases, weights, danger_cols = self._numpy_tables()
+        masks = [self.masks(sym) for sym, _, _ in items]
+        active = np.array([a for a, _ in masks], dtype=np.int64)
+        x = ((active[:, None] >> np.arange(weights.shape[0])) & 1).astype(float)
+
+        raw = np.maximum(x @ weights + bases, 0.0)
+        max_score = raw.max(axis=1)
+        max_score[max_score == 0] = 1
+        scores = np.round(raw / max_score[:, None], 2)
+        danger_rows = x[:, danger_cols].any(axis=1)
+        if self.grave_pos is not None:
+            scores[danger_rows, self.grave_pos] = 1.0
+        order = np.argsort(-scores, axis=1, kind="stable")
+
+        results = []
+        for row, (sym, poids, rdt) in enumerate(items):
+            a, present = masks[row]
+            ranked = tuple(
+                (self.codes[h], self.labels[h], float(scores[row, h]))
+                for h in order[row].tolist()
+            )
+            danger = tuple(d for bit, d in self.danger_bits if a & bit)
+            top = ranked[0][0] if ranked else None
+            results.append(build_output(ranked, danger, top, self._next_for(present), poids, rdt))
+        return results
+
+    def _numpy_tables(self):
+        if self._np_tables is None:
+            danger_cols = [bit.bit_length() - 1 for bit, _ in self.danger_bits]
+            self._np_tables = (
+                np.array(self.bases, dtype=float),
+                np.array(self.weight_matrix, dtype=float).reshape(len(self.symptom_index), len(self.codes)),
+                np.array(danger_cols, dtype=np.int64),
+            )
+        return self._np_tables
+
+
+def build_output(ranked, danger, top, next_q, poids: Optional[float], rdt_result: Optional[str]) -> Dict:
+    """Construire un dictionnaire de sortie neuf (mutable par l'appelant) à partir des tables."""
+    dosage = None
+    if danger:
+        recommendation = "Référer immédiatement au centre de santé (signes de gravité)."
+    elif rdt_result == "POS" and top in ("PALU_SIMPLE", "PALU_GRAVE"):
+        recommendation = "Initier traitement ACT selon poids." if top == "PALU_SIMPLE" else "Référer (paludisme grave) après mesures initiales."
+        if poids:
+            dosage = compute_act_dosage(poids)
+    elif top in ("PALU_SIMPLE", "PALU_GRAVE"):
+        recommendation = "Effectuer un test RDT pour confirmer le paludisme."
+    else:
+        recommendation = "Continuer l'évaluation clinique et surveiller la fièvre."
+
+    return {
+        "hypotheses": [{"code": c, "label": l, "score": s} for c, l, s in ranked],
+        "danger_signs": list(danger),
+        "next_questions": list(next_q),
+        "recommendation": recommendation,
+        "dosage": dosage,
+    }
+
+
+ENGINE = CompiledEngine(HYPOTHESES_DEF, DANGER_SIGNS, QUESTION_PRIORITIES)
+
+
+# Temps moteur cumulé de la requête en cours ([secondes]), posé par apps.metrics ; None hors requête instrumentée
+ENGINE_TIME: ContextVar = ContextVar("engine_time", default=None)
+
+
+def timed(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        total = ENGINE_TIME.get()
+        if total is None:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            total[0] += time.perf_counter() - started
+    return wrapper
+
+
+@timed
 def triage(symptoms: Dict, poids: Optional[float] = None, rdt_result: Optional[str] = None) -> Dict:
-    """Point d'entrée public pour le classement par priorité."""
-    return compute_hypotheses(symptoms, poids=poids, rdt_result=rdt_result)
+    """Point d'entrée public pour le classement par priorité (moteur compilé)."""
+    return ENGINE.triage(symptoms, poids=poids, rdt_result=rdt_result)
+
+
+@timed
+def triage_batch(items: Iterable[Tuple[Dict, Optional[float], Optional[str]]]) -> List[Dict]:
+    """Triage par lot (vectorisé avec NumPy si disponible)."""
+    return ENGINE.triage_many(items)
 
 
 def compute_act_dosage(poids: float) -> Dict:
@@ -0,0 +1,407 @@
+"""Interpréteur serveur des arbres de décision JSON de l'application (assets/decision_trees).
+
+Chaque fichier est analysé une seule fois en un graphe immuable de `Node` : transitions
+précalculées (réponse -> nœud suivant, recherche O(1)), règles et branches compilées en tuples.
+Les graphes sont mis en cache par (fichier, version) et rechargés quand le mtime du fichier change.
+
+Sémantique alignée sur l'application Flutter (`DecisionEngine`, `diagnosis_screen.dart`) :
+- les nœuds `action` et `logic` avancent automatiquement ; `logic` applique ses règles (drapeaux) ;
+- un nœud `decision` choisit la première branche vraie (drapeau, réponse, score, défaut) ;
+- le score calculé vient du bloc `scoring` de l'arbre s'il existe, sinon des règles `score_add`.
+
+État d'une évaluation (sérialisable JSON) :
+{"tree": "malaria", "version": "1.0", "node": "<id>", "answers": {...}, "flags": [...], "score": 0}
+"""
+import json
+import operator
+import os
+import re
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+
+class TreeError(ValueError):
+	pass
+
+
+COMPARATORS = (
+	('>=', operator.ge),
+	('<=', operator.le),
+	('==', operator.eq),
+	('>', operator.gt),
+	('<', operator.lt),
+)
+
+# Clé de fichier (`<clé>_tree.json`) : jamais de séparateur ni de « .. » venus du client
+TREE_KEY_RE = re.compile(r'[a-z0-9_]+')
+
+AUTO_NODE_TYPES = ('action', 'logic')
+TERMINAL_NODE_TYPES = ('outcome', 'decision')
+
+
+def compile_comparison(expr):
+	"""'>=38' -> prédicat ; une valeur non textuelle est comparée par égalité."""
+	if isinstance(expr, str):
+		for prefix, op in COMPARATORS:
+			if expr.startswith(prefix):
+				threshold = float(expr[len(prefix):])
+				return lambda v: isinstance(v, (int, float)) and not isinstance(v, bool) and op(v, threshold)
+	return lambda v: v == expr
+
+
+class Node(NamedTuple):
+	id: str
+	type: str
+	text: Optional[str]
+	input_type: Optional[str]
+	options: tuple
+	range: Optional[tuple]
+	next: Optional[str]
+	transitions: MappingProxyType
+	rules: tuple
+	branches: tuple
+	outcome: Optional[str]
+
+	def describe(self) -> dict:
+		"""Représentation envoyée au client pour poser la question."""
+		return {
+			'id': self.id,
+			'type': self.type,
+			'text': self.text,
+			'input': self.input_type,
+			'options': list(self.options),
+			'range': list(self.range) if self.range else None,
+		}
+
+
+class CompiledTree:
+
+	def __init__(self, key: str, raw: dict):
+		self.key = key
+		self.version = str(raw.get('version', ''))
+		self.disease = raw.get('disease', key)
+		self.outcomes = MappingProxyType({k: MappingProxyType(dict(v)) for k, v in raw.get('outcomes', {}).items()})
+		raw_nodes = raw.get('nodes', {})
+		self.nodes = MappingProxyType({nid: self._compile_node(nid, spec, raw_nodes) for nid, spec in raw_nodes.items()})
+		self.root = raw.get('root')
+		self.scoring = self._compile_scoring(raw.get('scoring'), raw_nodes)
+		self._check()
+
+	# --- compilation -----------------------------------------------------
+
+	def _compile_node(self, nid, spec, raw_nodes) -> Node:
+		node_type = spec.get('type')
+		input_spec = spec.get('input') or {}
+		input_type = 'multi_select' if node_type == 'multi_select' else input_spec.get('type')
+		options = spec.get('options') or input_spec.get('options') or []
+		options = tuple(o['code'] if isinstance(o, dict) else o for o in options)
+		next_spec = spec.get('next')
+		transitions = MappingProxyType(dict(next_spec)) if isinstance(next_spec, dict) else MappingProxyType({})
+		return Node(
+			id=nid,
+			type=node_type,
+			text=spec.get('text'),
+			input_type=input_type,
+			options=options,
+			range=tuple(input_spec['range']) if input_spec.get('range') else None,
+			next=next_spec if isinstance(next_spec, str) else None,
+			transitions=transitions,
+			rules=tuple(self._compile_rule(r, raw_nodes) for r in spec.get('rules', [])),
+			branches=tuple(self._compile_branch(b, raw_nodes) for b in spec.get('branches', [])),
+			outcome=spec.get('outcome'),
+		)
+
+	@staticmethod
+	def _answer_key(name, raw_nodes):
+		# Les arbres référencent parfois une mesure par son nom court (muac -> measure_muac)
+		if name in raw_nodes:
+			return name
+		matches = [nid for nid in raw_nodes if nid.endswith(f'_{name}')]
+		return matches[0] if len(matches) == 1 else name
+
+	def _compile_rule(self, rule, raw_nodes):
+		"""Règle -> (prédicat(selected, answers), drapeau, score_add)."""
+		if 'if_any_symptom' in rule:
+			codes = frozenset(rule['if_any_symptom'])
+			predicate = lambda selected, answers: not codes.isdisjoint(selected)
+		elif 'if_symptom' in rule:
+			code = rule['if_symptom']
+			predicate = lambda selected, answers: code in selected
+		elif 'if_count_symptoms' in rule:
+			spec = rule['if_count_symptoms']
+			codes, minimum = frozenset(spec.get('symptoms', [])), int(spec.get('min', 1))
+			predicate = lambda selected, answers: len(codes & selected) >= minimum
+		elif 'if_answer' in rule or 'if' in rule:
+			conditions = []
+			for name, expr in (rule.get('if_answer') or rule.get('if')).items():
+				if name == 'symptom_in':
+					conditions.append((None, expr))
+				else:
+					conditions.append((self._answer_key(name, raw_nodes), compile_comparison(expr)))
+			predicate = lambda selected, answers: all(
+				(test in selected) if key is None else test(answers.get(key)) for key, test in conditions
+			)
+		else:
+			predicate = lambda selected, answers: False
+		return predicate, rule.get('set_flag'), rule.get('score_add', 0)
+
+	def _compile_branch(self, branch, raw_nodes):
+		"""Branche -> (prédicat(flags, answers, score), outcome)."""
+		if 'when_flag' in branch:
+			flag = branch['when_flag']
+			predicate = lambda flags, answers, score: flag in flags
+		elif 'when' in branch:
+			tests = []
+			for name, expr in branch['when'].items():
+				test = compile_comparison(expr)
+				if name == 'computed_score':
+					tests.append((None, test))
+				else:
+					tests.append((self._answer_key(name, raw_nodes), test))
+			predicate = lambda flags, answers, score: all(
+				test(score if key is None else answers.get(key)) for key, test in tests
+			)
+		elif branch.get('default'):
+			predicate = lambda flags, answers, score: True
+		else:
+			predicate = lambda flags, answers, score: False
+		return predicate, branch.get('outcome')
+
+	def _compile_scoring(self, scoring, raw_nodes):
+		if not scoring:
+			return None
+		weights = scoring.get('weights', {})
+		overrides, additions, symptoms = [], [], MappingProxyType(dict(weights.get('symptom', {})))
+		for name, table in weights.items():
+			if name == 'symptom':
+				continue
+			key = self._answer_key(name, raw_nodes)
+			compiled = tuple((compile_comparison(expr), value) for expr, value in table.items())
+			# Température : la valeur du plus haut seuil atteint remplace le score (comme l'application)
+			(overrides if name == 'temperature_value' else additions).append((key, compiled))
+		return int(scoring.get('base', 0)), tuple(overrides), tuple(additions), symptoms
+
+	def _check(self):
+		if self.root not in self.nodes:
+			raise TreeError(f"{self.key}: racine inconnue {self.root!r}")
+		for node in self.nodes.values():
+			targets = ([node.next] if node.next else []) + list(node.transitions.values())
+			for target in targets:
+				if target not in self.nodes:
+					raise TreeError(f"{self.key}: {node.id} -> nœud inconnu {target!r}")
+			outcomes = [node.outcome] if node.outcome else []
+			outcomes += [outcome for _, outcome in node.branches]
+			for outcome in outcomes:
+				if outcome not in self.outcomes:
+					raise TreeError(f"{self.key}: {node.id} -> issue inconnue {outcome!r}")
+
+	# --- évaluation ------------------------------------------------------
+
+	def initial_state(self) -> dict:
+		state = {'tree': self.key, 'version': self.version, 'node': self.root, 'answers': {}, 'flags': [], 'score': 0}
+		self._advance(state)
+		return state
+
+	def replay(self, answers: dict) -> dict:
+		"""Reconstruire l'état en rejouant des réponses depuis la racine (ex. après expiration du store)."""
+		state = self.initial_state()
+		while not self.is_terminal(state) and state['node'] in answers:
+			self.answer(state, state['node'], answers[state['node']])
+		return state
+
+	def current(self, state) -> Node:
+		return self.nodes[state['node']]
+
+	def is_terminal(self, state) -> bool:
+		return self.current(state).type in TERMINAL_NODE_TYPES
+
+	def answer(self, state, question, raw_value) -> None:
+		"""Valider la réponse au nœud courant puis avancer jusqu'à la prochaine question ou la fin."""
+		node = self.current(state)
+		if node.type in TERMINAL_NODE_TYPES:
+			raise ValueError('Évaluation déjà terminée')
+		if question != node.id:
+			raise ValueError(f'Question attendue: {node.id}')
+		value = self.coerce(node, raw_value)
+		state['answers'][node.id] = value
+		if node.transitions:
+			state['node'] = node.transitions.get(str(value).lower(), node.next)
+		else:
+			state['node'] = node.next
+		if state['node'] is None:
+			raise TreeError(f'{self.key}: pas de transition depuis {node.id} pour {value!r}')
+		self._advance(state)
+
+	def coerce(self, node: Node, raw_value):
+		from .interactive import to_bool, to_number
+		if node.input_type == 'boolean':
+			return to_bool(raw_value)
+		if node.input_type == 'numeric':
+			value = to_number(raw_value)
+			if node.range and not node.range[0] <= value <= node.range[1]:
+				raise ValueError(f'Valeur hors plage {node.range[0]}-{node.range[1]}')
+			return value
+		if node.input_type == 'multi_select':
+			values = raw_value.split(',') if isinstance(raw_value, str) else raw_value
+			if not isinstance(values, list):
+				raise ValueError('Liste de codes attendue')
+			values = [str(v).strip() for v in values if str(v).strip()]
+			unknown = [v for v in values if v not in node.options]
+			if unknown:
+				raise ValueError(f'Options inconnues: {", ".join(unknown)}')
+			return values
+		if node.options and raw_value not in node.options:
+			raise ValueError(f'Option inconnue: {raw_value}')
+		return raw_value
+
+	def _advance(self, state) -> None:
+		node = self.current(state)
+		while node.type in AUTO_NODE_TYPES:
+			if node.type == 'logic':
+				self._apply_rules(node, state)
+			state['node'] = node.next
+			node = self.current(state)
+
+	def _selected(self, answers) -> frozenset:
+		"""Codes cochés : listes multi_select, choix simples et questions booléennes répondues oui."""
+		selected = set()
+		for key, value in answers.items():
+			if isinstance(value, list):
+				selected.update(value)
+			elif value is True:
+				selected.add(key)
+			elif isinstance(value, str):
+				selected.add(value)
+		return frozenset(selected)
+
+	def _apply_rules(self, node, state) -> None:
+		selected = self._selected(state['answers'])
+		flags = set(state['flags'])
+		for predicate, flag, score_add in node.rules:
+			if predicate(selected, state['answers']):
+				if flag:
+					flags.add(flag)
+				state['score'] += score_add
+		state['flags'] = sorted(flags)
+
+	def computed_score(self, state) -> int:
+		if self.scoring is None:
+			return state['score']
+		base, overrides, additions, symptoms = self.scoring
+		answers = state['answers']
+		score = base
+		for key, table in overrides:
+			for test, value in table:
+				if test(answers.get(key)):
+					score = value
+		for key, table in additions:
+			for test, value in table:
+				if test(answers.get(key)):
+					score += value
+		for code in self._selected(answers):
+			score += symptoms.get(code, 0)
+		return score
+
+	def result(self, state) -> dict:
+		"""Issue finale : nœud `outcome` direct ou première branche vraie du nœud `decision`."""
+		node = self.current(state)
+		score = self.computed_score(state)
+		outcome_key = node.outcome
+		if node.type == 'decision':
+			flags = set(state['flags'])
+			outcome_key = next((o for predicate, o in node.branches if predicate(flags, state['answers'], score)), None)
+		outcome = dict(self.outcomes.get(outcome_key, {'label': 'Indéterminé', 'urgency': 'unknown', 'action': 'Revoir les données'}))
+		return {
+			'tree': self.key,
+			'version': self.version,
+			'disease': self.disease,
+			'outcome': outcome_key,
+			**outcome,
+			'flags': list(state['flags']),
+			'computed_score': score,
+		}
+
+
+class TreeRegistry:
+	"""Cache des arbres compilés par (fichier, version), rechargés quand le mtime change."""
+
+	def __init__(self, directory):
+		self.directory = Path(directory)
+		self._files = {}    # clé -> (mtime_ns, version)
+		self._compiled = {}  # (clé, version) -> CompiledTree
+		self._aliases = None
+		self._lock = threading.Lock()
+
+	def path_for(self, key) -> Path:
+		return self.directory / f'{key}_tree.json'
+
+	def keys(self) -> list:
+		return sorted(p.name[:-len('_tree.json')] for p in self.directory.glob('*_tree.json'))
+
+	def resolve(self, name) -> Optional[str]:
+		"""Accepter la clé de fichier (malaria) ou le champ `disease` (paludisme)."""
+		if TREE_KEY_RE.fullmatch(name) and self.path_for(name).exists():
+			return name
+		if self._aliases is None:
+			aliases = {}
+			for key in self.keys():
+				try:
+					aliases[self.get(key).disease] = key
+				except TreeError:
+					continue  # fichier illisible jamais chargé : pas d'alias
+			self._aliases = aliases
+		return self._aliases.get(name)
+
+	def get(self, key) -> CompiledTree:
+		"""Arbre compilé de `key`. Un fichier modifié mais invalide n'interrompt pas le service :
+		la dernière version valide reste servie jusqu'à la prochaine modification du fichier."""
+		if not TREE_KEY_RE.fullmatch(key):
+			raise TreeError(f'Arbre inconnu: {key}')
+		path = self.path_for(key)
+		try:
+			mtime = os.stat(path).st_mtime_ns
+		except FileNotFoundError:
+			raise TreeError(f'Arbre inconnu: {key}')
+		cached = self._files.get(key)
+		if cached and cached[0] == mtime:
+			return self._compiled[(key, cached[1])]
+		with self._lock:
+			cached = self._files.get(key)
+			if cached and cached[0] == mtime:
+				return self._compiled[(key, cached[1])]
+			try:
+				with open(path, encoding='utf-8') as fh:
+					tree = CompiledTree(key, json.load(fh))
+			except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+				if not cached:
+					raise TreeError(f'Arbre invalide: {key} ({e})') from e
+				# garder l'ancienne version, sans relire le fichier tant que son mtime ne change pas
+				self._files[key] = (mtime, cached[1])
+				return self._compiled[(key, cached[1])]
+			self._compiled[(key, tree.version)] = tree
+			self._files[key] = (mtime, tree.version)
+			self._aliases = None
+			return tree
+
+
+_registry = None
+
+
+def get_registry() -> TreeRegistry:
+	global _registry
+	directory = getattr(settings, 'DECISION_TREES_DIR')
+	if _registry is None or _registry.directory != Path(directory):
+		_registry = TreeRegistry(directory)
+	return _registry
+
+
+def get_tree(name) -> CompiledTree:
+	registry = get_registry()
+	key = registry.resolve(name)
+	if key is None:
+		raise TreeError(f'Arbre inconnu: {name}')
+	return registry.get(key)
@@ -0,0 +1,80 @@
+"""Exports complets en flux (NDJSON / CSV, gzip optionnel) des diagnostics et sessions de triage.
+
+Les lignes sont lues par `.values(...).iterator(chunk_size=...)` (curseur serveur, pas
+d'instances de modèle ni de liste en mémoire), encodées une à une puis regroupées en blocs
+d'environ `FLUSH_BYTES` avant d'être envoyées : la mémoire reste constante quelle que soit
+la taille de l'export.
+"""
+import zlib
+
+from django.db.models import F
+
+from .models import DiagnosticPaludisme, TriageSession
+
+
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+# jeu de données -> (modèle, colonne de date pour les filtres, colonnes exportées)
+# Le patient est exporté par son code anonymisé et son village, jamais par son nom.
+EXPORTS = {
+	'diagnostics': (DiagnosticPaludisme, 'date', (
+		'id', 'date', 'updated_at', 'patient_id', 'patient_code', 'village', 'relais_id',
+		'classification', 'test_type', 'test_result', 'symptomes', 'danger_signs', 'recommendation',
+		'protocol_version',
+	)),
+	'triages': (TriageSession, 'created_at', (
+		'id', 'created_at', 'updated_at', 'patient_id', 'patient_code', 'village', 'relais_id',
+		'tree', 'rdt_result', 'poids_utilise', 'completed', 'symptomes', 'answered', 'engine_output',
+		'final_output',
+	)),
+}
+RELATED_COLUMNS = {'patient_code': F('patient__code'), 'village': F('patient__village')}
+
+
+def export_queryset(dataset, start=None, end=None, village=None, classification=None):
+	"""(queryset de dictionnaires, colonnes) pour un jeu de données et ses filtres."""
+	model, date_field, columns = EXPORTS[dataset]
+	queryset = model.objects.all()
+	if start:
+		queryset = queryset.filter(**{f'{date_field}__date__gte': start})
+	if end:
+		queryset = queryset.filter(**{f'{date_field}__date__lte': end})
+	# Une colonne du modèle prime sur la relation : le village d'un diagnostic est celui enregistré à sa création
+	own = {f.name for f in model._meta.concrete_fields}
+	related = {name: expr for name, expr in RELATED_COLUMNS.items() if name not in own}
+	if village:
+		queryset = queryset.filter(**{'village' if 'village' in own else 'patient__village': village})
+	if classification:
+		queryset = queryset.filter(classification=classification)
+	fields = [c for c in columns if c not in related]
+	return queryset.order_by('id').values(*fields, **related), columns
+
+
+def stream_rows(queryset, columns, renderer, compress=False, chunk_size=CHUNK_SIZE):
+	"""Générateur de blocs d'octets (compressés gzip à la volée si `compress`)."""
+	gzip = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+	parts, size = [], 0
+
+	def flush():
+		data = ''.join(parts).encode('utf-8')
+		parts.clear()
+		return gzip.compress(data) if gzip else data
+
+	header = renderer.encode_header(columns)
+	if header:
+		parts.append(header)
+	for row in queryset.iterator(chunk_size=chunk_size):
+		line = renderer.encode_row(columns, row)
+		parts.append(line)
+		size += len(line)
+		if size >= FLUSH_BYTES:
+			block = flush()
+			size = 0
+			if block:
+				yield block
+	block = flush()
+	if gzip:
+		block += gzip.flush()
+	if block:
+		yield block
@@ -0,0 +1,369 @@
+"""Triage interactif : validation des réponses, état de session et écriture en base.
+
+L'état d'une session en cours vit dans le store de sessions (`apps.session_store`) ;
+`TriageSession` est réécrite à la complétion et tous les `CHECKPOINT_EVERY` réponses
+(1 par défaut : écriture à chaque réponse).
+
+Si le store ne connaît pas une session en cours (TTL, éviction LRU, requête servie par un autre
+processus), l'état est reconstruit depuis la base. C'est sans perte seulement si la base est écrite
+à chaque réponse. Sinon `SessionStateLost` est levée (409) avec les réponses connues en base, pour
+que le client renvoie les siennes au lieu de poursuivre sur un état incomplet.
+"""
+import copy
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from .decision_engine import PROTOCOL_VERSION, is_completed, next_question, triage
+from .decision_trees import get_tree
+from .models import DiagnosticPaludisme, TriageSession
+from .rollups import record_diagnostics
+from .session_store import checkpoint_every, get_session_store
+
+
+# Validation & conversion des types attendus
+QUESTION_TYPES = {
+	'fievre': 'bool',
+	'frissons': 'bool',
+	'temperature': 'number',
+	'duree_fievre_jours': 'number',
+	'convulsions': 'bool',
+	'prostration': 'bool',
+	'incapacite_a_manger': 'bool',
+	'toux': 'bool',
+	'diarrhee': 'bool',
+	'vomissements': 'bool',
+	'paludisme_recent': 'bool',
+}
+
+
+def to_bool(v):
+	if isinstance(v, bool):
+		return v
+	if isinstance(v, str):
+		if v.lower() in ['true','1','oui','vrai','yes','y']:
+			return True
+		if v.lower() in ['false','0','non','faux','no','n']:
+			return False
+	if isinstance(v, (int, float)):
+		return bool(v)
+	raise ValueError('Valeur bool invalide')
+
+
+def to_number(v):
+	if isinstance(v, (int,float)):
+		return float(v)
+	if isinstance(v, str):
+		return float(v.replace(',', '.'))
+	raise ValueError('Valeur numérique invalide')
+
+
+def coerce_answer(question, raw_value):
+	"""Convertir la réponse au type attendu ; ValueError si question inconnue ou valeur invalide."""
+	expected_type = QUESTION_TYPES.get(question)
+	if expected_type is None:
+		raise ValueError(f'Question inconnue: {question}')
+	if expected_type == 'bool':
+		return to_bool(raw_value)
+	return to_number(raw_value)
+
+
+def state_from_session(session) -> dict:
+	return {
+		'patient_id': session.patient_id,
+		'relais_id': session.relais_id,
+		'poids': float(session.poids_utilise) if session.poids_utilise is not None else None,
+		'rdt_result': session.rdt_result,
+		'answered': session.answered or {},
+		'symptomes': session.symptomes or {},
+		'completed': session.completed,
+		'final_output': session.final_output,
+		'pending': 0,
+		'tree': session.tree or None,
+	}
+
+
+def start_session(session) -> dict:
+	state = state_from_session(session)
+	if state['tree']:
+		state['tree_state'] = get_tree(state['tree']).initial_state()
+	get_session_store().set(session.id, state)
+	return state
+
+
+class SessionStateLost(Exception):
+	"""État absent du store et base possiblement en retard : le client doit renvoyer ses réponses."""
+
+	def __init__(self, session_id, answered):
+		super().__init__(f'État de la session {session_id} perdu')
+		self.answered = answered
+
+	def payload(self) -> dict:
+		return {
+			'detail': "État de session perdu : renvoyer toutes les réponses (champ `answers`).",
+			'answered': self.answered,
+		}
+
+
+def recover_state(session) -> dict:
+	"""État reconstruit depuis la base après un défaut du store."""
+	state = state_from_session(session)
+	if not state['completed'] and checkpoint_every() != 1:
+		# Réponses depuis le dernier checkpoint inconnues : repartir des réponses en base, le client complète
+		get_session_store().set(session.id, state)
+		raise SessionStateLost(session.id, state['answered'])
+	return state
+
+
+def load_state(session_id):
+	"""État depuis le store ; à défaut (expiré, autre processus) depuis la base. None si inconnue.
+
+	Lève SessionStateLost si la base peut être en retard sur les réponses données.
+	"""
+	state = get_session_store().get(session_id)
+	if state is not None:
+		return state
+	session = TriageSession.objects.filter(id=session_id).first()
+	return recover_state(session) if session else None
+
+
+async def aload_state(session_id):
+	"""Variante asynchrone de `load_state` (le store peut bloquer sur le réseau : exécuté hors de la boucle)."""
+	state = await sync_to_async(get_session_store().get, thread_sensitive=False)(session_id)
+	if state is not None:
+		return state
+	session = await TriageSession.objects.filter(id=session_id).afirst()
+	return await sync_to_async(recover_state, thread_sensitive=False)(session) if session else None
+
+
+def apply_answers(state, answers) -> tuple:
+	"""Appliquer des réponses déjà converties, dans l'ordre, jusqu'à la complétion.
+
+	Retourne (nombre appliqué, questions ignorées après la complétion, terminé).
+	"""
+	answered = state['answered']
+	symptomes = state['symptomes']
+	for n, (question, value) in enumerate(answers, start=1):
+		# Enregistrer la réponse et mettre à jour le snapshot des symptômes (symptômes cumulés)
+		answered[question] = value
+		symptomes[question] = value
+		if is_completed(answered):
+			return n, [q for q, _ in answers[n:]], True
+	return len(answers), [], False
+
+
+class AnswerError(ValueError):
+	def __init__(self, question, message):
+		super().__init__(message)
+		self.question = question
+
+
+class TreeChanged(Exception):
+	"""Arbre modifié sans changement de version : le nœud courant de la session n'existe plus (409)."""
+
+	def __init__(self, key, node):
+		super().__init__(f"Arbre {key} modifié : le nœud {node!r} n'existe plus")
+		self.key = key
+		self.node = node
+
+	def payload(self) -> dict:
+		return {
+			'detail': "Arbre de décision modifié pendant la session : recommencer l'évaluation.",
+			'tree': self.key,
+			'node': self.node,
+		}
+
+
+def load_tree(state) -> tuple:
+	"""(arbre compilé, état d'évaluation) ; l'état est rejoué depuis les réponses s'il manque ou si l'arbre a changé.
+
+	Lève TreeChanged si le fichier a été modifié sans changer de version et que le nœud courant a disparu.
+	"""
+	tree = get_tree(state['tree'])
+	tree_state = state.get('tree_state')
+	if tree_state is None or tree_state.get('version') != tree.version:
+		tree_state = tree.replay(state['answered'])
+	elif tree_state['node'] not in tree.nodes:
+		raise TreeChanged(tree.key, tree_state['node'])
+	return tree, tree_state
+
+
+def apply_tree_answers(state, pairs) -> tuple:
+	"""Appliquer des réponses brutes à une session d'arbre, toutes ou aucune.
+
+	Retourne (arbre, nombre appliqué, questions ignorées après la fin, terminé) ; AnswerError si une réponse est invalide.
+	"""
+	tree, tree_state = load_tree(state)
+	work = copy.deepcopy(tree_state)
+	applied = 0
+	for question, raw_value in pairs:
+		if tree.is_terminal(work):
+			break
+		try:
+			tree.answer(work, question, raw_value)
+		except ValueError as e:
+			raise AnswerError(question, str(e))
+		applied += 1
+	state['tree_state'] = work
+	state['answered'] = dict(work['answers'])
+	state['symptomes'] = dict(work['answers'])
+	return tree, applied, [q for q, _ in pairs[applied:]], tree.is_terminal(work)
+
+
+def save_state(session_id, state, engine_output, answers=1) -> None:
+	"""Conserver l'état dans le store et l'écrire en base tous les `CHECKPOINT_EVERY` réponses."""
+	every = checkpoint_every()
+	state['pending'] = state.get('pending', 0) + answers
+	if every and state['pending'] >= every:
+		TriageSession.objects.filter(id=session_id).update(
+			answered=state['answered'],
+			symptomes=state['symptomes'],
+			engine_output=engine_output,
+			updated_at=timezone.now(),
+		)
+		state['pending'] = 0
+	get_session_store().set(session_id, state)
+
+
+def complete_session(session_id, state, result) -> None:
+	"""Écriture en base unique à la complétion, puis libération de l'état."""
+	state['completed'] = True
+	state['final_output'] = result
+	TriageSession.objects.filter(id=session_id).update(
+		answered=state['answered'],
+		symptomes=state['symptomes'],
+		engine_output=result,
+		final_output=result,
+		completed=True,
+		updated_at=timezone.now(),
+	)
+	get_session_store().delete(session_id)
+
+
+def create_diagnostic(state, result):
+	"""Créer le DiagnosticPaludisme si palu suspecté. Retourne (créé, erreur)."""
+	hypotheses = result.get('hypotheses', [])
+	top_code = hypotheses[0]['code'] if hypotheses else None
+	if top_code not in ['PALU_SIMPLE','PALU_GRAVE']:
+		return False, None
+	classification = 'GRAVE' if (top_code == 'PALU_GRAVE' or result.get('danger_signs')) else 'SIMPLE'
+	try:
+		with transaction.atomic():
+			diag = DiagnosticPaludisme.objects.create(
+				patient_id=state['patient_id'],
+				relais_id=state['relais_id'],
+				symptomes=state['symptomes'],
+				test_type='RDT' if state['rdt_result'] else 'NONE',
+				test_result=state['rdt_result'],
+				classification=classification,
+				danger_signs={'signs': result.get('danger_signs', [])},
+				recommendation=result.get('recommendation'),
+				protocol_version=PROTOCOL_VERSION,
+			)
+			record_diagnostics([diag])
+	except Exception as diag_err:
+		return False, str(diag_err)
+	return True, None
+
+
+def first_question(session_id, state) -> dict:
+	"""Réponse au démarrage : identifiant de session et première question (nœud décrit pour un arbre)."""
+	if state.get('tree'):
+		tree, tree_state = load_tree(state)
+		node = tree.current(tree_state)
+		return {'session_id': session_id, 'question': node.id, 'node': node.describe()}
+	return {'session_id': session_id, 'question': next_question(state['answered'])}
+
+
+def answer_session(session_id, state, data) -> tuple:
+	"""Appliquer une réponse (`question`/`value`) ou une liste (`answers`) ; retourne (réponse, statut HTTP).
+
+	Partagé par les vues synchrones (DRF) et asynchrones (apps/async_views.py).
+	"""
+	if state['completed']:
+		return {'detail': 'Session déjà terminée', 'final_output': state['final_output']}, 200
+
+	many = 'answers' in data
+	pairs = [(a['question'], a.get('value')) for a in data['answers']] if many else [(data.get('question'), data.get('value'))]
+	if not pairs or pairs[0][0] is None:
+		return {'detail': 'question requise'}, 400
+	if state.get('tree'):
+		return answer_tree(session_id, state, pairs, many)
+
+	# Valider toutes les réponses avant d'en appliquer une seule
+	answers = []
+	for question, raw_value in pairs:
+		try:
+			answers.append((question, coerce_answer(question, raw_value)))
+		except ValueError as e:
+			return ({'detail': str(e), 'question': question} if many else {'detail': str(e)}), 400
+
+	applied, ignored, completed_flag = apply_answers(state, answers)
+	extra = {'applied': applied, 'ignored': ignored} if many else {}
+	symptomes = state['symptomes']
+
+	# Un seul appel au moteur, après la dernière réponse appliquée
+	if completed_flag:
+		result = triage(symptomes, poids=state['poids'], rdt_result=state['rdt_result'])
+		complete_session(session_id, state, result)
+
+		# Auto création DiagnosticPaludisme si palu suspecté
+		created, diag_error = create_diagnostic(state, result)
+		response = {
+			'completed': True,
+			'final_output': result,
+			'session_id': session_id,
+			'diagnostic_created': created,
+			**extra,
+		}
+		if diag_error:
+			# On retourne quand même le résultat, mais avec info erreur diag
+			response['diagnostic_error'] = diag_error
+		return response, 200
+
+	# aperçu des hypothèses provisoires
+	preview = triage(symptomes, poids=state['poids'], rdt_result=state['rdt_result'])
+	next_q = next_question(state['answered'])
+	save_state(session_id, state, preview, answers=applied)
+	return {
+		'completed': False,
+		'next_question': next_q,
+		'preview_hypotheses': preview.get('hypotheses'),
+		'danger_signs': preview.get('danger_signs'),
+		'session_id': session_id,
+		**extra,
+	}, 200
+
+
+def answer_tree(session_id, state, pairs, many) -> tuple:
+	"""Session sur arbre JSON : transitions de l'arbre, pas de DiagnosticPaludisme créé."""
+	try:
+		tree, applied, ignored, completed_flag = apply_tree_answers(state, pairs)
+	except TreeChanged as e:
+		return e.payload(), 409
+	except AnswerError as e:
+		return ({'detail': str(e), 'question': e.question} if many else {'detail': str(e)}), 400
+	extra = {'applied': applied, 'ignored': ignored} if many else {}
+	tree_state = state['tree_state']
+	if completed_flag:
+		result = tree.result(tree_state)
+		complete_session(session_id, state, result)
+		return {
+			'completed': True,
+			'final_output': result,
+			'session_id': session_id,
+			'diagnostic_created': False,
+			**extra,
+		}, 200
+	node = tree.current(tree_state)
+	save_state(session_id, state, {'tree': tree.key, 'node': node.id}, answers=applied)
+	return {
+		'completed': False,
+		'next_question': node.id,
+		'node': node.describe(),
+		'preview_hypotheses': [],
+		'danger_signs': [],
+		'session_id': session_id,
+		**extra,
+	}, 200
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.retention import SyncQueueArchiver, vacuum
+
+
+class Command(BaseCommand):
+	help = "Archiver (NDJSON gzip, un fichier par jour) puis supprimer les lignes SyncQueue synchronisées anciennes."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--days', type=int, help="Âge minimal des lignes archivées (défaut : SYNC_QUEUE_RETENTION['DAYS'])")
+		parser.add_argument('--archive-dir', help="Dossier des archives (défaut : SYNC_QUEUE_RETENTION['ARCHIVE_DIR'])")
+		parser.add_argument('--chunk-size', type=int, help="Lignes supprimées par transaction")
+		parser.add_argument('--dry-run', action='store_true', help="Compter sans écrire ni supprimer")
+		parser.add_argument('--vacuum', action='store_true', help="VACUUM après suppression (SQLite : bloque la base pendant l'opération)")
+
+	def handle(self, *args, **options):
+		archiver = SyncQueueArchiver(
+			days=options['days'],
+			archive_dir=options['archive_dir'],
+			chunk_size=options['chunk_size'],
+			dry_run=options['dry_run'],
+		)
+		started = time.perf_counter()
+		archiver.run()
+		if options['vacuum'] and archiver.rows and not options['dry_run']:
+			vacuum()
+		elapsed = time.perf_counter() - started
+
+		verb = "à archiver" if options['dry_run'] else "archivée(s) et supprimée(s)"
+		self.stdout.write(
+			f"{archiver.rows} ligne(s) synchronisée(s) de plus de {archiver.days} jour(s) {verb} en {elapsed:.2f}s : "
+			f"{archiver.payload_bytes / 1024:,.1f} Ko de données, {archiver.archive_bytes / 1024:,.1f} Ko compressés "
+			f"dans {len(archiver.files)} fichier(s)"
+		)
+		if archiver.files:
+			self.stdout.write(self.style.SUCCESS(f"Archives : {archiver.archive_dir}"))
@@ -0,0 +1,40 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.registry_import import DEFAULT_CHUNK_SIZE, RegistryImporter, guess_format, open_text, read_rows
+
+
+class Command(BaseCommand):
+	help = "Importer en masse des relais ou des patients depuis un fichier CSV ou NDJSON (éventuellement .gz)."
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help="Fichier à importer (.csv, .ndjson, .jsonl, éventuellement .gz)")
+		parser.add_argument('--model', choices=['relais', 'patients'], default='patients')
+		parser.add_argument('--format', choices=['csv', 'ndjson'], help="Défaut : d'après l'extension")
+		parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+		parser.add_argument('--errors', help="Rapport d'erreurs CSV (défaut : <fichier>.errors.csv si erreurs)")
+		parser.add_argument('--dry-run', action='store_true', help="Valider sans écrire en base")
+
+	def handle(self, *args, **options):
+		path = Path(options['path'])
+		if not path.exists():
+			raise CommandError(f"Fichier introuvable: {path}")
+		importer = RegistryImporter(options['model'], chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+		started = time.perf_counter()
+		with open_text(path) as fh:
+			importer.run(read_rows(fh, options['format'] or guess_format(path)))
+		elapsed = time.perf_counter() - started
+
+		self.stdout.write(
+			f"{importer.read} ligne(s) lues, {importer.created} créée(s), {importer.skipped} déjà présente(s), "
+			f"{len(importer.errors)} erreur(s) en {elapsed:.2f}s ({importer.read / elapsed if elapsed else 0:,.0f} lignes/s)"
+		)
+		if importer.errors:
+			report = Path(options['errors'] or f"{path}.errors.csv")
+			with open(report, 'w', encoding='utf-8', newline='') as fh:
+				importer.write_errors(fh)
+			self.stdout.write(self.style.WARNING(f"Rapport d'erreurs : {report}"))
+		elif not options['dry_run']:
+			self.stdout.write(self.style.SUCCESS("Import terminé sans erreur"))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.rollups import rebuild
+
+
+class Command(BaseCommand):
+	help = "Recalculer les agrégats journaliers (DiagnosticDailyRollup) depuis DiagnosticPaludisme."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--since', help="Premier jour à recalculer (AAAA-MM-JJ) ; défaut : tout l'historique")
+		parser.add_argument('--until', help="Dernier jour à recalculer (AAAA-MM-JJ)")
+
+	def handle(self, *args, **options):
+		bounds = {}
+		for name in ('since', 'until'):
+			if options[name]:
+				bounds[name] = parse_date(options[name])
+				if bounds[name] is None:
+					raise CommandError(f"--{name} : date invalide {options[name]!r}")
+		started = time.perf_counter()
+		rows = rebuild(**bounds)
+		self.stdout.write(self.style.SUCCESS(f"{rows} ligne(s) d'agrégat écrites en {time.perf_counter() - started:.2f}s"))
@@ -0,0 +1,47 @@
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.sync_worker import SyncWorker
+
+
+class Command(BaseCommand):
+	help = "Rejouer en continu les opérations SyncQueue en échec (backoff exponentiel, plusieurs processus possibles)."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, help="Lignes réservées par lot (défaut : SYNC_WORKER['BATCH_SIZE'])")
+		parser.add_argument('--once', action='store_true', help="Vider ce qui est éligible puis s'arrêter")
+		parser.add_argument('--poll-interval', type=float, help="Attente quand la file est vide (secondes)")
+		parser.add_argument('--metrics-file', help="Fichier de métriques Prometheus (textfile) ; {pid} est remplacé par le PID")
+
+	def handle(self, *args, **options):
+		worker = SyncWorker(batch_size=options['batch_size'])
+		poll = options['poll_interval'] or worker.conf['POLL_INTERVAL']
+		metrics_file = options['metrics_file'].format(pid=os.getpid()) if options['metrics_file'] else None
+		stopping = []
+		for sig in (signal.SIGINT, signal.SIGTERM):
+			signal.signal(sig, lambda *_: stopping.append(True))
+
+		while not stopping:
+			claimed = worker.run_once()
+			if metrics_file:
+				worker.write_metrics(metrics_file)
+			if claimed:
+				continue
+			if options['once']:
+				break
+			close_old_connections()
+			# Attente interruptible : SIGTERM arrête le worker sans attendre la fin du délai
+			deadline = time.monotonic() + poll
+			while not stopping and time.monotonic() < deadline:
+				time.sleep(min(0.2, poll))
+
+		m = worker.metrics()
+		self.stdout.write(
+			f"{m['processed']} ligne(s) rejouée(s) : {m['succeeded']} réussie(s), {m['failed']} en échec "
+			f"dont {m['abandoned']} abandonnée(s) ; file : {m['queue_pending']} en attente, {m['queue_ready']} éligible(s), "
+			f"{m['queue_dead']} morte(s) ({m['rows_per_second']:,.1f} lignes/s)"
+		)
@@ -0,0 +1,240 @@
+"""Métriques par vue (format texte Prometheus) et profilage cProfile des requêtes lentes.
+
+`MetricsMiddleware` mesure chaque requête, étiquetée par le nom d'URL résolu (`apps/urls.py`) :
+latence, nombre et durée des requêtes SQL, taille de la réponse et temps passé dans le moteur de
+triage (`decision_engine.ENGINE_TIME`). Les requêtes SQL sont comptées par un `execute_wrapper`
+posé sur chaque connexion (`signals.install_query_timer`). Il ne coûte qu'une lecture de ContextVar
+hors requête instrumentée et suit les vues async, dont les accès base passent par `sync_to_async`.
+
+Les compteurs vivent dans le processus : avec plusieurs workers gunicorn, chaque worker expose les
+siens sur `/metrics`. Prometheus doit alors scraper chaque worker, ou un seul worker doit tourner.
+
+Profilage (désactivé par défaut) : avec `PROFILE_SLOW_MS`, une fraction `PROFILE_SAMPLE_RATE` des
+requêtes synchrones est exécutée sous cProfile. Le profil est écrit dans `PROFILE_DIR` (.prof,
+lisible par snakeviz ou flameprof) si la requête a dépassé le seuil.
+"""
+import cProfile
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+from .decision_engine import ENGINE_TIME
+
+
+DEFAULTS = {
+	'ENABLED': True,
+	'PROFILE_SLOW_MS': None,  # ex. 500 : profiler les requêtes échantillonnées plus lentes
+	'PROFILE_SAMPLE_RATE': 0.01,
+	'PROFILE_DIR': 'profiles',
+}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ENGINE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Requêtes SQL de la requête HTTP en cours : [nombre, secondes]
+QUERY_STATS: ContextVar = ContextVar('query_stats', default=None)
+
+
+def metrics_settings() -> dict:
+	return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def time_queries(execute, sql, params, many, context):
+	"""`execute_wrapper` de connexion : cumule nombre et durée des requêtes SQL de la requête HTTP."""
+	stats = QUERY_STATS.get()
+	if stats is None:
+		return execute(sql, params, many, context)
+	started = time.perf_counter()
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		stats[0] += 1
+		stats[1] += time.perf_counter() - started
+
+
+class Histogram:
+	__slots__ = ('bounds', 'counts', 'sum')
+
+	def __init__(self, bounds):
+		self.bounds = bounds
+		self.counts = [0] * (len(bounds) + 1)  # dernier = +Inf
+		self.sum = 0.0
+
+	def observe(self, value):
+		self.counts[bisect_left(self.bounds, value)] += 1
+		self.sum += value
+
+	def lines(self, name, labels):
+		cumulative = 0
+		for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+			cumulative += count
+			yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+		yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+		yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+class Registry:
+	"""Compteurs et histogrammes par vue, protégés par un verrou (une prise par requête)."""
+
+	FAMILIES = (
+		('assistant_http_request_duration_seconds', 'histogram', 'Durée des requêtes HTTP par vue.', 'latency'),
+		('assistant_db_queries_per_request', 'histogram', 'Requêtes SQL par requête HTTP.', 'queries'),
+		('assistant_http_response_size_bytes', 'histogram', 'Taille des réponses (hors flux).', 'sizes'),
+		('assistant_engine_duration_seconds', 'histogram', 'Temps passé dans le moteur de triage par requête.', 'engine'),
+	)
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		self.requests = {}
+		self.db_seconds = {}
+		self.latency = {}
+		self.queries = {}
+		self.sizes = {}
+		self.engine = {}
+		self.profiles = 0
+
+	def histogram(self, family, key, bounds):
+		hist = family.get(key)
+		if hist is None:
+			hist = family[key] = Histogram(bounds)
+		return hist
+
+	def observe(self, view, method, status, seconds, queries, db_seconds, size, engine_seconds):
+		with self._lock:
+			key = (view, method, str(status))
+			self.requests[key] = self.requests.get(key, 0) + 1
+			self.db_seconds[view] = self.db_seconds.get(view, 0.0) + db_seconds
+			self.histogram(self.latency, (view, method), LATENCY_BUCKETS).observe(seconds)
+			self.histogram(self.queries, (view,), QUERY_BUCKETS).observe(queries)
+			if size is not None:
+				self.histogram(self.sizes, (view,), SIZE_BUCKETS).observe(size)
+			if engine_seconds:
+				self.histogram(self.engine, (view,), ENGINE_BUCKETS).observe(engine_seconds)
+
+	def render(self) -> str:
+		with self._lock:
+			lines = [
+				'# HELP assistant_http_requests_total Requêtes HTTP par vue, méthode et statut.',
+				'# TYPE assistant_http_requests_total counter',
+			]
+			lines += [f'assistant_http_requests_total{{view="{v}",method="{m}",status="{s}"}} {n}'
+				for (v, m, s), n in sorted(self.requests.items())]
+			lines += [
+				'# HELP assistant_db_query_duration_seconds_total Temps cumulé des requêtes SQL par vue.',
+				'# TYPE assistant_db_query_duration_seconds_total counter',
+			]
+			lines += [f'assistant_db_query_duration_seconds_total{{view="{v}"}} {s:.6f}' for v, s in sorted(self.db_seconds.items())]
+			for name, kind, help_text, attr in self.FAMILIES:
+				lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+				for key, hist in sorted(getattr(self, attr).items()):
+					labels = f'view="{key[0]}"' + (f',method="{key[1]}"' if len(key) > 1 else '')
+					lines += hist.lines(name, labels)
+			lines += [
+				'# HELP assistant_profiles_written_total Profils cProfile écrits pour des requêtes lentes.',
+				'# TYPE assistant_profiles_written_total counter',
+				f'assistant_profiles_written_total {self.profiles}',
+			]
+		return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def view_label(request) -> str:
+	match = getattr(request, 'resolver_match', None)
+	if match is None:
+		return 'unmatched'  # 404 de résolution : pas de chemin brut en étiquette (cardinalité bornée)
+	return match.url_name or match.route or 'unnamed'
+
+
+def response_size(response):
+	if response.streaming:
+		return None
+	return len(response.content)
+
+
+def metrics_view(request):
+	return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+	"""À placer en tête de MIDDLEWARE : la latence couvre toute la pile et la taille est celle envoyée."""
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		conf = metrics_settings()
+		if not conf['ENABLED']:
+			raise MiddlewareNotUsed
+		self.get_response = get_response
+		self.profile_slow = conf['PROFILE_SLOW_MS'] / 1000 if conf['PROFILE_SLOW_MS'] is not None else None
+		self.profile_rate = conf['PROFILE_SAMPLE_RATE']
+		self.profile_dir = Path(conf['PROFILE_DIR'])
+		self.async_mode = iscoroutinefunction(get_response)
+		if self.async_mode:
+			markcoroutinefunction(self)
+
+	def start(self):
+		return QUERY_STATS.set([0, 0.0]), ENGINE_TIME.set([0.0])
+
+	def finish(self, request, response, started, tokens):
+		elapsed = time.perf_counter() - started
+		queries, engine = QUERY_STATS.get(), ENGINE_TIME.get()
+		QUERY_STATS.reset(tokens[0])
+		ENGINE_TIME.reset(tokens[1])
+		view = view_label(request)
+		if view != 'metrics':
+			REGISTRY.observe(view, request.method, response.status_code, elapsed, queries[0], queries[1],
+				response_size(response), engine[0])
+		return view, elapsed
+
+	def __call__(self, request):
+		if self.async_mode:
+			return self.__acall__(request)
+		tokens = self.start()
+		profiler = None
+		if self.profile_slow is not None and random.random() < self.profile_rate:
+			profiler = cProfile.Profile()
+			try:
+				profiler.enable()
+			except ValueError:  # un autre profileur est déjà actif
+				profiler = None
+		started = time.perf_counter()
+		try:
+			response = self.get_response(request)
+		finally:
+			if profiler is not None:
+				profiler.disable()
+		view, elapsed = self.finish(request, response, started, tokens)
+		if profiler is not None and elapsed >= self.profile_slow:
+			self.dump_profile(profiler, view, elapsed)
+		return response
+
+	async def __acall__(self, request):
+		tokens = self.start()
+		started = time.perf_counter()
+		response = await self.get_response(request)
+		self.finish(request, response, started, tokens)
+		return response
+
+	def dump_profile(self, profiler, view, elapsed):
+		self.profile_dir.mkdir(parents=True, exist_ok=True)
+		name = f'{time.strftime("%Y%m%d-%H%M%S")}-{view}-{elapsed * 1000:.0f}ms-{threading.get_ident()}.prof'
+		profiler.dump_stats(self.profile_dir / name)
+		with REGISTRY._lock:
+			REGISTRY.profiles += 1
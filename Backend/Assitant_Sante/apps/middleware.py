@@ -0,0 +1,103 @@
+"""Compression des réponses (brotli si le module est installé et accepté par le client, sinon gzip).
+
+Seules les réponses d'au moins `MIN_SIZE` octets sont compressées. Les réponses déjà
+compressées ne le sont pas une seconde fois : en-tête Content-Encoding présent, ou type déjà
+compressé (export `?gzip=true` servi en application/gzip). Les réponses en flux (exports)
+sont compressées bloc par bloc.
+"""
+import gzip
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+	import brotli
+except ImportError:  # dépendance facultative : gzip seul
+	brotli = None
+
+
+DEFAULTS = {
+	'MIN_SIZE': 1024,
+	'GZIP_LEVEL': 6,
+	'BROTLI_QUALITY': 5,  # 4-6 : bon compromis taux / temps CPU pour du JSON servi à la volée
+}
+
+COMPRESSED_TYPES = ('application/gzip', 'application/x-gzip', 'application/zip', 'image/', 'audio/', 'video/')
+
+
+def compression_settings() -> dict:
+	return {**DEFAULTS, **getattr(settings, 'RESPONSE_COMPRESSION', {})}
+
+
+def accepted_encodings(header: str) -> set:
+	accepted = set()
+	for item in header.split(','):
+		name, _, params = item.strip().partition(';')
+		params = params.replace(' ', '')
+		if name and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+			accepted.add(name.lower())
+	return accepted
+
+
+def choose_encoding(request):
+	accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+	if brotli is not None and 'br' in accepted:
+		return 'br'
+	if 'gzip' in accepted:
+		return 'gzip'
+	return None
+
+
+def compress(data: bytes, encoding, conf) -> bytes:
+	if encoding == 'br':
+		return brotli.compress(data, quality=conf['BROTLI_QUALITY'])
+	return gzip.compress(data, compresslevel=conf['GZIP_LEVEL'], mtime=0)
+
+
+def compress_stream(chunks, encoding, conf):
+	if encoding == 'br':
+		compressor = brotli.Compressor(quality=conf['BROTLI_QUALITY'])
+		for chunk in chunks:
+			block = compressor.process(chunk)
+			if block:
+				yield block
+		yield compressor.finish()
+		return
+	compressor = zlib.compressobj(conf['GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+	for chunk in chunks:
+		block = compressor.compress(chunk)
+		if block:
+			yield block
+	yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+
+	def process_response(self, request, response):
+		if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+			return response
+		if response.get('Content-Type', '').startswith(COMPRESSED_TYPES):
+			return response
+		patch_vary_headers(response, ('Accept-Encoding',))
+		encoding = choose_encoding(request)
+		if encoding is None:
+			return response
+		conf = compression_settings()
+
+		if response.streaming:
+			if getattr(response, 'is_async', False):
+				return response
+			response.streaming_content = compress_stream(response.streaming_content, encoding, conf)
+			del response['Content-Length']
+		else:
+			if len(response.content) < conf['MIN_SIZE']:
+				return response
+			compressed = compress(response.content, encoding, conf)
+			if len(compressed) >= len(response.content):
+				return response
+			response.content = compressed
+			response['Content-Length'] = str(len(compressed))
+		response['Content-Encoding'] = encoding
+		return response
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0003_sync_pull_indexes_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncIdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=128, unique=True)),
+                ('model_name', models.CharField(max_length=50)),
+                ('operation', models.CharField(max_length=10)),
+                ('result', models.JSONField()),
+                ('date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0004_sync_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientCodeSequence',
+            fields=[
+                ('relais', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='apps.baserelais')),
+                ('next_value', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0005_patient_code_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='triagesession',
+            name='tree',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
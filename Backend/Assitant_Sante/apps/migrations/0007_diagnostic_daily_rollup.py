@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0006_triage_session_tree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosticDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('village', models.CharField(max_length=100)),
+                ('classification', models.CharField(choices=[('SIMPLE', 'Paludisme simple'), ('GRAVE', 'Paludisme grave'), ('NON_SUSPECT', 'Non suspect')], max_length=12)),
+                ('total', models.IntegerField(default=0)),
+                ('rdt_tested', models.IntegerField(default=0)),
+                ('rdt_positive', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('relais', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.baserelais')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='apps_diagno_day_64c21a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'village', 'relais', 'classification'), name='unique_daily_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0007_diagnostic_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutbreakState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village', models.CharField(max_length=100, unique=True)),
+                ('state', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0008_outbreak_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diagnosticpaludisme',
+            index=models.Index(fields=['-date', '-id'], name='diag_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosticpaludisme',
+            index=models.Index(fields=['patient', '-date'], name='diag_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosticpaludisme',
+            index=models.Index(fields=['relais', '-date'], name='diag_relais_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='syncqueue',
+            index=models.Index(fields=['-date'], name='syncqueue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='syncqueue',
+            index=models.Index(fields=['synced', 'date'], name='syncqueue_synced_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='syncqueue',
+            index=models.Index(condition=models.Q(('synced', False)), fields=['date'], name='syncqueue_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='triagesession',
+            index=models.Index(fields=['-created_at'], name='triage_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='triagesession',
+            index=models.Index(fields=['patient', '-created_at'], name='triage_patient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='triagesession',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['created_at'], name='triage_open_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0009_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncqueue',
+            name='idempotency_key',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:27
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_patient_village(apps, schema_editor):
+    DiagnosticPaludisme = apps.get_model('apps', 'DiagnosticPaludisme')
+    Patient = apps.get_model('apps', 'Patient')
+    DiagnosticPaludisme.objects.update(
+        village=Subquery(Patient.objects.filter(id=OuterRef('patient_id')).values('village')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0010_sync_queue_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosticpaludisme',
+            name='village',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(copy_patient_village, migrations.RunPython.noop),
+    ]
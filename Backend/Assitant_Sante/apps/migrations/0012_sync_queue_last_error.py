@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0011_diagnostic_village'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncqueue',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
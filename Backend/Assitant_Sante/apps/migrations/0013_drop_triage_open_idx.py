@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0012_sync_queue_last_error'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='triagesession',
+            name='triage_open_idx',
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
 
 
 SEXE_CHOICES = [
@@ -27,7 +28,7 @@ class BaseRelais(models.Model):
     nom = models.CharField(max_length=100)
     village = models.CharField(max_length=100)
     telephone = models.CharField(max_length=20)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"BaseRelais {self.nom} ({self.village})"
@@ -42,12 +43,56 @@ class Patient(models.Model):
     relais = models.ForeignKey(BaseRelais, on_delete=models.CASCADE)
     poids_kg = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     date_creation = models.DateTimeField(auto_now_add=True, db_index=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Patient {self.nom}"
 
 
+class PatientCodeSequence(models.Model):
+    """Compteur de codes patient par relais : `P{relais}-{n}` alloué en O(1), sans COUNT ni collision.
+
+    L'incrément se fait par un UPDATE atomique (verrou de ligne jusqu'au commit) ; les créations
+    en lot réservent un bloc de `count` numéros en un seul appel.
+    """
+    relais = models.OneToOneField(BaseRelais, on_delete=models.CASCADE, primary_key=True)
+    next_value = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"PatientCodeSequence relais={self.relais_id} next={self.next_value}"
+
+    @staticmethod
+    def format_code(relais_id, value) -> str:
+        return f"P{relais_id}-{value}"
+
+    @classmethod
+    def allocate(cls, relais_id, count=1) -> range:
+        """Réserver `count` numéros consécutifs pour ce relais et retourner leur intervalle."""
+        with transaction.atomic():
+            if not cls.objects.filter(relais_id=relais_id).update(next_value=F('next_value') + count):
+                start = cls._first_free_value(relais_id)
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(relais_id=relais_id, next_value=start + count)
+                    return range(start, start + count)
+                except IntegrityError:
+                    # Compteur créé par une transaction concurrente entre-temps
+                    cls.objects.filter(relais_id=relais_id).update(next_value=F('next_value') + count)
+            end = cls.objects.filter(relais_id=relais_id).values_list('next_value', flat=True).get()
+            return range(end - count, end)
+
+    @classmethod
+    def _first_free_value(cls, relais_id) -> int:
+        # Amorçage unique par relais : reprendre après les codes déjà attribués (ancien schéma COUNT+1)
+        prefix = cls.format_code(relais_id, '')
+        highest = 0
+        for code in Patient.objects.filter(code__startswith=prefix).values_list('code', flat=True).iterator():
+            suffix = code[len(prefix):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest + 1
+
+
 class DiagnosticPaludisme(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
     relais = models.ForeignKey(BaseRelais, on_delete=models.CASCADE)
@@ -58,13 +103,65 @@ class DiagnosticPaludisme(models.Model):
     danger_signs = models.JSONField(default=dict, blank=True)
     recommendation = models.TextField()
     protocol_version = models.CharField(max_length=20, default="v1")
+    # village du patient au moment du diagnostic : clé des agrégats journaliers, stable si le patient déménage
+    village = models.CharField(max_length=100, blank=True, default="")
     date = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # liste paginée par curseur (-date, -id) ; filtres de date des exports et de rebuild_rollups
+            models.Index(fields=["-date", "-id"], name="diag_date_id_idx"),
+            # dernier diagnostic d'un patient (latest_for_patient), historique d'un relais
+            models.Index(fields=["patient", "-date"], name="diag_patient_date_idx"),
+            models.Index(fields=["relais", "-date"], name="diag_relais_date_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.village and self.patient_id:
+            self.village = self.patient.village
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Diag {self.patient_id} {self.classification} {self.date.date()}"
 
 
+class DiagnosticDailyRollup(models.Model):
+    """Compteurs journaliers pré-agrégés (jour x village du diagnostic x relais x classification) pour /api/stats/.
+
+    Tenus à jour de façon incrémentale à chaque écriture de diagnostic (voir apps/rollups.py),
+    reconstruits par `python manage.py rebuild_rollups`.
+    """
+    day = models.DateField()
+    village = models.CharField(max_length=100)
+    relais = models.ForeignKey(BaseRelais, on_delete=models.CASCADE)
+    classification = models.CharField(max_length=12, choices=PALU_CLASSIFICATION_CHOICES)
+    # Entiers signés : une décrémentation (suppression) ne doit jamais échouer sur une contrainte
+    total = models.IntegerField(default=0)
+    rdt_tested = models.IntegerField(default=0)  # résultat RDT POS ou NEG
+    rdt_positive = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "village", "relais", "classification"], name="unique_daily_rollup"),
+        ]
+        indexes = [models.Index(fields=["day"])]
+
+    def __str__(self):
+        return f"Rollup {self.day} {self.village} {self.relais_id} {self.classification}={self.total}"
+
+
+class OutbreakState(models.Model):
+    """Instantané de l'état du détecteur de flambées d'un village (voir apps/outbreaks.py)."""
+    village = models.CharField(max_length=100, unique=True)
+    state = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"OutbreakState {self.village}"
+
+
 class SyncQueue(models.Model):
     model_name = models.CharField(max_length=50)
     object_id = models.CharField(max_length=50)
@@ -72,14 +169,37 @@ class SyncQueue(models.Model):
     data = models.JSONField()
     synced = models.BooleanField(default=False)
     retry_count = models.PositiveSmallIntegerField(default=0)
+    # clé d'idempotence de l'opération en échec : le rejeu par le worker l'enregistre dans SyncIdempotencyKey
+    idempotency_key = models.CharField(max_length=128, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")  # message du dernier échec (commit ou rejeu)
     last_attempt_at = models.DateTimeField(null=True, blank=True)
     date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-date"], name="syncqueue_date_idx"),
+            models.Index(fields=["synced", "date"], name="syncqueue_synced_date_idx"),
+            # file d'attente à rejouer : seules les lignes non synchronisées, peu nombreuses, sont indexées
+            models.Index(fields=["date"], condition=Q(synced=False), name="syncqueue_pending_idx"),
+        ]
+
     def __str__(self):
         return f"Sync {self.model_name} {self.object_id} synced={self.synced}"
 
 
+class SyncIdempotencyKey(models.Model):
+    """Registre des clés d'idempotence de /api/sync/commit/ : un lot rejoué renvoie le résultat stocké."""
+    key = models.CharField(max_length=128, unique=True)
+    model_name = models.CharField(max_length=50)
+    operation = models.CharField(max_length=10)
+    result = models.JSONField()
+    date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Idempotency {self.key} {self.model_name} {self.operation}"
+
+
 class TriageSession(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.SET_NULL, null=True, blank=True)
     relais = models.ForeignKey(BaseRelais, on_delete=models.SET_NULL, null=True, blank=True)
@@ -90,10 +210,25 @@ class TriageSession(models.Model):
     answered = models.JSONField(default=dict)  # incremental answers
     completed = models.BooleanField(default=False)
     final_output = models.JSONField(null=True, blank=True)
+    tree = models.CharField(max_length=50, blank=True, default='')  # arbre JSON (apps/decision_trees.py), vide = moteur paludisme
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at"], name="triage_created_idx"),
+            models.Index(fields=["patient", "-created_at"], name="triage_patient_created_idx"),
+        ]
 
     def __str__(self):
         return f"Triage {self.id} patient={self.patient_id}"
 
 
+class Tombstone(models.Model):
+    """Trace d'une suppression, servie aux clients par le pull incrémental (/api/sync/pull/)."""
+    model_name = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Tombstone {self.model_name} {self.object_id}"
@@ -0,0 +1,234 @@
+"""Détection incrémentale des flambées de paludisme par village.
+
+Pour chaque village, un état compact (quelques nombres) est tenu dans une ligne `OutbreakState` :
+- le compte de cas suspects (SIMPLE / GRAVE) du jour en cours ;
+- une fenêtre glissante des `WINDOW_DAYS` derniers jours terminés ;
+- une ligne de base EWMA (moyenne et variance des comptes journaliers) ;
+- une CUSUM unilatérale des écarts standardisés à cette ligne de base.
+
+Chaque jour terminé est intégré une seule fois dans la ligne de base (passage au jour suivant).
+Les alertes sont évaluées à la lecture en O(villages) :
+- `spike` : le compte du jour dépasse la ligne de base de `Z_THRESHOLD` écarts-types ;
+- `cusum` : la CUSUM, jour en cours inclus, dépasse `CUSUM_H`.
+
+Le détecteur est alimenté après commit par `apps.rollups.record_diagnostics` (toutes les créations
+de diagnostics). L'état d'un village vit dans sa ligne `OutbreakState`, partagée par tous les
+workers : chaque lot la relit sous `select_for_update`, l'avance et la réécrit dans la même
+transaction. Un village sans ligne est initialisé en rejouant ses agrégats journaliers.
+"""
+import math
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DiagnosticDailyRollup, OutbreakState
+
+
+CASE_CLASSIFICATIONS = ('SIMPLE', 'GRAVE')
+
+DEFAULTS = {
+	'WINDOW_DAYS': 7,
+	'EWMA_LAMBDA': 0.3,
+	'MIN_BASELINE_DAYS': 7,  # pas d'alerte avant cette durée d'historique
+	'MIN_CASES': 3,          # pas de pic en dessous de ce nombre de cas dans la journée
+	'Z_THRESHOLD': 3.0,
+	'CUSUM_K': 0.5,
+	'CUSUM_H': 4.0,
+}
+
+# Au-delà, une période sans cas a fait converger la ligne de base : inutile d'intégrer plus de zéros
+MAX_FOLDED_GAP = 60
+
+
+def outbreak_settings() -> dict:
+	return {**DEFAULTS, **getattr(settings, 'OUTBREAK_DETECTION', {})}
+
+
+class VillageState:
+	__slots__ = ('day', 'today', 'window', 'mean', 'var', 'cusum', 'days')
+
+	def __init__(self, day: int, today=0, window=None, mean=0.0, var=0.0, cusum=0.0, days=0):
+		self.day = day  # date.toordinal() du jour en cours
+		self.today = today
+		self.window = list(window or [])  # jours terminés, le plus récent en dernier
+		self.mean = mean
+		self.var = var
+		self.cusum = cusum
+		self.days = days
+
+	def to_dict(self) -> dict:
+		return {name: getattr(self, name) for name in self.__slots__}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(**data)
+
+	def sigma(self) -> float:
+		# Plancher à 1 cas : évite des écarts standardisés infinis sur une ligne de base plate
+		return max(math.sqrt(self.var), 1.0)
+
+	def fold(self, count, conf) -> None:
+		"""Intégrer un jour terminé dans la fenêtre, la CUSUM puis la ligne de base EWMA."""
+		self.window.append(count)
+		del self.window[:-conf['WINDOW_DAYS']]
+		if self.days == 0:
+			self.mean = float(count)
+		else:
+			self.cusum = max(0.0, self.cusum + (count - self.mean) / self.sigma() - conf['CUSUM_K'])
+			lam = conf['EWMA_LAMBDA']
+			diff = count - self.mean
+			self.mean += lam * diff
+			self.var = (1 - lam) * (self.var + lam * diff * diff)
+		self.days += 1
+
+	def roll(self, day: int, conf) -> None:
+		"""Avancer au jour `day` en intégrant le jour en cours puis les jours sans cas."""
+		if day <= self.day:
+			return
+		gap = day - self.day
+		self.fold(self.today, conf)
+		for _ in range(min(gap - 1, MAX_FOLDED_GAP)):
+			self.fold(0, conf)
+		self.day = day
+		self.today = 0
+
+	def add(self, day: int, count: int, conf) -> None:
+		if day > self.day:
+			self.roll(day, conf)
+		if day == self.day:
+			self.today += count
+		elif self.day - day <= len(self.window):
+			# Cas arrivé en retard (synchro hors ligne) : compté dans la fenêtre, ligne de base inchangée
+			self.window[day - self.day] += count
+
+	def evaluate(self, conf) -> dict:
+		sigma = self.sigma()
+		zscore = (self.today - self.mean) / sigma
+		cusum = max(0.0, self.cusum + zscore - conf['CUSUM_K'])
+		alerts = []
+		if self.days >= conf['MIN_BASELINE_DAYS']:
+			if self.today >= conf['MIN_CASES'] and zscore >= conf['Z_THRESHOLD']:
+				alerts.append('spike')
+			if cusum >= conf['CUSUM_H']:
+				alerts.append('cusum')
+		return {
+			'day': date.fromordinal(self.day),
+			'today': self.today,
+			'window_total': sum(self.window) + self.today,
+			'baseline_mean': round(self.mean, 3),
+			'baseline_std': round(math.sqrt(self.var), 3),
+			'zscore': round(zscore, 3),
+			'cusum': round(cusum, 3),
+			'alerts': alerts,
+		}
+
+
+class OutbreakDetector:
+	"""Détecteur sans état de processus : la ligne OutbreakState de chaque village fait foi.
+
+	Plusieurs workers peuvent observer le même village : chacun relit l'état sous
+	`select_for_update`, l'avance puis l'écrit dans la même transaction, de sorte que les mises
+	à jour se sérialisent au lieu de s'écraser. Seul l'ensemble des villages déjà suivis est gardé
+	en mémoire : une ligne OutbreakState n'est jamais supprimée, il ne peut donc pas devenir faux.
+	"""
+
+	def __init__(self):
+		self.known = set()
+
+	def replay_rollups(self, villages=None) -> dict:
+		"""Reconstruire les états en rejouant les comptes journaliers de DiagnosticDailyRollup."""
+		conf = outbreak_settings()
+		states = {}
+		rows = DiagnosticDailyRollup.objects.filter(classification__in=CASE_CLASSIFICATIONS)
+		if villages is not None:
+			rows = rows.filter(village__in=villages)
+		rows = rows.values('village', 'day').annotate(cases=Sum('total')).order_by('day')
+		for row in rows.iterator():
+			day = row['day'].toordinal()
+			state = states.get(row['village'])
+			if state is None:
+				state = states[row['village']] = VillageState(day)
+			state.add(day, row['cases'], conf)
+		return states
+
+	def seed(self, villages) -> None:
+		"""Créer depuis les agrégats l'état des villages qui n'en ont pas encore.
+
+		Appelé avant la mise à jour des agrégats d'un lot, pour que le rejeu ne compte pas ce lot deux fois.
+		"""
+		missing = set(villages) - self.known
+		if not missing:
+			return
+		self.known.update(OutbreakState.objects.filter(village__in=missing).values_list('village', flat=True))
+		missing -= self.known
+		if not missing:
+			return
+		now = timezone.now()
+		OutbreakState.objects.bulk_create(
+			[OutbreakState(village=v, state=state.to_dict(), updated_at=now) for v, state in self.replay_rollups(missing).items()],
+			ignore_conflicts=True,  # un autre worker a créé la ligne entre-temps : la sienne fait foi
+		)
+
+	def observe(self, events) -> None:
+		"""Intégrer des (village, jour, nombre de cas) dans les états verrouillés des villages touchés."""
+		conf = outbreak_settings()
+		first_day = {}
+		for village, day, _ in events:
+			first_day[village] = min(first_day.get(village, day), day)
+		if not first_day:
+			return
+		now = timezone.now()
+		with transaction.atomic():
+			locked = OutbreakState.objects.select_for_update().order_by('village')
+			rows = {row.village: row for row in locked.filter(village__in=first_day)}
+			missing = first_day.keys() - rows.keys()
+			if missing:
+				OutbreakState.objects.bulk_create(
+					[OutbreakState(village=v, state=VillageState(first_day[v].toordinal()).to_dict(), updated_at=now)
+						for v in missing],
+					ignore_conflicts=True,
+				)
+				rows.update((row.village, row) for row in locked.filter(village__in=missing))
+			states = {village: VillageState.from_dict(row.state) for village, row in rows.items()}
+			for village, day, count in events:
+				states[village].add(day.toordinal(), count, conf)
+			for village, row in rows.items():
+				row.state = states[village].to_dict()
+				row.updated_at = now
+			OutbreakState.objects.bulk_update(rows.values(), ['state', 'updated_at'])
+		self.known.update(rows)
+
+	def alerts(self, include_all=False) -> list:
+		"""Alertes en cours, village par village (O(villages), une requête)."""
+		conf = outbreak_settings()
+		today = timezone.localdate().toordinal()
+		results = []
+		for village, data in OutbreakState.objects.values_list('village', 'state').iterator():
+			state = VillageState.from_dict(data)
+			state.roll(today, conf)
+			entry = state.evaluate(conf)
+			if include_all or entry['alerts']:
+				results.append({'village': village, **entry})
+		results.sort(key=lambda e: (-len(e['alerts']), -e['zscore'], e['village']))
+		return results
+
+
+_detector = None
+
+
+def get_detector() -> OutbreakDetector:
+	global _detector
+	if _detector is None:
+		_detector = OutbreakDetector()
+	return _detector
+
+
+def observe_cases_on_commit(events) -> None:
+	"""Programmer l'intégration de (village, jour, cas) après commit de la transaction en cours."""
+	detector = get_detector()
+	detector.seed({village for village, _, _ in events})
+	# robust : les diagnostics sont déjà validés, un échec du détecteur est journalisé sans faire échouer la requête
+	transaction.on_commit(lambda: detector.observe(events), robust=True)
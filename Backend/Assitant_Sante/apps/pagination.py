@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DiagnosticCursorPagination(CursorPagination):
+	"""Pagination par curseur (keyset) sur -date : coût constant quelle que soit la taille de la table.
+
+	`id` départage les diagnostics de même date pour que le curseur reste stable.
+	"""
+	ordering = ('-date', '-id')
+	page_size = 50
+	page_size_query_param = 'page_size'
+	max_page_size = 500
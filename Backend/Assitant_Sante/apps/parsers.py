@@ -0,0 +1,25 @@
+"""Parsers DRF : corps MessagePack (voir `apps.renderers` pour le format et le dictionnaire de clés)."""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .renderers import WIRE_KEY_DICTIONARIES, map_keys, msgpack, wire_keys_version
+
+
+class MessagePackParser(BaseParser):
+	media_type = 'application/x-msgpack'
+
+	def parse(self, stream, media_type=None, parser_context=None):
+		version = wire_keys_version(media_type)
+		if version is not None and version not in WIRE_KEY_DICTIONARIES:
+			raise ParseError(f'Dictionnaire de clés inconnu: {version}')
+		try:
+			data = msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+		except (ValueError, TypeError, msgpack.UnpackException) as e:  # TypeError : clé de map non hachable
+			raise ParseError(f'MessagePack invalide: {e}')
+		if version is not None:
+			keys = WIRE_KEY_DICTIONARIES[version]
+			data = map_keys(data, {i: key for i, key in enumerate(keys)})
+		return data
+
+
+BINARY_PARSERS = [MessagePackParser] if msgpack is not None else []
@@ -0,0 +1,165 @@
+"""Recherche plein texte dans les protocoles de soins (assets/protocols/care_protocols.json).
+
+Le fichier est chargé une fois dans un index inversé, reconstruit quand son mtime change.
+Termes normalisés par `fold` : minuscules, sans accents, « th » -> « t », « ph » -> « f »
+(arthémisinine = artemisinine), pluriel en -s/-x retiré, mots vides français ignorés.
+
+Classement BM25 sur un document pondéré par champ : titre et mots-clés x3, maladie x2,
+contenu x1. Le poids BM25 de chaque (terme, protocole) ne dépend pas de la requête. Il est
+donc calculé à la construction, et une recherche se réduit à sommer les listes de postings des
+termes demandés. Le dernier terme de la requête est aussi cherché comme préfixe (saisie en cours).
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = (('title', 3), ('keywords', 3), ('disease', 2), ('content', 1))
+PREFIX_MIN_LENGTH = 3
+PREFIX_MAX_TERMS = 20
+
+STOPWORDS = frozenset(
+	'a au aux avec ce ces d dans de des du en et l la le les par pas pour que qui sa se si son sur un une ou'.split()
+)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'Œ': 'oe', 'Æ': 'ae'})
+
+
+def fold(text: str) -> str:
+	text = unicodedata.normalize('NFKD', text.translate(LIGATURES).lower())
+	text = ''.join(c for c in text if not unicodedata.combining(c))
+	return text.replace('th', 't').replace('ph', 'f')
+
+
+def stem(token: str) -> str:
+	if len(token) > 3 and token[-1] in 'sx' and token[-2] != 's':
+		return token[:-1]
+	return token
+
+
+def tokenize(text: str) -> list:
+	return [stem(t) for t in TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
+
+
+class ProtocolIndex:
+	"""Index inversé immuable : terme -> ((position du protocole, poids BM25), ...)."""
+
+	def __init__(self, protocols):
+		self.protocols = tuple(protocols)
+		docs = []
+		for protocol in self.protocols:
+			tf = {}
+			for field, weight in FIELD_WEIGHTS:
+				value = protocol.get(field) or ''
+				for token in tokenize(' '.join(value) if isinstance(value, list) else value):
+					tf[token] = tf.get(token, 0) + weight
+			docs.append(tf)
+		lengths = [sum(tf.values()) for tf in docs]
+		avgdl = sum(lengths) / len(lengths) if lengths else 0.0
+		postings = {}
+		for i, (tf, length) in enumerate(zip(docs, lengths)):
+			norm = K1 * (1 - B + B * length / avgdl)
+			for term, freq in tf.items():
+				postings.setdefault(term, []).append((i, freq * (K1 + 1) / (freq + norm)))
+		n = len(docs)
+		self.postings = {}
+		for term, entries in postings.items():
+			idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+			self.postings[term] = tuple((i, idf * w) for i, w in entries)
+		self.vocabulary = sorted(self.postings)
+
+	def expand_prefix(self, prefix) -> list:
+		start = bisect_left(self.vocabulary, prefix)
+		terms = []
+		for term in self.vocabulary[start:start + PREFIX_MAX_TERMS]:
+			if not term.startswith(prefix):
+				break
+			terms.append(term)
+		return terms
+
+	def search(self, query, limit=10, disease=None, category=None) -> list:
+		terms = list(dict.fromkeys(tokenize(query)))
+		if not terms:
+			return []
+		scores = {}
+		for n, term in enumerate(terms):
+			matched = [term] if term in self.postings else []
+			if not matched and n == len(terms) - 1 and len(term) >= PREFIX_MIN_LENGTH:
+				matched = self.expand_prefix(term)
+			for t in matched:
+				for i, weight in self.postings[t]:
+					scores[i] = scores.get(i, 0.0) + weight
+		results = []
+		for i, score in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+			protocol = self.protocols[i]
+			if disease and protocol.get('disease') != disease:
+				continue
+			if category and protocol.get('category') != category:
+				continue
+			results.append({**protocol, 'score': round(score, 4)})
+			if len(results) >= limit:
+				break
+		return results
+
+
+class ProtocolsUnavailable(Exception):
+	"""Aucun index n'a jamais pu être construit (fichier absent ou invalide dès le démarrage)."""
+
+
+class ProtocolStore:
+	"""Index du fichier de protocoles, reconstruit quand son mtime change (un stat par recherche).
+
+	Un fichier absent ou invalide (édition en cours) n'interrompt pas le service : le dernier
+	index valide reste servi jusqu'à la prochaine modification du fichier.
+	"""
+
+	def __init__(self, path):
+		self.path = Path(path)
+		self._mtime = None
+		self._index = None
+		self._lock = threading.Lock()
+
+	def index(self) -> ProtocolIndex:
+		try:
+			mtime = os.stat(self.path).st_mtime_ns
+		except OSError as e:
+			if self._index is None:
+				raise ProtocolsUnavailable(f'Protocoles indisponibles: {e}') from e
+			return self._index
+		if self._mtime == mtime:
+			return self._index
+		with self._lock:
+			if self._mtime != mtime:
+				try:
+					with open(self.path, encoding='utf-8') as fh:
+						self._index = ProtocolIndex(json.load(fh).get('protocols', []))
+				except (OSError, ValueError, AttributeError, TypeError) as e:
+					if self._index is None:
+						raise ProtocolsUnavailable(f'Protocoles invalides: {e}') from e
+				self._mtime = mtime
+			return self._index
+
+
+_store = None
+
+
+def get_store() -> ProtocolStore:
+	global _store
+	path = Path(getattr(settings, 'CARE_PROTOCOLS_FILE'))
+	if _store is None or _store.path != path:
+		_store = ProtocolStore(path)
+	return _store
+
+
+def search_protocols(query, limit=10, disease=None, category=None) -> list:
+	return get_store().index().search(query, limit=limit, disease=disease, category=category)
@@ -0,0 +1,152 @@
+"""Import en masse de registres (relais, patients) depuis des fichiers CSV ou NDJSON (gzip accepté).
+
+Le fichier est lu en flux et traité par blocs : validation par les serializers de l'API sans
+requête par ligne (relais résolus dans une table (nom, village) chargée une fois), codes
+patients réservés par bloc (`allocate_patient_codes`) puis un `bulk_create` par bloc.
+Une ligne invalide est consignée dans le rapport d'erreurs sans interrompre l'import.
+
+Colonnes attendues :
+- relais : nom, village, telephone ;
+- patients : nom, age, sexe, village, poids_kg (facultatif) et le relais, soit par
+  `relais` (identifiant), soit par `relais_nom` + `relais_village`.
+"""
+import csv
+import gzip
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from .models import BaseRelais, Patient
+from .serializers import BaseRelaisSerializer, PatientSerializer
+from .sync import allocate_patient_codes
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def open_text(path):
+	if str(path).endswith('.gz'):
+		return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+	return open(path, encoding='utf-8-sig', newline='')
+
+
+def read_rows(fh, fmt):
+	"""(numéro de ligne, dictionnaire) pour chaque enregistrement ; une ligne NDJSON illisible donne une erreur."""
+	if fmt == 'csv':
+		reader = csv.DictReader(fh)
+		for row in reader:
+			yield reader.line_num, {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+		return
+	for line_num, line in enumerate(fh, start=1):
+		if not line.strip():
+			continue
+		try:
+			data = json.loads(line)
+		except ValueError as e:
+			yield line_num, ValueError(f'JSON invalide: {e}')
+			continue
+		if not isinstance(data, dict):
+			yield line_num, ValueError(f'Objet JSON attendu, reçu {type(data).__name__}')
+			continue
+		yield line_num, data
+
+
+def guess_format(path) -> str:
+	name = str(path).lower().removesuffix('.gz')
+	return 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+class RegistryImporter:
+
+	def __init__(self, model, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+		if model not in ('relais', 'patients'):
+			raise ValueError(f'Modèle inconnu: {model}')
+		self.model = model
+		self.chunk_size = chunk_size
+		self.dry_run = dry_run
+		self.read = 0
+		self.created = 0
+		self.skipped = 0
+		self.errors = []  # (ligne, erreur, données)
+		# (nom, village) -> relais ; chargé une fois, complété par les relais importés
+		self.relais = {}
+		self.relais_by_id = {}
+		for relais in BaseRelais.objects.all().iterator():
+			self.relais.setdefault((relais.nom.casefold(), relais.village.casefold()), relais)
+			self.relais_by_id[relais.id] = relais
+
+	def run(self, rows) -> None:
+		rows = iter(rows)
+		while True:
+			chunk = list(islice(rows, self.chunk_size))
+			if not chunk:
+				break
+			self.read += len(chunk)
+			valid = []
+			for line, data in chunk:
+				if isinstance(data, Exception):
+					self.errors.append((line, str(data), None))
+					continue
+				obj, error = self.build(data)
+				if error:
+					self.errors.append((line, error, data))
+				elif obj is not None:
+					valid.append((line, data, obj))
+			self.insert(valid)
+
+	def build(self, data) -> tuple:
+		"""(instance non sauvegardée | None si doublon, erreur | None)."""
+		if self.model == 'relais':
+			ser = BaseRelaisSerializer(data=data)
+			if not ser.is_valid():
+				return None, json.dumps(ser.errors, ensure_ascii=False)
+			key = (ser.validated_data['nom'].casefold(), ser.validated_data['village'].casefold())
+			if key in self.relais:
+				self.skipped += 1
+				return None, None
+			obj = BaseRelais(**ser.validated_data)
+			self.relais[key] = obj
+			return obj, None
+
+		data = dict(data)
+		if not data.get('relais'):
+			relais = self.relais.get((str(data.get('relais_nom', '')).casefold(), str(data.get('relais_village', '')).casefold()))
+			if relais is None:
+				return None, f"Relais inconnu: ({data.get('relais_nom')}, {data.get('relais_village')})"
+			data['relais'] = relais.id
+		if data.get('poids_kg') == '':
+			data['poids_kg'] = None
+		ser = PatientSerializer(data=data, context={'preloaded': {BaseRelais: self.relais_by_id}})
+		if not ser.is_valid():
+			return None, json.dumps(ser.errors, ensure_ascii=False)
+		return ser.validated_data, None
+
+	def insert(self, valid) -> None:
+		if not valid or self.dry_run:
+			return
+		try:
+			with transaction.atomic():
+				self.created += len(self.bulk_create([obj for _, _, obj in valid]))
+		except IntegrityError:
+			# Isoler la ou les lignes fautives sans perdre le reste du bloc
+			for line, data, obj in valid:
+				if self.model == 'patients':
+					obj.pop('code', None)  # la réservation du bloc a été annulée avec lui
+				try:
+					with transaction.atomic():
+						self.created += len(self.bulk_create([obj]))
+				except IntegrityError as e:
+					self.errors.append((line, str(e), data))
+
+	def bulk_create(self, objects) -> list:
+		if self.model == 'relais':
+			return BaseRelais.objects.bulk_create(objects)
+		allocate_patient_codes([data for data in objects if not data.get('code')])
+		return Patient.objects.bulk_create([Patient(**data) for data in objects])
+
+	def write_errors(self, fh) -> None:
+		writer = csv.writer(fh)
+		writer.writerow(['ligne', 'erreur', 'donnees'])
+		for line, error, data in self.errors:
+			writer.writerow([line, error, json.dumps(data, ensure_ascii=False, default=str) if data is not None else ''])
@@ -0,0 +1,137 @@
+"""Renderers DRF : exports en flux (NDJSON, CSV) et format binaire MessagePack.
+
+Les exports (`apps.exports`) écrivent ligne par ligne avec `encode_row` / `encode_header` ;
+`render` ne sert qu'aux réponses non streamées (erreurs de validation, etc.).
+
+MessagePack (`application/x-msgpack`, module `msgpack` facultatif) : même contenu que le JSON,
+encodé en binaire. Avec le paramètre `keys=v1` (`Accept` ou `Content-Type:
+application/x-msgpack; keys=v1`), les clés connues de `WIRE_KEYS_V1` sont transmises par leur
+indice au lieu de leur nom : noms de symptômes, de champs et de modèles ne sont plus répétés
+à chaque opération d'un lot. La liste ne fait que s'allonger (un indice ne change jamais de clé).
+"""
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+try:
+	import msgpack
+except ImportError:  # dépendance facultative : pas de format binaire
+	msgpack = None
+
+
+def dumps(value) -> str:
+	return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+class NDJSONRenderer(BaseRenderer):
+	media_type = 'application/x-ndjson'
+	format = 'ndjson'
+	charset = 'utf-8'
+
+	def encode_header(self, columns) -> str:
+		return ''
+
+	def encode_row(self, columns, row: dict) -> str:
+		return dumps(row) + '\n'
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		rows = data if isinstance(data, list) else [data]
+		return ''.join(dumps(row) + '\n' for row in rows).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+	"""Colonnes JSON (symptomes, engine_output, ...) écrites en texte JSON dans leur cellule."""
+	media_type = 'text/csv'
+	format = 'csv'
+	charset = 'utf-8'
+
+	def __init__(self):
+		self._buffer = io.StringIO()
+		self._writer = csv.writer(self._buffer)
+
+	def _line(self, values) -> str:
+		self._writer.writerow(values)
+		line = self._buffer.getvalue()
+		self._buffer.seek(0)
+		self._buffer.truncate()
+		return line
+
+	def encode_header(self, columns) -> str:
+		return self._line(columns)
+
+	def encode_row(self, columns, row: dict) -> str:
+		return self._line([
+			dumps(v) if isinstance(v, (dict, list)) else ('' if v is None else v)
+			for v in (row.get(c) for c in columns)
+		])
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		rows = data if isinstance(data, list) else [data]
+		columns = list(dict.fromkeys(key for row in rows for key in row))
+		return (self.encode_header(columns) + ''.join(self.encode_row(columns, row) for row in rows)).encode(self.charset)
+
+
+WIRE_KEYS_V1 = (
+	# lots de synchronisation et réponses
+	'operations', 'bulk', 'client_id', 'model', 'operation', 'data', 'idempotency_key', 'results', 'status',
+	'server_id', 'error', 'changes', 'deleted', 'has_more', 'next', 'model_name', 'object_id',
+	# champs des modèles synchronisés
+	'id', 'code', 'nom', 'age', 'sexe', 'village', 'relais', 'telephone', 'poids_kg', 'date_creation', 'updated_at',
+	'patient', 'patient_detail', 'symptomes', 'test_type', 'test_result', 'classification', 'danger_signs',
+	'recommendation', 'protocol_version', 'date', 'engine_output', 'rdt_result', 'poids_utilise', 'answered',
+	'completed', 'final_output', 'created_at', 'deleted_at',
+	# symptômes du protocole paludisme
+	'fievre', 'temperature', 'duree_fievre_jours', 'frissons', 'convulsions', 'prostration', 'incapacite_a_manger',
+	'toux', 'diarrhee', 'vomissements', 'paludisme_recent',
+	# triage
+	'poids', 'save', 'hypotheses', 'label', 'score', 'next_questions', 'dosage', 'session_id', 'regimen',
+	'tablets_per_dose', 'doses_per_day', 'days', 'total_tablets',
+)
+WIRE_KEY_DICTIONARIES = {'v1': WIRE_KEYS_V1}
+WIRE_KEY_INDEXES = {version: {key: i for i, key in enumerate(keys)} for version, keys in WIRE_KEY_DICTIONARIES.items()}
+
+_json_default = DjangoJSONEncoder().default
+
+
+def map_keys(value, mapping):
+	"""Remplacer récursivement les clés de dictionnaire présentes dans `mapping`."""
+	if isinstance(value, dict):
+		return {mapping.get(k, k): map_keys(v, mapping) for k, v in value.items()}
+	if isinstance(value, (list, tuple)):
+		return [map_keys(v, mapping) for v in value]
+	return value
+
+
+def wire_keys_version(media_type):
+	"""Version du dictionnaire de clés demandée dans un type de média (`keys=v1`), ou None."""
+	for param in (media_type or '').split(';')[1:]:
+		name, _, value = param.strip().partition('=')
+		if name == 'keys':
+			return value.strip()
+	return None
+
+
+class MessagePackRenderer(BaseRenderer):
+	media_type = 'application/x-msgpack'
+	format = 'msgpack'
+	charset = None
+	render_style = 'binary'
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if data is None:
+			return b''
+		version = wire_keys_version(accepted_media_type)
+		if version in WIRE_KEY_INDEXES:
+			data = map_keys(data, WIRE_KEY_INDEXES[version])
+			response = (renderer_context or {}).get('response')
+			if response is not None:
+				# Annoncer le dictionnaire utilisé : le client doit savoir décoder les indices
+				response['Content-Type'] = f'{self.media_type}; keys={version}'
+		return msgpack.packb(data, default=_json_default, use_bin_type=True)
+
+
+# À ajouter aux renderer_classes / parser_classes des vues : vide sans le module msgpack
+BINARY_RENDERERS = [MessagePackRenderer] if msgpack is not None else []
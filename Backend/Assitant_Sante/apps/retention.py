@@ -0,0 +1,109 @@
+"""Rétention de SyncQueue : archivage des lignes synchronisées anciennes puis suppression par blocs.
+
+Les lignes `synced=True` plus anciennes que `DAYS` jours sont écrites en NDJSON compressé, un
+fichier par jour (`syncqueue-AAAA-MM-JJ.ndjson.gz` dans `ARCHIVE_DIR`), puis supprimées par blocs
+de `CHUNK_SIZE` : chaque bloc est une transaction courte, les écritures concurrentes ne sont
+jamais bloquées longtemps. Les lignes en échec (`synced=False`) restent pour être rejouées.
+
+Un bloc n'est supprimé qu'une fois son archive écrite sur disque. Si le processus s'arrête entre
+les deux, le bloc sera archivé une seconde fois au passage suivant : dédoublonner par `id` à la relecture.
+Plusieurs passages ajoutent des membres gzip au fichier du jour (lisible d'un seul tenant par gzip).
+"""
+import gzip
+import os
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SyncQueue
+from .renderers import dumps
+
+
+DEFAULTS = {
+	'DAYS': 30,
+	'ARCHIVE_DIR': Path(settings.BASE_DIR) / 'archives' / 'syncqueue',
+	'CHUNK_SIZE': 1000,
+}
+
+ARCHIVE_FIELDS = (
+	'id', 'model_name', 'object_id', 'operation', 'data', 'synced', 'retry_count', 'last_attempt_at', 'date',
+	'updated_at', 'idempotency_key', 'last_error',
+)
+
+
+def retention_settings() -> dict:
+	return {**DEFAULTS, **getattr(settings, 'SYNC_QUEUE_RETENTION', {})}
+
+
+def archive_path(archive_dir, day) -> Path:
+	return Path(archive_dir) / f'syncqueue-{day.isoformat()}.ndjson.gz'
+
+
+class SyncQueueArchiver:
+
+	def __init__(self, days=None, archive_dir=None, chunk_size=None, dry_run=False):
+		conf = retention_settings()
+		self.days = conf['DAYS'] if days is None else days
+		self.archive_dir = Path(archive_dir or conf['ARCHIVE_DIR'])
+		self.chunk_size = chunk_size or conf['CHUNK_SIZE']
+		self.dry_run = dry_run
+		self.rows = 0
+		self.payload_bytes = 0  # NDJSON non compressé : volume retiré de la table
+		self.archive_bytes = 0  # octets compressés ajoutés aux archives
+		self.files = set()
+
+	def cutoff(self):
+		return timezone.now() - timedelta(days=self.days)
+
+	def run(self) -> None:
+		cutoff = self.cutoff()
+		queryset = SyncQueue.objects.filter(synced=True, date__lt=cutoff).order_by('date', 'id')
+		last = None
+		while True:
+			page = queryset
+			if last is not None:
+				# Reprise après le dernier bloc (utile en dry-run, où rien n'est supprimé)
+				page = page.filter(Q(date__gt=last[0]) | Q(date=last[0], id__gt=last[1]))
+			rows = list(page.values(*ARCHIVE_FIELDS)[:self.chunk_size])
+			if not rows:
+				break
+			last = (rows[-1]['date'], rows[-1]['id'])
+			self.archive(rows)
+			if not self.dry_run:
+				with transaction.atomic():
+					SyncQueue.objects.filter(id__in=[row['id'] for row in rows]).delete()
+			self.rows += len(rows)
+
+	def archive(self, rows) -> None:
+		by_day = defaultdict(list)
+		for row in rows:
+			line = (dumps(row) + '\n').encode('utf-8')
+			self.payload_bytes += len(line)
+			by_day[timezone.localdate(row['date'])].append(line)
+		if self.dry_run:
+			return
+		self.archive_dir.mkdir(parents=True, exist_ok=True)
+		for day, lines in by_day.items():
+			path = archive_path(self.archive_dir, day)
+			size = path.stat().st_size if path.exists() else 0
+			with open(path, 'ab') as raw:
+				with gzip.GzipFile(fileobj=raw, mode='ab') as fh:
+					fh.writelines(lines)
+				raw.flush()
+				os.fsync(raw.fileno())
+			self.archive_bytes += path.stat().st_size - size
+			self.files.add(path)
+
+
+def vacuum() -> None:
+	"""Rendre au système l'espace libéré (SQLite : VACUUM de toute la base ; PostgreSQL : VACUUM de la table)."""
+	with connection.cursor() as cursor:
+		if connection.vendor == 'sqlite':
+			cursor.execute('VACUUM')
+		elif connection.vendor == 'postgresql':
+			cursor.execute(f'VACUUM ANALYZE {connection.ops.quote_name(SyncQueue._meta.db_table)}')
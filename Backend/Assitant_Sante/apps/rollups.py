@@ -0,0 +1,149 @@
+"""Agrégats épidémiologiques journaliers (DiagnosticDailyRollup).
+
+Chaque écriture de diagnostic ajoute (ou retire) ses compteurs à la ligne
+jour x village x relais x classification par un UPDATE ... SET total = total + n,
+dans la même transaction que le diagnostic. Le village est celui du patient à la création du
+diagnostic, enregistré sur la ligne : un déménagement ultérieur ne déplace pas ses comptes. `rebuild()` recalcule tout depuis
+DiagnosticPaludisme (commande `rebuild_rollups`). Les créations alimentent aussi le
+détecteur de flambées (apps/outbreaks.py) après commit.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DiagnosticDailyRollup, DiagnosticPaludisme, Patient, RDTResult
+from .outbreaks import CASE_CLASSIFICATIONS, observe_cases_on_commit
+
+
+ROLLUP_FIELDS = ('total', 'rdt_tested', 'rdt_positive')
+STATS_DIMENSIONS = ('day', 'village', 'relais', 'classification')
+STATS_DEFAULT_DAYS = 30
+
+
+def counters(diag) -> tuple:
+	tested = diag.test_result in (RDTResult.POS, RDTResult.NEG)
+	return 1, int(tested), int(diag.test_result == RDTResult.POS)
+
+
+def record_diagnostics(diagnostics, sign=1, observe=True) -> None:
+	"""Ajouter (sign=1) ou retirer (sign=-1) des diagnostics aux agrégats : une requête par ligne touchée.
+
+	`observe=False` : ré-ajout d'un diagnostic modifié, qui n'est pas un nouveau cas pour le détecteur de flambées.
+	"""
+	diagnostics = [d for d in diagnostics if d.patient_id and d.relais_id]
+	if not diagnostics:
+		return
+	# Village enregistré à la création ; repli sur celui du patient pour les lignes insérées sans (bulk_create brut)
+	villages = {}
+	missing = set()
+	for diag in diagnostics:
+		if diag.village:
+			continue
+		if DiagnosticPaludisme.patient.is_cached(diag):
+			villages[diag.patient_id] = diag.patient.village
+		else:
+			missing.add(diag.patient_id)
+	missing -= villages.keys()
+	if missing:
+		villages.update(Patient.objects.filter(id__in=missing).values_list('id', 'village'))
+
+	deltas = defaultdict(lambda: [0, 0, 0])
+	for diag in diagnostics:
+		village = diag.village or villages.get(diag.patient_id)
+		if village is None:
+			continue
+		key = (timezone.localdate(diag.date or timezone.now()), village, diag.relais_id, diag.classification)
+		for i, n in enumerate(counters(diag)):
+			deltas[key][i] += sign * n
+
+	if sign > 0 and observe:
+		cases = defaultdict(int)
+		for (day, village, _, classification), values in deltas.items():
+			if classification in CASE_CLASSIFICATIONS:
+				cases[(village, day)] += values[0]
+		if cases:
+			observe_cases_on_commit([(village, day, n) for (village, day), n in cases.items()])
+
+	now = timezone.now()
+	for (day, village, relais_id, classification), values in deltas.items():
+		rows = DiagnosticDailyRollup.objects.filter(day=day, village=village, relais_id=relais_id, classification=classification)
+		increments = {f: F(f) + v for f, v in zip(ROLLUP_FIELDS, values)}
+		# Un retrait sans ligne existante (déjà supprimée en cascade avec le relais) n'a rien à corriger
+		if rows.update(updated_at=now, **increments) or sign < 0:
+			continue
+		try:
+			with transaction.atomic():
+				DiagnosticDailyRollup.objects.create(
+					day=day, village=village, relais_id=relais_id, classification=classification,
+					**dict(zip(ROLLUP_FIELDS, values)),
+				)
+		except IntegrityError:
+			# Ligne créée entre-temps par une écriture concurrente
+			rows.update(updated_at=now, **increments)
+
+
+def rebuild(since=None, until=None) -> int:
+	"""Recalculer les agrégats (éventuellement sur [since, until]) ; retourne le nombre de lignes écrites."""
+	diagnostics = DiagnosticPaludisme.objects.annotate(day=TruncDate('date'))
+	rollups = DiagnosticDailyRollup.objects.all()
+	if since:
+		diagnostics = diagnostics.filter(day__gte=since)
+		rollups = rollups.filter(day__gte=since)
+	if until:
+		diagnostics = diagnostics.filter(day__lte=until)
+		rollups = rollups.filter(day__lte=until)
+	diagnostics = diagnostics.annotate(
+		rollup_village=Case(When(village='', then=F('patient__village')), default=F('village')),
+	)
+	grouped = diagnostics.values('day', 'rollup_village', 'relais_id', 'classification').annotate(
+		total=Count('id'),
+		rdt_tested=Count('id', filter=Q(test_result__in=[RDTResult.POS, RDTResult.NEG])),
+		rdt_positive=Count('id', filter=Q(test_result=RDTResult.POS)),
+	).order_by()
+	with transaction.atomic():
+		rollups.delete()
+		created = DiagnosticDailyRollup.objects.bulk_create(
+			[
+				DiagnosticDailyRollup(
+					day=row['day'], village=row['rollup_village'], relais_id=row['relais_id'],
+					classification=row['classification'], total=row['total'],
+					rdt_tested=row['rdt_tested'], rdt_positive=row['rdt_positive'],
+				)
+				for row in grouped.iterator()
+			],
+			batch_size=1000,
+		)
+	return len(created)
+
+
+def positivity(row) -> dict:
+	row['positivity_rate'] = round(row['rdt_positive'] / row['rdt_tested'], 4) if row['rdt_tested'] else None
+	return row
+
+
+def query_stats(start, end, village=None, relais=None, group_by=('day', 'classification')) -> dict:
+	"""Lire les agrégats sur [start, end] : coût proportionnel au nombre de lignes d'agrégat, pas de diagnostics."""
+	rows = DiagnosticDailyRollup.objects.filter(day__gte=start, day__lte=end)
+	if village:
+		rows = rows.filter(village=village)
+	if relais:
+		rows = rows.filter(relais_id=relais)
+	sums = {f: Sum(f) for f in ROLLUP_FIELDS}
+	columns = ['relais_id' if d == 'relais' else d for d in group_by]
+	grouped = []
+	for row in rows.values(*columns).annotate(**sums).order_by(*columns):
+		if 'relais_id' in row:
+			row['relais'] = row.pop('relais_id')
+		grouped.append(positivity(row))
+	totals = {f: 0 for f in ROLLUP_FIELDS}
+	by_classification = {}
+	for row in rows.values('classification').annotate(**sums).order_by():
+		by_classification[row['classification']] = row['total']
+		for f in ROLLUP_FIELDS:
+			totals[f] += row[f]
+	totals = positivity(totals)
+	totals['by_classification'] = by_classification
+	return {'start': start, 'end': end, 'group_by': list(group_by), 'rows': grouped, 'totals': totals}
@@ -1,17 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import Patient, DiagnosticPaludisme, SyncQueue, BaseRelais, TriageSession
+from .models import Patient, PatientCodeSequence, DiagnosticPaludisme, SyncQueue, BaseRelais, TriageSession
 from django.db import transaction
+from django.utils import timezone
 
-from .models import RDTResult
+from .models import PALU_CLASSIFICATION_CHOICES, RDTResult
+from .decision_engine import PROTOCOL_VERSION
+from .rollups import STATS_DEFAULT_DAYS, STATS_DIMENSIONS, record_diagnostics
 
-class TriageRequestSerializer(serializers.Serializer):
+class TriageRecordSerializer(serializers.Serializer):
 	symptomes = serializers.DictField(required=False, default=dict)
 	poids = serializers.FloatField(required=False, allow_null=True)
 	rdt_result = serializers.ChoiceField(choices=RDTResult.choices, required=False, allow_null=True)
-	save = serializers.BooleanField(required=False, default=False)
 	patient = serializers.IntegerField(required=False, allow_null=True)
 	relais = serializers.IntegerField(required=False, allow_null=True)
 
+class TriageRequestSerializer(TriageRecordSerializer):
+	save = serializers.BooleanField(required=False, default=False)
+
+class TriageBatchRequestSerializer(serializers.Serializer):
+	records = TriageRecordSerializer(many=True)
+	save = serializers.BooleanField(required=False, default=False)
+
+	def to_internal_value(self, data):
+		# Borne vérifiée avant la validation ligne à ligne et l'allocation des matrices NumPy
+		records = data.get('records') if hasattr(data, 'get') else None
+		limit = settings.TRIAGE_BATCH_MAX_RECORDS
+		if isinstance(records, list) and len(records) > limit:
+			raise serializers.ValidationError({'records': [f'Au plus {limit} paquets par lot']})
+		return super().to_internal_value(data)
+
 class TriageResponseSerializer(serializers.Serializer):
 	hypotheses = serializers.ListField(child=serializers.DictField())
 	danger_signs = serializers.ListField(child=serializers.CharField())
@@ -20,36 +40,71 @@ class TriageResponseSerializer(serializers.Serializer):
 	dosage = serializers.DictField(allow_null=True, required=False)
 	session_id = serializers.IntegerField(required=False)
 
+class TriageBatchResponseSerializer(serializers.Serializer):
+	results = TriageResponseSerializer(many=True)
+
 class InteractiveStartSerializer(serializers.Serializer):
 	patient = serializers.IntegerField(required=False, allow_null=True)
 	relais = serializers.IntegerField(required=False, allow_null=True)
 	poids = serializers.FloatField(required=False, allow_null=True)
 	rdt_result = serializers.ChoiceField(choices=RDTResult.choices, required=False, allow_null=True)
+	# Arbre JSON (malaria, diarrhea, ... ou paludisme, diarrhee, ...) ; absent = moteur paludisme
+	tree = serializers.CharField(required=False, allow_blank=True)
 
 class InteractiveStartResponseSerializer(serializers.Serializer):
 	session_id = serializers.IntegerField()
 	question = serializers.CharField(allow_null=True)
+	node = serializers.DictField(required=False)
 
-class InteractiveAnswerSerializer(serializers.Serializer):
+class InteractiveAnswerItemSerializer(serializers.Serializer):
 	question = serializers.CharField()
 	# Accepte booléen, nombre, chaîne -> champ JSON générique
 	value = serializers.JSONField()
 
+class InteractiveAnswerSerializer(serializers.Serializer):
+	"""Une réponse (`question`/`value`) ou plusieurs, dans l'ordre (`answers`)."""
+	question = serializers.CharField(required=False)
+	value = serializers.JSONField(required=False)
+	answers = InteractiveAnswerItemSerializer(many=True, required=False)
+
 class InteractiveAnswerPreviewResponseSerializer(serializers.Serializer):
 	completed = serializers.BooleanField()
 	next_question = serializers.CharField(allow_null=True)
 	preview_hypotheses = serializers.ListField(child=serializers.DictField())
 	danger_signs = serializers.ListField(child=serializers.CharField())
 	session_id = serializers.IntegerField()
+	node = serializers.DictField(required=False)
 
 class InteractiveAnswerFinalResponseSerializer(serializers.Serializer):
 	completed = serializers.BooleanField()
 	final_output = serializers.DictField()
 	session_id = serializers.IntegerField()
 	diagnostic_created = serializers.BooleanField()
+	applied = serializers.IntegerField(required=False)
+	ignored = serializers.ListField(child=serializers.CharField(), required=False)
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+	"""Résout la clé dans context['preloaded'][Model] quand il est fourni (validation en lot sans requête par ligne)."""
+
+	def to_internal_value(self, data):
+		preloaded = self.context.get('preloaded', {}).get(self.get_queryset().model)
+		if preloaded is None:
+			return super().to_internal_value(data)
+		if isinstance(data, bool):
+			self.fail('incorrect_type', data_type=type(data).__name__)
+		try:
+			obj = preloaded.get(int(data))
+		except (TypeError, ValueError):
+			self.fail('incorrect_type', data_type=type(data).__name__)
+		if obj is None:
+			self.fail('does_not_exist', pk_value=data)
+		return obj
 
 
 class PatientSerializer(serializers.ModelSerializer):
+	serializer_related_field = PreloadedPrimaryKeyRelatedField
+
 	class Meta:
 		model = Patient
 		fields = [
@@ -57,14 +112,18 @@ class PatientSerializer(serializers.ModelSerializer):
 		]
 		read_only_fields = ['id','date_creation','updated_at','code']
 
-	def create(self, validated_data):
+	def prepare_create(self, validated_data):
 		# Attendre que relais soit fourni explicitement car pas de couche d'authentification
 		relais = validated_data.get('relais')
 		if not relais:
 			raise serializers.ValidationError({'relais': 'Requis'})
 		if not validated_data.get('code'):
-			validated_data['code'] = f"P{relais.id}-{Patient.objects.count()+1}"
-		return super().create(validated_data)
+			value = PatientCodeSequence.allocate(relais.id)[0]
+			validated_data['code'] = PatientCodeSequence.format_code(relais.id, value)
+		return validated_data
+
+	def create(self, validated_data):
+		return super().create(self.prepare_create(validated_data))
 
 class BaseRelaisSerializer(serializers.ModelSerializer):
 	class Meta:
@@ -74,6 +133,7 @@ class BaseRelaisSerializer(serializers.ModelSerializer):
 		
         
 class DiagnosticPaludismeSerializer(serializers.ModelSerializer):
+	serializer_related_field = PreloadedPrimaryKeyRelatedField
 	patient_detail = PatientSerializer(source='patient', read_only=True)
 
 	class Meta:
@@ -84,23 +144,49 @@ class DiagnosticPaludismeSerializer(serializers.ModelSerializer):
 		]
 		read_only_fields = ['id','date','updated_at','protocol_version']
 
-	def create(self, validated_data):
+	def prepare_create(self, validated_data):
 		if not validated_data.get('relais'):
 			raise serializers.ValidationError({'relais': 'Requis'})
-		validated_data['protocol_version'] = 'v1'
-		return super().create(validated_data)
+		validated_data['protocol_version'] = PROTOCOL_VERSION
+		validated_data['village'] = validated_data['patient'].village
+		return validated_data
+
+	def create(self, validated_data):
+		with transaction.atomic():
+			diag = super().create(self.prepare_create(validated_data))
+			record_diagnostics([diag])
+		return diag
+
+	def update(self, instance, validated_data):
+		# Retirer l'ancienne clé d'agrégat puis ajouter la nouvelle (classification, relais, résultat RDT)
+		with transaction.atomic():
+			record_diagnostics([instance], sign=-1)
+			if validated_data.get('patient', instance.patient) != instance.patient:
+				validated_data['village'] = validated_data['patient'].village
+			diag = super().update(instance, validated_data)
+			record_diagnostics([diag], observe=False)
+		return diag
+
+
+class DiagnosticPaludismeSyncSerializer(DiagnosticPaludismeSerializer):
+	"""Variante sans patient_detail pour le pull delta : le patient est déjà dans son propre flux."""
+
+	class Meta(DiagnosticPaludismeSerializer.Meta):
+		fields = [f for f in DiagnosticPaludismeSerializer.Meta.fields if f != 'patient_detail']
 
 
 class SyncQueueSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = SyncQueue
 		fields = [
-			'id','model_name','object_id','operation','data','synced','retry_count','last_attempt_at','date','updated_at'
+			'id','model_name','object_id','operation','data','synced','retry_count','last_attempt_at','last_error','date','updated_at'
 		]
-		read_only_fields = ['id','retry_count','last_attempt_at','date','updated_at']
+		read_only_fields = ['id','retry_count','last_attempt_at','last_error','date','updated_at']
 
 
 class TriageSessionSerializer(serializers.ModelSerializer):
+	serializer_related_field = PreloadedPrimaryKeyRelatedField
+
 	class Meta:
 		model = TriageSession
 		fields = [
@@ -109,14 +195,17 @@ class TriageSessionSerializer(serializers.ModelSerializer):
 		]
 		read_only_fields = ['id','engine_output','answered','completed','final_output','created_at','updated_at']
 
-	def create(self, validated_data):
+	def prepare_create(self, validated_data):
 		# Assurez-vous que engine_output est présent lors de l'insertion dans la base de données pour éviter les erreurs NOT NULL
 		if 'engine_output' not in validated_data or validated_data.get('engine_output') is None:
 			validated_data['engine_output'] = {}
 		# Assurez-vous que answered est présent lors de l'insertion dans la base de données pour éviter les erreurs NOT NULL
 		if 'answered' not in validated_data or validated_data.get('answered') is None:
 			validated_data['answered'] = {}
-		return super().create(validated_data)
+		return validated_data
+
+	def create(self, validated_data):
+		return super().create(self.prepare_create(validated_data))
 
 
 class SyncOperationSerializer(serializers.Serializer):
@@ -124,11 +213,13 @@ class SyncOperationSerializer(serializers.Serializer):
 	model = serializers.CharField()  # e.g. Patient, DiagnosticPaludisme
 	operation = serializers.ChoiceField(choices=['CREATE', 'UPDATE', 'DELETE'])
 	data = serializers.DictField()
-	idempotency_key = serializers.CharField(required=False, allow_null=True)
+	idempotency_key = serializers.CharField(required=False, allow_null=True, max_length=128)
 
 
 class SyncBatchRequestSerializer(serializers.Serializer):
 	operations = SyncOperationSerializer(many=True)
+	# Mode lot : opérations groupées par modèle/type, bulk_create / bulk_update
+	bulk = serializers.BooleanField(required=False, default=False)
 
 
 class SyncOperationResultSerializer(serializers.Serializer):
@@ -140,4 +231,91 @@ class SyncOperationResultSerializer(serializers.Serializer):
 
 class SyncBatchResponseSerializer(serializers.Serializer):
 	results = SyncOperationResultSerializer(many=True)
+
+
+class StatsQuerySerializer(serializers.Serializer):
+	start = serializers.DateField(required=False)
+	end = serializers.DateField(required=False)
+	village = serializers.CharField(required=False)
+	relais = serializers.IntegerField(required=False)
+	# Dimensions séparées par des virgules parmi day, village, relais, classification
+	group_by = serializers.CharField(required=False, default='day,classification')
+
+	def validate_group_by(self, value):
+		dims = [d.strip() for d in value.split(',') if d.strip()]
+		unknown = [d for d in dims if d not in STATS_DIMENSIONS]
+		if unknown:
+			raise serializers.ValidationError(f"Dimensions inconnues: {', '.join(unknown)}")
+		return tuple(dict.fromkeys(dims))
+
+	def validate(self, attrs):
+		end = attrs.get('end') or timezone.localdate()
+		start = attrs.get('start') or end - timedelta(days=STATS_DEFAULT_DAYS - 1)
+		if start > end:
+			raise serializers.ValidationError({'start': 'Doit précéder end'})
+		attrs.update(start=start, end=end)
+		return attrs
+
+class StatsResponseSerializer(serializers.Serializer):
+	start = serializers.DateField()
+	end = serializers.DateField()
+	group_by = serializers.ListField(child=serializers.CharField())
+	rows = serializers.ListField(child=serializers.DictField())
+	totals = serializers.DictField()
+
+
+class ExportQuerySerializer(serializers.Serializer):
+	start = serializers.DateField(required=False)
+	end = serializers.DateField(required=False)
+	village = serializers.CharField(required=False)
+	classification = serializers.ChoiceField(choices=PALU_CLASSIFICATION_CHOICES, required=False)
+	gzip = serializers.BooleanField(required=False, default=False)
+
+class SyncQueueStatsSerializer(serializers.Serializer):
+	pending = serializers.IntegerField()
+	ready = serializers.IntegerField()
+	dead = serializers.IntegerField()
+	oldest_age_seconds = serializers.FloatField()
+
+class OutbreakAlertSerializer(serializers.Serializer):
+	village = serializers.CharField()
+	day = serializers.DateField()
+	today = serializers.IntegerField()
+	window_total = serializers.IntegerField()
+	baseline_mean = serializers.FloatField()
+	baseline_std = serializers.FloatField()
+	zscore = serializers.FloatField()
+	cusum = serializers.FloatField()
+	alerts = serializers.ListField(child=serializers.CharField())
+
+class OutbreakAlertsResponseSerializer(serializers.Serializer):
+	alerts = OutbreakAlertSerializer(many=True)
+
+
+class SyncPullResponseSerializer(serializers.Serializer):
+	changes = serializers.DictField(child=serializers.ListField(child=serializers.DictField()))
+	deleted = serializers.ListField(child=serializers.DictField())
+	has_more = serializers.BooleanField()
+	next = serializers.CharField()
  
+
+
+class ProtocolSearchQuerySerializer(serializers.Serializer):
+	q = serializers.CharField()
+	limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=50)
+	disease = serializers.CharField(required=False)
+	category = serializers.CharField(required=False)
+
+class ProtocolSearchResultSerializer(serializers.Serializer):
+	id = serializers.CharField()
+	disease = serializers.CharField()
+	category = serializers.CharField()
+	title = serializers.CharField()
+	content = serializers.CharField()
+	keywords = serializers.ListField(child=serializers.CharField())
+	score = serializers.FloatField()
+
+class ProtocolSearchResponseSerializer(serializers.Serializer):
+	query = serializers.CharField()
+	count = serializers.IntegerField()
+	results = ProtocolSearchResultSerializer(many=True)
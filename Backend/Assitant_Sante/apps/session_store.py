@@ -0,0 +1,216 @@
+"""Stockage de l'état des sessions de triage interactif (machine à états de quelques minutes).
+
+Deux backends, choisis par `settings.TRIAGE_SESSION_STORE['BACKEND']` (chemin importable,
+comme `CACHES`) :
+- `LocMemSessionStore` : LRU en mémoire du processus avec expiration (TTL) ;
+- `RedisSessionStore` : client minimal du protocole Redis (RESP2) sur socket, sans dépendance.
+
+Les états sont sérialisés en JSON : l'appelant ne partage jamais d'objet avec le store.
+"""
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+DEFAULT_TTL = 900
+
+
+class BaseSessionStore:
+	key_prefix = 'triage:session:'
+
+	def __init__(self, ttl=DEFAULT_TTL, **options):
+		self.ttl = int(ttl)
+
+	def make_key(self, session_id) -> str:
+		return f'{self.key_prefix}{session_id}'
+
+	def get(self, session_id) -> Optional[dict]:
+		raise NotImplementedError
+
+	def set(self, session_id, state: dict, ttl=None) -> None:
+		raise NotImplementedError
+
+	def delete(self, session_id) -> None:
+		raise NotImplementedError
+
+
+class LocMemSessionStore(BaseSessionStore):
+	"""LRU borné à `max_entries` ; les entrées expirées sont évincées à la lecture et à l'écriture."""
+
+	def __init__(self, ttl=DEFAULT_TTL, max_entries=10000, **options):
+		super().__init__(ttl=ttl)
+		self.max_entries = int(max_entries)
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, session_id):
+		key = self.make_key(session_id)
+		with self._lock:
+			entry = self._data.get(key)
+			if entry is None:
+				return None
+			expires_at, payload = entry
+			if expires_at <= time.monotonic():
+				del self._data[key]
+				return None
+			self._data.move_to_end(key)
+		return json.loads(payload)
+
+	def set(self, session_id, state, ttl=None):
+		key = self.make_key(session_id)
+		payload = json.dumps(state)
+		expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+		with self._lock:
+			self._data[key] = (expires_at, payload)
+			self._data.move_to_end(key)
+			self._evict()
+
+	def delete(self, session_id):
+		with self._lock:
+			self._data.pop(self.make_key(session_id), None)
+
+	def __len__(self):
+		return len(self._data)
+
+	def _evict(self):
+		now = time.monotonic()
+		# Les plus anciens en tête : purger les expirés puis tailler au maximum
+		while self._data:
+			key, (expires_at, _) = next(iter(self._data.items()))
+			if expires_at > now and len(self._data) <= self.max_entries:
+				break
+			del self._data[key]
+
+
+class RedisError(Exception):
+	pass
+
+
+class RespClient:
+	"""Client RESP2 minimal (une connexion persistante protégée par un verrou)."""
+
+	def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, timeout=1.0):
+		self.host, self.port, self.db, self.password, self.timeout = host, int(port), int(db), password, timeout
+		self._sock = None
+		self._file = None
+		self._lock = threading.Lock()
+
+	@classmethod
+	def from_url(cls, url, timeout=1.0):
+		parsed = urlparse(url)
+		db = int(parsed.path.lstrip('/') or 0)
+		return cls(parsed.hostname or '127.0.0.1', parsed.port or 6379, db, parsed.password, timeout)
+
+	def execute(self, *args):
+		with self._lock:
+			try:
+				return self._roundtrip(args)
+			except (OSError, ConnectionError):
+				# Connexion coupée (redémarrage, timeout) : une seule nouvelle tentative
+				self.close()
+				return self._roundtrip(args)
+
+	def close(self):
+		if self._sock is not None:
+			try:
+				self._sock.close()
+			finally:
+				self._sock = self._file = None
+
+	def _roundtrip(self, args):
+		if self._sock is None:
+			self._connect()
+		self._sock.sendall(self._encode(args))
+		return self._read_reply()
+
+	def _connect(self):
+		self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+		self._file = self._sock.makefile('rb')
+		if self.password:
+			self._sock.sendall(self._encode(('AUTH', self.password)))
+			self._read_reply()
+		if self.db:
+			self._sock.sendall(self._encode(('SELECT', self.db)))
+			self._read_reply()
+
+	@staticmethod
+	def _encode(args) -> bytes:
+		out = [b'*%d\r\n' % len(args)]
+		for arg in args:
+			data = arg if isinstance(arg, bytes) else str(arg).encode()
+			out.append(b'$%d\r\n%s\r\n' % (len(data), data))
+		return b''.join(out)
+
+	def _read_reply(self):
+		line = self._file.readline()
+		if not line:
+			raise ConnectionError('Connexion Redis fermée')
+		kind, rest = line[:1], line[1:-2]
+		if kind == b'+':
+			return rest.decode()
+		if kind == b'-':
+			raise RedisError(rest.decode())
+		if kind == b':':
+			return int(rest)
+		if kind == b'$':
+			length = int(rest)
+			if length < 0:
+				return None
+			data = self._file.read(length + 2)
+			return data[:-2]
+		if kind == b'*':
+			count = int(rest)
+			return None if count < 0 else [self._read_reply() for _ in range(count)]
+		raise RedisError(f'Réponse RESP inattendue: {line!r}')
+
+
+class RedisSessionStore(BaseSessionStore):
+	"""États stockés avec `SET key value PX ttl` : l'expiration est gérée par Redis."""
+
+	def __init__(self, ttl=DEFAULT_TTL, location='redis://127.0.0.1:6379/0', timeout=1.0, **options):
+		super().__init__(ttl=ttl)
+		self.client = RespClient.from_url(location, timeout=timeout)
+
+	def get(self, session_id):
+		payload = self.client.execute('GET', self.make_key(session_id))
+		return None if payload is None else json.loads(payload)
+
+	def set(self, session_id, state, ttl=None):
+		ttl_ms = int((self.ttl if ttl is None else ttl) * 1000)
+		self.client.execute('SET', self.make_key(session_id), json.dumps(state), 'PX', ttl_ms)
+
+	def delete(self, session_id):
+		self.client.execute('DEL', self.make_key(session_id))
+
+
+_store = None
+
+
+def get_session_store() -> BaseSessionStore:
+	global _store
+	if _store is None:
+		config = getattr(settings, 'TRIAGE_SESSION_STORE', {})
+		backend = import_string(config.get('BACKEND', 'apps.session_store.LocMemSessionStore'))
+		_store = backend(ttl=config.get('TTL', DEFAULT_TTL), **config.get('OPTIONS', {}))
+	return _store
+
+
+def checkpoint_every() -> int:
+	"""Nombre de réponses entre deux écritures en base (1 = à chaque réponse, 0 = seulement à la complétion)."""
+	return int(getattr(settings, 'TRIAGE_SESSION_STORE', {}).get('CHECKPOINT_EVERY', 1))
+
+
+@receiver(setting_changed)
+def reset_session_store(setting, **kwargs):
+	global _store
+	if setting == 'TRIAGE_SESSION_STORE':
+		_store = None
@@ -0,0 +1,44 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .metrics import time_queries
+from .models import BaseRelais, DiagnosticPaludisme, Patient, Tombstone, TriageSession
+from .rollups import record_diagnostics
+
+
+SYNCED_MODELS = (BaseRelais, Patient, DiagnosticPaludisme, TriageSession)
+
+
+def record_tombstone(sender, instance, **kwargs):
+	"""Enregistrer une tombe pour chaque suppression (y compris en cascade) d'un modèle synchronisé."""
+	Tombstone.objects.create(model_name=sender.__name__, object_id=instance.pk)
+
+
+def touch_set_null_sessions(sender, instance, **kwargs):
+	"""Le SET_NULL des sessions de triage est un UPDATE sans auto_now : dater le changement pour le pull."""
+	if sender is Patient:
+		TriageSession.objects.filter(patient=instance).update(updated_at=timezone.now())
+	else:
+		TriageSession.objects.filter(relais=instance).update(updated_at=timezone.now())
+
+
+# Récepteurs limités aux modèles concernés : un récepteur sans `sender` désactive la suppression
+# rapide (DELETE direct, sans SELECT préalable des lignes) de tous les modèles, SyncQueue compris.
+for model in SYNCED_MODELS:
+	post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'tombstone-{model.__name__}')
+for model in (Patient, BaseRelais):
+	pre_delete.connect(touch_set_null_sessions, sender=model, dispatch_uid=f'touch-sessions-{model.__name__}')
+
+
+@receiver(post_delete, sender=DiagnosticPaludisme)
+def remove_from_rollups(sender, instance, **kwargs):
+	record_diagnostics([instance], sign=-1)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+	"""Compter les requêtes SQL par requête HTTP (apps.metrics) ; une seule fois par connexion."""
+	if time_queries not in connection.execute_wrappers:
+		connection.execute_wrappers.append(time_queries)
@@ -0,0 +1,473 @@
+"""Synchronisation : commit des opérations client et pull incrémental (delta) basé sur updated_at.
+
+Pull incrémental
+
+Le curseur est opaque pour le client (JSON encodé en base64 url-safe) :
+{"v": 1, "since": <iso|null>, "hw": <iso|null>, "stream": <int>, "after": [<iso>, <id>] | null}
+
+- `since` : borne basse exclusive (updated_at > since) ;
+- `hw` : borne haute fixée au début du pull (updated_at <= hw) pour que la pagination termine.
+  Elle est prise à `now() - SYNC_PULL_SAFETY_LAG` : une transaction qui date ses lignes avant hw
+  mais valide après le pull serait sinon sautée pour toujours (le pull suivant part de hw).
+  Le délai doit dépasser la durée maximale d'une transaction d'écriture ;
+- `stream` / `after` : position (keyset sur (updated_at, id)) dans le flux en cours.
+
+Quand tous les flux sont épuisés, le curseur renvoyé repart de `since = hw` : le client le
+conserve et le renvoie tel quel à la synchronisation suivante.
+"""
+import base64
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import BaseRelais, DiagnosticPaludisme, Patient, PatientCodeSequence, SyncIdempotencyKey, SyncQueue, Tombstone, TriageSession
+from .rollups import record_diagnostics
+from .serializers import (
+	BaseRelaisSerializer,
+	DiagnosticPaludismeSerializer,
+	DiagnosticPaludismeSyncSerializer,
+	PatientSerializer,
+	TriageSessionSerializer,
+)
+
+
+CURSOR_VERSION = 1
+PULL_DEFAULT_LIMIT = 500
+PULL_MAX_LIMIT = 2000
+
+# Ordre des flux : les parents avant les enfants, les suppressions en dernier
+PULL_STREAMS = (
+	('BaseRelais', BaseRelais, BaseRelaisSerializer, 'updated_at'),
+	('Patient', Patient, PatientSerializer, 'updated_at'),
+	('DiagnosticPaludisme', DiagnosticPaludisme, DiagnosticPaludismeSyncSerializer, 'updated_at'),
+	('TriageSession', TriageSession, TriageSessionSerializer, 'updated_at'),
+	('Tombstone', Tombstone, None, 'deleted_at'),
+)
+
+
+class InvalidCursor(ValueError):
+	pass
+
+
+def encode_cursor(state: dict) -> str:
+	raw = json.dumps(state, separators=(',', ':')).encode()
+	return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> dict:
+	try:
+		raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+		state = json.loads(raw)
+		if state.get('v') != CURSOR_VERSION:
+			raise InvalidCursor('Version de curseur inconnue')
+		since = _parse_dt(state.get('since'))
+		hw = _parse_dt(state.get('hw'))
+		stream = int(state.get('stream', 0))
+		after = state.get('after')
+		if after is not None:
+			after = (_parse_dt(after[0]), int(after[1]))
+	except InvalidCursor:
+		raise
+	except Exception:
+		raise InvalidCursor('Curseur invalide')
+	if not 0 <= stream < len(PULL_STREAMS):
+		raise InvalidCursor('Curseur invalide')
+	return {'since': since, 'hw': hw, 'stream': stream, 'after': after}
+
+
+def _parse_dt(value):
+	return datetime.fromisoformat(value) if value else None
+
+
+def _iso(value):
+	return value.isoformat() if value else None
+
+
+def pull_changes(cursor=None, limit=PULL_DEFAULT_LIMIT) -> dict:
+	"""Retourner une page bornée de changements à partir d'un curseur (None = synchronisation initiale)."""
+	state = decode_cursor(cursor) if cursor else {'since': None, 'hw': None, 'stream': 0, 'after': None}
+	since, stream, after = state['since'], state['stream'], state['after']
+	hw = state['hw'] or timezone.now() - timedelta(seconds=settings.SYNC_PULL_SAFETY_LAG)
+	limit = max(1, min(int(limit), PULL_MAX_LIMIT))
+
+	changes = {name: [] for name, _, serializer_class, _ in PULL_STREAMS if serializer_class}
+	deleted = []
+	remaining = limit
+
+	while stream < len(PULL_STREAMS) and remaining > 0:
+		name, model, serializer_class, ts_field = PULL_STREAMS[stream]
+		qs = model.objects.filter(**{f'{ts_field}__lte': hw})
+		if since:
+			qs = qs.filter(**{f'{ts_field}__gt': since})
+		if after:
+			qs = qs.filter(Q(**{f'{ts_field}__gt': after[0]}) | Q(**{ts_field: after[0], 'id__gt': after[1]}))
+		if model is DiagnosticPaludisme:
+			qs = qs.select_related('patient', 'relais')
+		rows = list(qs.order_by(ts_field, 'id')[:remaining + 1])
+
+		page, more_in_stream = rows[:remaining], len(rows) > remaining
+		if serializer_class:
+			changes[name].extend(serializer_class(page, many=True).data)
+		else:
+			deleted.extend(
+				{'model': t.model_name, 'id': t.object_id, 'deleted_at': _iso(t.deleted_at)} for t in page
+			)
+		remaining -= len(page)
+
+		if more_in_stream:
+			last = page[-1]
+			after = (getattr(last, ts_field), last.id)
+			break
+		stream += 1
+		after = None
+
+	has_more = stream < len(PULL_STREAMS)
+	if has_more:
+		next_state = {'since': _iso(since), 'hw': _iso(hw), 'stream': stream,
+			'after': [_iso(after[0]), after[1]] if after else None}
+	else:
+		next_state = {'since': _iso(hw), 'hw': None, 'stream': 0, 'after': None}
+	next_state['v'] = CURSOR_VERSION
+
+	return {
+		'changes': changes,
+		'deleted': deleted,
+		'has_more': has_more,
+		'next': encode_cursor(next_state),
+	}
+
+
+def apply_operation(op, audit=True) -> dict:
+	"""Appliquer une opération client ; lève une exception en cas d'échec (rollback du savepoint appelant).
+
+	`audit=False` : pas de ligne SyncQueue de succès (rejeu d'une ligne existante par le worker).
+	"""
+	model_name = op.get('model')
+	operation = op.get('operation')
+	data = op.get('data')
+	res = {'client_id': op.get('client_id'), 'status': 'error'}
+
+	def log(object_id):
+		if audit:
+			SyncQueue.objects.create(model_name=model_name, object_id=str(object_id), operation=operation, data=data, synced=True)
+
+	if model_name == 'Patient':
+		if operation == 'CREATE':
+			# validate relais existence via serializer
+			ser = PatientSerializer(data=data)
+			ser.is_valid(raise_exception=True)
+			obj = ser.save()
+			log(obj.id)
+			res.update({'status': 'ok', 'server_id': obj.id})
+		elif operation == 'UPDATE':
+			obj = Patient.objects.get(id=data.get('id'))
+			ser = PatientSerializer(obj, data=data, partial=True)
+			ser.is_valid(raise_exception=True)
+			ser.save()
+			log(obj.id)
+			res.update({'status': 'ok', 'server_id': obj.id})
+		elif operation == 'DELETE':
+			obj = Patient.objects.get(id=data.get('id'))
+			obj.delete()
+			log(data.get('id'))
+			res.update({'status': 'ok'})
+		else:
+			res.update({'error': 'Unknown operation'})
+
+	elif model_name == 'DiagnosticPaludisme':
+		if operation == 'CREATE':
+			ser = DiagnosticPaludismeSerializer(data=data)
+			ser.is_valid(raise_exception=True)
+			obj = ser.save()
+			log(obj.id)
+			res.update({'status': 'ok', 'server_id': obj.id})
+		else:
+			res.update({'error': 'Only CREATE supported for DiagnosticPaludisme in batch'})
+
+	elif model_name == 'TriageSession':
+		if operation == 'CREATE':
+			ser = TriageSessionSerializer(data=data)
+			ser.is_valid(raise_exception=True)
+			obj = ser.save()
+			log(obj.id)
+			res.update({'status': 'ok', 'server_id': obj.id})
+		elif operation == 'UPDATE':
+			obj = TriageSession.objects.get(id=data.get('id'))
+			ser = TriageSessionSerializer(obj, data=data, partial=True)
+			ser.is_valid(raise_exception=True)
+			ser.save()
+			log(obj.id)
+			res.update({'status': 'ok', 'server_id': obj.id})
+		else:
+			res.update({'error': 'Unsupported operation for TriageSession'})
+
+	else:
+		res.update({'error': f'Unsupported model: {model_name}'})
+
+	return res
+
+
+def load_idempotency_ledger(ops) -> dict:
+	"""Résultats déjà enregistrés pour les clés d'idempotence du lot (une requête indexée)."""
+	keys = {op.get('idempotency_key') for op in ops if op.get('idempotency_key')}
+	if not keys:
+		return {}
+	return {
+		entry.key: entry.result
+		for entry in SyncIdempotencyKey.objects.filter(key__in=keys)
+	}
+
+
+def apply_operations(ops) -> list:
+	"""Appliquer les opérations une par une, dans l'ordre (chemin historique de /api/sync/commit/).
+
+	Chaque opération tourne dans son propre savepoint : un échec n'annule que cette opération
+	et laisse la transaction du lot utilisable. Une clé d'idempotence déjà connue renvoie le
+	résultat enregistré sans toucher aux modèles.
+	"""
+	results = []
+	ledger = load_idempotency_ledger(ops)
+
+	with transaction.atomic():
+		for op in ops:
+			client_id = op.get('client_id')
+			model_name = op.get('model')
+			operation = op.get('operation')
+			data = op.get('data')
+			idemp = op.get('idempotency_key')
+
+			if idemp and idemp in ledger:
+				results.append(dict(ledger[idemp], client_id=client_id))
+				continue
+
+			try:
+				with transaction.atomic():
+					res = apply_operation(op)
+					if idemp and res['status'] == 'ok':
+						SyncIdempotencyKey.objects.create(key=idemp, model_name=model_name, operation=operation, result=res)
+			except Exception as e:
+				if idemp and isinstance(e, IntegrityError):
+					# Clé enregistrée entre-temps par un lot concurrent : rejouer son résultat
+					stored = load_idempotency_ledger([op]).get(idemp)
+					if stored is not None:
+						ledger[idemp] = stored
+						results.append(dict(stored, client_id=client_id))
+						continue
+				# enregistrer l'échec dans SyncQueue pour le débogage
+				SyncQueue.objects.create(model_name=model_name, object_id=str(data.get('id') or ''), operation=operation, data=data,
+					synced=False, idempotency_key=idemp or '', last_error=str(e))
+				res = {'client_id': client_id, 'status': 'error', 'error': str(e)}
+			else:
+				if idemp and res['status'] == 'ok':
+					ledger[idemp] = res
+
+			results.append(res)
+
+	return results
+
+
+SYNC_MODELS = {
+	'Patient': (Patient, PatientSerializer, ('CREATE', 'UPDATE', 'DELETE')),
+	'DiagnosticPaludisme': (DiagnosticPaludisme, DiagnosticPaludismeSerializer, ('CREATE',)),
+	'TriageSession': (TriageSession, TriageSessionSerializer, ('CREATE', 'UPDATE')),
+}
+
+UNSUPPORTED_OPERATION_ERRORS = {
+	'Patient': 'Unknown operation',
+	'DiagnosticPaludisme': 'Only CREATE supported for DiagnosticPaludisme in batch',
+	'TriageSession': 'Unsupported operation for TriageSession',
+}
+
+
+def apply_operations_bulk(ops) -> list:
+	"""Appliquer les opérations groupées par modèle et type (mode `bulk` de /api/sync/commit/).
+
+	Même contrat de `results` que `apply_operations` (un élément par opération, dans l'ordre).
+	Les groupes sont appliqués dans cet ordre : créations, mises à jour, suppressions.
+	Les clés d'idempotence déjà connues sont rejouées sans toucher aux modèles ; une clé répétée
+	dans le lot reprend le résultat de sa première occurrence. En cas d'erreur base de données,
+	le lot est rejoué opération par opération (un savepoint par opération).
+	"""
+	ledger = load_idempotency_ledger(ops)
+	results = [None] * len(ops)
+	pending, first_by_key, duplicates = [], {}, []
+	for i, op in enumerate(ops):
+		key = op.get('idempotency_key')
+		if key and key in ledger:
+			results[i] = dict(ledger[key], client_id=op.get('client_id'))
+		elif key and key in first_by_key:
+			duplicates.append((i, first_by_key[key]))
+		else:
+			if key:
+				first_by_key[key] = i
+			pending.append(i)
+
+	try:
+		with transaction.atomic():
+			applied = BulkSyncApplier([ops[i] for i in pending]).apply()
+			SyncIdempotencyKey.objects.bulk_create([
+				SyncIdempotencyKey(key=ops[i]['idempotency_key'], model_name=ops[i]['model'], operation=ops[i]['operation'], result=res)
+				for i, res in zip(pending, applied)
+				if ops[i].get('idempotency_key') and res['status'] == 'ok'
+			])
+	except DatabaseError:
+		return apply_operations(ops)
+
+	for i, res in zip(pending, applied):
+		results[i] = res
+	for i, first in duplicates:
+		results[i] = dict(results[first], client_id=ops[i].get('client_id'))
+	return results
+
+
+def allocate_patient_codes(rows) -> None:
+	"""Attribuer `code` aux données patient sans code : un bloc de numéros réservé par relais."""
+	by_relais = defaultdict(list)
+	for row in rows:
+		relais = row.get('relais')
+		if relais and not row.get('code'):
+			by_relais[relais.id].append(row)
+	for relais_id, group in by_relais.items():
+		for row, value in zip(group, PatientCodeSequence.allocate(relais_id, len(group))):
+			row['code'] = PatientCodeSequence.format_code(relais_id, value)
+
+
+def _as_pk(value):
+	try:
+		return int(value)
+	except (TypeError, ValueError):
+		return None
+
+
+class BulkSyncApplier:
+
+	def __init__(self, ops):
+		self.ops = ops
+		self.results = [{'client_id': op.get('client_id'), 'status': 'error'} for op in ops]
+		self.audit = {}
+
+	def apply(self) -> list:
+		groups = defaultdict(list)
+		for i, op in enumerate(self.ops):
+			model_name, operation = op.get('model'), op.get('operation')
+			if model_name not in SYNC_MODELS:
+				self.results[i]['error'] = f'Unsupported model: {model_name}'
+			elif operation not in SYNC_MODELS[model_name][2]:
+				self.results[i]['error'] = UNSUPPORTED_OPERATION_ERRORS[model_name]
+			else:
+				groups[(model_name, operation)].append(i)
+
+		context = {'preloaded': self.preload(groups)}
+		for model_name in SYNC_MODELS:
+			self.create(model_name, groups.get((model_name, 'CREATE'), []), context)
+		for model_name in SYNC_MODELS:
+			self.update(model_name, groups.get((model_name, 'UPDATE'), []), context)
+		self.delete_patients(groups.get(('Patient', 'DELETE'), []), context)
+
+		SyncQueue.objects.bulk_create([self.audit[i] for i in sorted(self.audit)])
+		return self.results
+
+	def preload(self, groups) -> dict:
+		"""Charger en une requête par modèle toutes les clés référencées par le lot."""
+		ids = {BaseRelais: set(), Patient: set(), TriageSession: set()}
+		for (model_name, operation), indexes in groups.items():
+			for i in indexes:
+				data = self.ops[i]['data']
+				ids[BaseRelais].add(_as_pk(data.get('relais')))
+				ids[Patient].add(_as_pk(data.get('patient')))
+				if operation != 'CREATE':
+					ids[SYNC_MODELS[model_name][0]].add(_as_pk(data.get('id')))
+		return {model: model.objects.in_bulk([pk for pk in pks if pk is not None]) for model, pks in ids.items()}
+
+	def ok(self, i, obj_id, server_id=None):
+		op = self.ops[i]
+		self.results[i].update({'status': 'ok'})
+		if op['operation'] != 'DELETE':
+			self.results[i]['server_id'] = server_id
+		self.audit[i] = SyncQueue(model_name=op['model'], object_id=str(obj_id), operation=op['operation'], data=op['data'], synced=True)
+
+	def fail(self, i, error):
+		op = self.ops[i]
+		data = op['data']
+		self.results[i].update({'status': 'error', 'error': str(error)})
+		self.audit[i] = SyncQueue(model_name=op['model'], object_id=str(data.get('id') or ''), operation=op['operation'], data=data,
+			synced=False, idempotency_key=op.get('idempotency_key') or '', last_error=str(error))
+
+	def validated(self, serializer_class, indexes, context, instances=None):
+		"""Valider chaque opération ; retourner [(index, serializer)] pour celles qui passent."""
+		valid = []
+		for i in indexes:
+			data = self.ops[i]['data']
+			instance = instances(i) if instances else None
+			ser = serializer_class(instance, data=data, partial=instance is not None, context=context)
+			if ser.is_valid():
+				valid.append((i, ser))
+			else:
+				self.fail(i, serializers.ValidationError(ser.errors))
+		return valid
+
+	def create(self, model_name, indexes, context):
+		if not indexes:
+			return
+		model, serializer_class, _ = SYNC_MODELS[model_name]
+		valid = self.validated(serializer_class, indexes, context)
+		if model is Patient:
+			allocate_patient_codes([ser.validated_data for _, ser in valid])
+		created = []
+		for i, ser in valid:
+			try:
+				created.append((i, model(**ser.prepare_create(ser.validated_data))))
+			except serializers.ValidationError as e:
+				self.fail(i, e)
+		model.objects.bulk_create([obj for _, obj in created])
+		if model is DiagnosticPaludisme:
+			record_diagnostics([obj for _, obj in created])
+		for i, obj in created:
+			self.ok(i, obj.id, obj.id)
+
+	def update(self, model_name, indexes, context):
+		if not indexes:
+			return
+		model, serializer_class, _ = SYNC_MODELS[model_name]
+		objects = context['preloaded'][model]
+		found = []
+		for i in indexes:
+			if _as_pk(self.ops[i]['data'].get('id')) in objects:
+				found.append(i)
+			else:
+				self.fail(i, model.DoesNotExist(f'{model.__name__} matching query does not exist.'))
+
+		changed, fields = {}, {'updated_at'}
+		for i, ser in self.validated(serializer_class, found, context, instances=lambda i: objects[_as_pk(self.ops[i]['data'].get('id'))]):
+			obj = ser.instance
+			for attr, value in ser.validated_data.items():
+				setattr(obj, attr, value)
+				fields.add(attr)
+			changed[obj.pk] = obj
+			self.ok(i, obj.id, obj.id)
+		if changed:
+			# bulk_update n'applique pas auto_now : dater explicitement
+			now = timezone.now()
+			for obj in changed.values():
+				obj.updated_at = now
+			model.objects.bulk_update(list(changed.values()), sorted(fields))
+
+	def delete_patients(self, indexes, context):
+		if not indexes:
+			return
+		existing = context['preloaded'][Patient]
+		ids = set()
+		for i in indexes:
+			pk = _as_pk(self.ops[i]['data'].get('id'))
+			if pk in existing and pk not in ids:
+				ids.add(pk)
+				self.ok(i, self.ops[i]['data'].get('id'))
+			else:
+				self.fail(i, Patient.DoesNotExist('Patient matching query does not exist.'))
+		Patient.objects.filter(id__in=ids).delete()
@@ -0,0 +1,160 @@
+"""Worker de rejeu des opérations en échec de SyncQueue (commande `run_sync_worker`).
+
+Une ligne `synced=False` est rejouée avec `apply_operation` (même validation que /api/sync/commit/).
+Sa clé d'idempotence éventuelle est enregistrée dans SyncIdempotencyKey avec le résultat du rejeu.
+Backoff exponentiel : après `retry_count` tentatives, la ligne redevient éligible
+`BASE_DELAY * 2**retry_count` secondes (plafonné à `MAX_DELAY`) après `last_attempt_at`.
+Au-delà de `MAX_RETRIES` tentatives, elle est abandonnée (« morte ») et reste en base pour analyse.
+
+Réservation (plusieurs workers en parallèle) : dans une transaction courte, le worker sélectionne
+un lot éligible puis incrémente `retry_count` et date `last_attempt_at` ; le lot n'est alors plus
+éligible pour les autres workers jusqu'à la fin de son délai. Sous PostgreSQL, la sélection utilise
+`select_for_update(skip_locked=True)` : les workers se partagent la file sans s'attendre. Sous SQLite,
+le profil BEGIN IMMEDIATE sérialise les réservations. Chaque ligne est ensuite rejouée dans sa
+propre transaction ; un worker arrêté en cours de lot laisse ses lignes redevenir éligibles.
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import SyncIdempotencyKey, SyncQueue
+from .sync import apply_operation, load_idempotency_ledger
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+	'BATCH_SIZE': 100,
+	'BASE_DELAY': 30,     # secondes avant la première nouvelle tentative
+	'MAX_DELAY': 3600,
+	'MAX_RETRIES': 8,
+	'POLL_INTERVAL': 5,   # secondes d'attente quand la file est vide
+}
+
+
+def worker_settings() -> dict:
+	return {**DEFAULTS, **getattr(settings, 'SYNC_WORKER', {})}
+
+
+def retry_delay(retry_count, conf) -> int:
+	return min(conf['BASE_DELAY'] * 2 ** retry_count, conf['MAX_DELAY'])
+
+
+def eligible(now, conf) -> Q:
+	"""Lignes en échec dont le délai de backoff est écoulé : une condition par niveau de retry_count."""
+	ready = Q(last_attempt_at__isnull=True, retry_count__lt=conf['MAX_RETRIES'])
+	for n in range(conf['MAX_RETRIES']):
+		ready |= Q(retry_count=n, last_attempt_at__lte=now - timedelta(seconds=retry_delay(n, conf)))
+	return Q(synced=False) & ready
+
+
+def queue_stats(conf=None) -> dict:
+	"""Profondeur de la file (une requête, index partiel des lignes non synchronisées)."""
+	conf = conf or worker_settings()
+	now = timezone.now()
+	stats = SyncQueue.objects.filter(synced=False).aggregate(
+		pending=Count('id'),
+		ready=Count('id', filter=eligible(now, conf)),
+		dead=Count('id', filter=Q(retry_count__gte=conf['MAX_RETRIES'])),
+		oldest=Min('date'),
+	)
+	oldest = stats.pop('oldest')
+	stats['oldest_age_seconds'] = round((now - oldest).total_seconds(), 1) if oldest else 0
+	return stats
+
+
+class SyncWorker:
+
+	def __init__(self, batch_size=None, conf=None):
+		self.conf = conf or worker_settings()
+		self.batch_size = batch_size or self.conf['BATCH_SIZE']
+		self.processed = 0
+		self.succeeded = 0
+		self.failed = 0
+		self.abandoned = 0
+		self.started = time.monotonic()
+
+	def claim(self) -> list:
+		"""Réserver un lot de lignes éligibles (transaction courte)."""
+		now = timezone.now()
+		with transaction.atomic():
+			queryset = SyncQueue.objects.filter(eligible(now, self.conf)).order_by('date', 'id')
+			if connection.features.has_select_for_update_skip_locked:
+				queryset = queryset.select_for_update(skip_locked=True)
+			rows = list(queryset[:self.batch_size])
+			if rows:
+				SyncQueue.objects.filter(id__in=[row.id for row in rows]).update(
+					retry_count=F('retry_count') + 1, last_attempt_at=now,
+				)
+		return rows
+
+	def process(self, row) -> bool:
+		"""Rejouer une ligne. Comme `apply_operations`, le résultat est enregistré sous sa clé
+		d'idempotence dans la transaction du rejeu ; une clé déjà enregistrée (le client a renvoyé
+		l'opération entre-temps) clôt la ligne sans réappliquer l'opération."""
+		key = row.idempotency_key
+		op = {'model': row.model_name, 'operation': row.operation, 'data': row.data, 'idempotency_key': key}
+		error = None
+		try:
+			with transaction.atomic():
+				stored = load_idempotency_ledger([op]).get(key)
+				res = stored or apply_operation(op, audit=False)
+				if res['status'] == 'ok':
+					if key and stored is None:
+						SyncIdempotencyKey.objects.create(key=key, model_name=row.model_name, operation=row.operation, result=res)
+					SyncQueue.objects.filter(id=row.id).update(
+						synced=True, object_id=str(res.get('server_id') or row.object_id), last_error='',
+					)
+		except Exception as e:
+			logger.exception('Rejeu SyncQueue #%s (%s %s) en échec', row.id, row.model_name, row.operation)
+			res = {'status': 'error'}
+			error = f'{type(e).__name__}: {e}'
+		self.processed += 1
+		if res['status'] == 'ok':
+			self.succeeded += 1
+			return True
+		self.failed += 1
+		updates = {'last_error': error or res.get('error', '')}
+		# 'error' sans exception : modèle / opération non pris en charge, inutile de réessayer
+		if 'error' in res or row.retry_count + 1 >= self.conf['MAX_RETRIES']:
+			updates['retry_count'] = max(self.conf['MAX_RETRIES'], row.retry_count + 1)
+			self.abandoned += 1
+		SyncQueue.objects.filter(id=row.id).update(**updates)
+		return False
+
+	def run_once(self) -> int:
+		"""Traiter un lot ; renvoie le nombre de lignes réservées (0 : rien d'éligible)."""
+		rows = self.claim()
+		for row in rows:
+			self.process(row)
+		return len(rows)
+
+	def metrics(self) -> dict:
+		elapsed = time.monotonic() - self.started
+		return {
+			'processed': self.processed,
+			'succeeded': self.succeeded,
+			'failed': self.failed,
+			'abandoned': self.abandoned,
+			'rows_per_second': self.processed / elapsed if elapsed else 0.0,
+			**{f'queue_{k}': v for k, v in queue_stats(self.conf).items()},
+		}
+
+	def write_metrics(self, path) -> None:
+		"""Fichier texte au format Prometheus (collecteur textfile de node_exporter), écrit atomiquement."""
+		metrics = self.metrics()
+		lines = []
+		for name, value in metrics.items():
+			kind = 'gauge' if name.startswith('queue_') or name == 'rows_per_second' else 'counter'
+			metric = f'assistant_sync_worker_{name}' + ('_total' if kind == 'counter' else '')
+			lines += [f'# TYPE {metric} {kind}', f'{metric}{{pid="{os.getpid()}"}} {value}']
+		tmp = f'{path}.{os.getpid()}.tmp'
+		with open(tmp, 'w', encoding='utf-8') as fh:
+			fh.write('\n'.join(lines) + '\n')
+		os.replace(tmp, path)
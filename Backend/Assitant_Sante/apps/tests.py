@@ -1,3 +1,1289 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .decision_engine import QUESTION_PRIORITIES, compute_hypotheses, next_question, triage
+from .decision_trees import TreeError, TreeRegistry, get_tree
+from . import outbreaks, sync_worker
+from .metrics import REGISTRY
+from .rollups import rebuild
+from .models import BaseRelais, DiagnosticDailyRollup, DiagnosticPaludisme, OutbreakState, Patient, PatientCodeSequence, SyncIdempotencyKey, SyncQueue, TriageSession
+from .renderers import WIRE_KEY_DICTIONARIES, WIRE_KEY_INDEXES, map_keys, msgpack
+from .session_store import LocMemSessionStore, RedisSessionStore, get_session_store
+from .sync_worker import SyncWorker
+
+
+class CompiledEngineTests(TestCase):
+    def test_output_identical_to_reference_engine(self):
+        values = [True, False, 1, 0, 38.5, None]
+        for mask in range(1 << len(QUESTION_PRIORITIES)):
+            symptoms = {
+                q: values[(mask + i) % len(values)]
+                for i, q in enumerate(QUESTION_PRIORITIES)
+                if mask & (1 << i)
+            }
+            for poids, rdt in [(None, None), (18.5, "POS"), (4, "POS"), (40, "NEG")]:
+                self.assertEqual(
+                    json.dumps(compute_hypotheses(symptoms, poids, rdt)),
+                    json.dumps(triage(symptoms, poids, rdt)),
+                )
+
+    def test_output_is_fresh_for_each_call(self):
+        first = triage({"fievre": True})
+        first["hypotheses"][0]["score"] = -1
+        first["next_questions"].append("x")
+        self.assertEqual(triage({"fievre": True}), compute_hypotheses({"fievre": True}))
+
+
+class TriageBatchAPITests(TestCase):
+    def test_batch_matches_single_triage_and_bulk_saves(self):
+        records = [
+            {"symptomes": {"fievre": True, "frissons": True}, "poids": 18.5, "rdt_result": "POS"},
+            {"symptomes": {"toux": True, "diarrhee": True}},
+            {"symptomes": {"fievre": True, "convulsions": True}, "poids": 9},
+        ]
+        with self.assertNumQueries(1):
+            resp = self.client.post(
+                "/api/triage/batch/", {"records": records, "save": True}, content_type="application/json"
+            )
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual(len(results), 3)
+        for rec, res in zip(records, results):
+            session_id = res.pop("session_id")
+            self.assertEqual(res, triage(rec["symptomes"], rec.get("poids"), rec.get("rdt_result")))
+            self.assertEqual(TriageSession.objects.get(id=session_id).engine_output, res)
+
+    @override_settings(TRIAGE_BATCH_MAX_RECORDS=2)
+    def test_rejects_batches_above_the_limit(self):
+        records = [{"symptomes": {"fievre": True}}] * 3
+        resp = self.client.post("/api/triage/batch/", {"records": records}, content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("records", resp.json())
+        resp = self.client.post("/api/triage/batch/", {"records": records[:2]}, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+
+
+class DiagnosticListingQueryCountTests(TestCase):
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="Relais 1", village="Kouandé", telephone="+229000000")
+        self.patients = Patient.objects.bulk_create([
+            Patient(code=f"P-{i}", nom=f"Patient {i}", age=5, sexe="F", village="Kouandé", relais=self.relais)
+            for i in range(20)
+        ])
+
+    def create_diagnostics(self, count):
+        DiagnosticPaludisme.objects.bulk_create([
+            DiagnosticPaludisme(
+                patient=self.patients[i % len(self.patients)], relais=self.relais, symptomes={"fievre": True},
+                classification="SIMPLE", recommendation="ACT",
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+    def count_listing_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/diagnostics/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.json()["results"][0]["patient_detail"]["code"].startswith("P-"))
+        return len(ctx.captured_queries)
+
+    def test_listing_query_count_is_constant(self):
+        self.create_diagnostics(10)
+        small = self.count_listing_queries()
+        self.create_diagnostics(9990)
+        self.assertEqual(DiagnosticPaludisme.objects.count(), 10000)
+        self.assertEqual(self.count_listing_queries(), small)
+        self.assertLessEqual(small, 2)
+
+    def test_cursor_pagination_walks_all_rows(self):
+        self.create_diagnostics(120)
+        seen = []
+        url = "/api/diagnostics/?page_size=50"
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(row["id"] for row in page["results"])
+            url = page["next"]
+        self.assertEqual(len(seen), 120)
+        self.assertEqual(len(set(seen)), 120)
+
+
+@override_settings(SYNC_PULL_SAFETY_LAG=0)
+class SyncPullAPITests(TestCase):
+    def pull_all(self, since=None, limit=3):
+        changes, deleted = {}, []
+        token = since
+        while True:
+            url = f"/api/sync/pull/?limit={limit}" + (f"&since={token}" if token else "")
+            page = self.client.get(url).json()
+            for name, rows in page["changes"].items():
+                changes.setdefault(name, []).extend(row["id"] for row in rows)
+            deleted.extend((d["model"], d["id"]) for d in page["deleted"])
+            token = page["next"]
+            if not page["has_more"]:
+                return changes, deleted, token
+
+    def test_initial_pull_then_delta_with_tombstones(self):
+        relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        patients = [
+            Patient.objects.create(code=f"P-{i}", nom=f"N{i}", age=3, sexe="M", village="V", relais=relais)
+            for i in range(5)
+        ]
+        changes, deleted, cursor = self.pull_all()
+        self.assertEqual(changes["BaseRelais"], [relais.id])
+        self.assertEqual(sorted(changes["Patient"]), sorted(p.id for p in patients))
+        self.assertEqual(deleted, [])
+
+        changes, deleted, cursor = self.pull_all(cursor)
+        self.assertEqual(sum(len(ids) for ids in changes.values()), 0)
+
+        patients[1].nom = "Renommé"
+        patients[1].save()
+        deleted_id = patients[2].id
+        patients[2].delete()
+        changes, deleted, _ = self.pull_all(cursor)
+        self.assertEqual(changes["Patient"], [patients[1].id])
+        self.assertEqual(changes["BaseRelais"], [])
+        self.assertEqual(deleted, [("Patient", deleted_id)])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get("/api/sync/pull/?since=garbage").status_code, 400)
+
+    @override_settings(SYNC_PULL_SAFETY_LAG=60)
+    def test_recent_writes_wait_for_the_safety_lag(self):
+        relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        changes, _, cursor = self.pull_all()
+        self.assertEqual(changes["BaseRelais"], [])
+        # La ligne, datée après la borne haute du premier pull, est servie au suivant
+        with patch("apps.sync.timezone.now", return_value=timezone.now() + timedelta(seconds=61)):
+            changes, _, _ = self.pull_all(cursor)
+        self.assertEqual(changes["BaseRelais"], [relais.id])
+
+    def test_bulk_delete_of_unsynced_models_stays_fast(self):
+        SyncQueue.objects.create(model_name="Patient", object_id="1", operation="CREATE", data={"a": 1}, synced=True)
+        with CaptureQueriesContext(connection) as ctx:
+            SyncQueue.objects.filter(synced=True).delete()
+        self.assertEqual([q["sql"].split()[0] for q in ctx.captured_queries], ["DELETE"])
+
+
+class SyncCommitBulkTests(TestCase):
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        self.patient = Patient.objects.create(code="P-x", nom="Existant", age=4, sexe="F", village="V", relais=self.relais)
+
+    def operations(self, creates=3):
+        ops = [
+            {"client_id": f"tmp-{i}", "model": "Patient", "operation": "CREATE",
+             "data": {"nom": f"N{i}", "age": 2, "sexe": "M", "village": "V", "relais": self.relais.id}}
+            for i in range(creates)
+        ]
+        ops += [
+            {"client_id": "bad-relais", "model": "Patient", "operation": "CREATE",
+             "data": {"nom": "X", "age": 2, "sexe": "M", "village": "V", "relais": 999}},
+            {"client_id": "upd", "model": "Patient", "operation": "UPDATE", "data": {"id": self.patient.id, "nom": "Modifié"}},
+            {"client_id": "upd-missing", "model": "Patient", "operation": "UPDATE", "data": {"id": 999, "nom": "?"}},
+            {"client_id": "diag", "model": "DiagnosticPaludisme", "operation": "CREATE",
+             "data": {"patient": self.patient.id, "relais": self.relais.id, "symptomes": {"fievre": True},
+                      "classification": "SIMPLE", "recommendation": "ACT"}},
+            {"client_id": "diag-upd", "model": "DiagnosticPaludisme", "operation": "UPDATE", "data": {"id": 1}},
+            {"client_id": "other", "model": "Vaccination", "operation": "CREATE", "data": {}},
+        ]
+        return ops
+
+    def commit(self, ops, bulk):
+        resp = self.client.post("/api/sync/commit/", {"operations": ops, "bulk": bulk}, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()["results"]
+
+    def test_bulk_results_match_sequential_contract(self):
+        sid = transaction.savepoint()
+        sequential = self.commit(self.operations(), bulk=False)
+        transaction.savepoint_rollback(sid)
+        self.patient.refresh_from_db()
+        bulk = self.commit(self.operations(), bulk=True)
+
+        strip = lambda results: [{k: v for k, v in r.items() if k != "server_id"} for r in results]
+        self.assertEqual(strip(bulk), strip(sequential))
+        self.assertEqual([("server_id" in r) for r in bulk], [("server_id" in r) for r in sequential])
+        created = [r["server_id"] for r in bulk if r["client_id"].startswith("tmp-")]
+        self.assertEqual(Patient.objects.filter(id__in=created).count(), 3)
+        self.assertEqual(Patient.objects.get(id=self.patient.id).nom, "Modifié")
+        self.assertEqual(SyncQueue.objects.filter(synced=True).count(), 5)
+        self.assertEqual(SyncQueue.objects.filter(synced=False).count(), 2)
+
+    def test_bulk_query_count_does_not_grow_with_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):  # amorce le compteur de codes et l'état du village
+            self.commit(self.operations(creates=1), bulk=True)
+        with CaptureQueriesContext(connection) as small:
+            self.commit(self.operations(creates=5), bulk=True)
+        with CaptureQueriesContext(connection) as large:
+            self.commit(self.operations(creates=300), bulk=True)
+        # Seul le découpage des INSERT en lots (limite de variables SQLite) dépend de la taille ;
+        # l'agrégat journalier coûte une requête par ligne touchée (ici une seule)
+        self.assertLessEqual(len(small.captured_queries), 13)
+        self.assertLess(len(large.captured_queries), 20)
+
+
+class SyncIdempotencyTests(TestCase):
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+
+    def batch(self):
+        return [
+            {"client_id": f"tmp-{i}", "model": "Patient", "operation": "CREATE", "idempotency_key": f"dev1-{i}",
+             "data": {"nom": f"N{i}", "age": 2, "sexe": "M", "village": "V", "relais": self.relais.id}}
+            for i in range(3)
+        ]
+
+    def commit(self, ops, bulk=False):
+        return self.client.post(
+            "/api/sync/commit/", {"operations": ops, "bulk": bulk}, content_type="application/json"
+        ).json()["results"]
+
+    def test_replayed_batch_returns_stored_results_without_duplicates(self):
+        for bulk in (False, True):
+            with self.subTest(bulk=bulk):
+                sid = transaction.savepoint()
+                first = self.commit(self.batch(), bulk=bulk)
+                with CaptureQueriesContext(connection) as ctx:
+                    replay = self.commit(self.batch(), bulk=not bulk)
+                self.assertEqual(replay, first)
+                self.assertEqual(Patient.objects.count(), 3)
+                self.assertFalse(any("INSERT" in q["sql"] for q in ctx.captured_queries))
+                transaction.savepoint_rollback(sid)
+
+    def test_failed_operation_does_not_break_rest_of_batch(self):
+        patient = Patient.objects.create(code=f"P{self.relais.id}-2", nom="A", age=1, sexe="F", village="V", relais=self.relais)
+        PatientCodeSequence.objects.create(relais=self.relais, next_value=2)
+        ops = [
+            # compteur désynchronisé : collision sur le code unique -> IntegrityError
+            {"client_id": "dup-code", "model": "Patient", "operation": "CREATE",
+             "data": {"nom": "B", "age": 2, "sexe": "M", "village": "V", "relais": self.relais.id}},
+            {"client_id": "diag", "model": "DiagnosticPaludisme", "operation": "CREATE",
+             "data": {"patient": patient.id, "relais": self.relais.id, "symptomes": {},
+                      "classification": "NON_SUSPECT", "recommendation": "RAS"}},
+        ]
+        results = self.commit(ops)
+        self.assertEqual(results[0]["status"], "error")
+        self.assertEqual(results[1]["status"], "ok")
+        self.assertTrue(DiagnosticPaludisme.objects.filter(id=results[1]["server_id"]).exists())
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_profile_pragmas(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("profil SQLite uniquement")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000)
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
+class QueryIndexTests(TestCase):
+    """EXPLAIN des requêtes réellement émises par les endpoints : parcours d'index, pas de tri temporaire."""
+    def setUp(self):
+        relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        self.patient = Patient.objects.create(code="P-1", nom="N", age=4, sexe="F", village="V", relais=relais)
+        DiagnosticPaludisme.objects.create(patient=self.patient, relais=relais, symptomes={}, classification="SIMPLE",
+                                           recommendation="ACT")
+        TriageSession.objects.create(patient=self.patient, symptomes={}, engine_output={})
+        SyncQueue.objects.create(model_name="Patient", object_id="1", operation="CREATE", data={})
+
+    def plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                return "\n".join(row[-1] for row in cursor.fetchall())
+            cursor.execute("SET LOCAL enable_seqscan = off")  # tables de test minuscules
+            cursor.execute("EXPLAIN " + sql, params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, plan, index):
+        self.assertIn(index, plan)
+        self.assertNotIn("TEMP B-TREE", plan)  # SQLite : tri hors index
+        self.assertNotIn("Sort", plan)        # PostgreSQL
+
+    def endpoint_query(self, url, table):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        selects = [q["sql"] for q in ctx.captured_queries if f'FROM "{table}"' in q["sql"] and "ORDER BY" in q["sql"]]
+        self.assertEqual(len(selects), 1, ctx.captured_queries)
+        return selects[0]
+
+    def test_endpoints_use_indexes(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("requêtes capturées avec paramètres interpolés (SQLite)")
+        cases = [
+            ("/api/patients/", "apps_patient", "apps_patient_updated_at"),
+            ("/api/diagnostics/", "apps_diagnosticpaludisme", "diag_date_id_idx"),
+            (f"/api/diagnostics/patient/{self.patient.id}/latest/", "apps_diagnosticpaludisme", "diag_patient_date_idx"),
+            ("/api/triages/", "apps_triagesession", "triage_created_idx"),
+        ]
+        for url, table, index in cases:
+            with self.subTest(url=url):
+                self.assertUsesIndex(self.plan(self.endpoint_query(url, table)), index)
+
+    def test_sync_queue_orderings(self):
+        for queryset, index in [
+            (SyncQueue.objects.order_by("-date"), "syncqueue_date_idx"),
+            (SyncQueue.objects.filter(synced=False).order_by("date"), "syncqueue_pending_idx"),
+            (TriageSession.objects.filter(patient=self.patient).order_by("-created_at"), "triage_patient_created_idx"),
+        ]:
+            sql, params = queryset.query.sql_with_params()
+            self.assertUsesIndex(self.plan(sql, params), index)
+
+
+class SyncQueueRetentionTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for i, (age, synced) in enumerate([(40, True), (40, True), (35, True), (35, False), (2, True)]):
+            row = SyncQueue.objects.create(model_name="Patient", object_id=str(i), operation="CREATE",
+                                           data={"nom": f"N{i}"}, synced=synced, idempotency_key=f"dev:{i}")
+            SyncQueue.objects.filter(id=row.id).update(date=now - timedelta(days=age))
+
+    def test_archives_old_synced_rows_by_day_then_deletes(self):
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command("archive_sync_queue", days=30, archive_dir=tmp, chunk_size=2, dry_run=True, stdout=out)
+            self.assertEqual(os.listdir(tmp), [])
+            self.assertEqual(SyncQueue.objects.count(), 5)
+            self.assertIn("3 ligne(s)", out.getvalue())
+
+            call_command("archive_sync_queue", days=30, archive_dir=tmp, chunk_size=2, stdout=out)
+            files = sorted(Path(tmp).iterdir())
+            self.assertEqual(len(files), 2)  # un fichier par jour
+            archived = []
+            for path in files:
+                with gzip.open(path, "rt", encoding="utf-8") as fh:
+                    archived += [json.loads(line) for line in fh]
+            self.assertEqual(sorted(r["object_id"] for r in archived), ["0", "1", "2"])
+            self.assertEqual(archived[0]["data"]["nom"], "N0")
+            self.assertEqual(sorted(r["idempotency_key"] for r in archived), ["dev:0", "dev:1", "dev:2"])
+        # Les échecs et les lignes récentes restent
+        self.assertEqual(sorted(SyncQueue.objects.values_list("object_id", flat=True)), ["3", "4"])
+
+
+class SyncWorkerTests(TestCase):
+    conf = {**sync_worker.DEFAULTS, "BASE_DELAY": 60, "MAX_RETRIES": 3}
+
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+
+    def failed_create(self, relais_id=999, **extra):
+        resp = self.client.post("/api/sync/commit/", {"operations": [
+            {"client_id": "c", "model": "Patient", "operation": "CREATE",
+             "data": {"nom": "Tardif", "age": 3, "sexe": "F", "village": "V", "relais": relais_id}, **extra},
+        ]}, content_type="application/json")
+        self.assertEqual(resp.json()["results"][0]["status"], "error")
+        return SyncQueue.objects.get(synced=False, model_name="Patient")
+
+    def test_backoff_then_replay_once_parent_exists(self):
+        row = self.failed_create()
+        self.assertIn("relais", row.last_error)
+        worker = SyncWorker(conf=self.conf)
+        with self.assertLogs("apps.sync_worker", "ERROR") as logs:
+            self.assertEqual(worker.run_once(), 1)  # le relais manque toujours
+        self.assertIn(f"#{row.id}", logs.output[0])
+        row.refresh_from_db()
+        self.assertEqual((row.retry_count, row.synced), (1, False))
+        self.assertTrue(row.last_error.startswith("ValidationError:"))
+        # Lot réservé : ni ce worker ni un autre ne le reprend avant la fin du délai (60 s * 2**1)
+        self.assertEqual(SyncWorker(conf=self.conf).run_once(), 0)
+
+        BaseRelais.objects.create(id=999, nom="R2", village="V", telephone="2")
+        SyncQueue.objects.filter(id=row.id).update(last_attempt_at=timezone.now() - timedelta(seconds=121))
+        self.assertEqual(worker.run_once(), 1)
+        row.refresh_from_db()
+        patient = Patient.objects.get(nom="Tardif")
+        self.assertEqual((row.synced, row.object_id, row.last_error), (True, str(patient.id), ""))
+        self.assertEqual(SyncQueue.objects.count(), 1)  # pas de ligne d'audit en double
+        self.assertEqual((worker.processed, worker.succeeded, worker.failed), (2, 1, 1))
+
+    def resend(self, key):
+        resp = self.client.post("/api/sync/commit/", {"operations": [
+            {"client_id": "c", "model": "Patient", "operation": "CREATE", "idempotency_key": key,
+             "data": {"nom": "Tardif", "age": 3, "sexe": "F", "village": "V", "relais": 999}},
+        ]}, content_type="application/json")
+        return resp.json()["results"][0]
+
+    def test_replay_records_the_idempotency_key(self):
+        row = self.failed_create(idempotency_key="dev1:42")
+        self.assertEqual(row.idempotency_key, "dev1:42")
+        BaseRelais.objects.create(id=999, nom="R2", village="V", telephone="2")
+        self.assertEqual(SyncWorker(conf=self.conf).run_once(), 1)
+        patient = Patient.objects.get(nom="Tardif")
+        self.assertEqual(SyncIdempotencyKey.objects.get(key="dev1:42").result["server_id"], patient.id)
+        # Le client renvoie l'opération : résultat du rejeu, pas de second patient
+        self.assertEqual(self.resend("dev1:42"), {"client_id": "c", "status": "ok", "server_id": patient.id})
+        self.assertEqual(Patient.objects.filter(nom="Tardif").count(), 1)
+
+    def test_replay_skips_operations_the_client_already_resent(self):
+        row = self.failed_create(idempotency_key="dev1:43")
+        BaseRelais.objects.create(id=999, nom="R2", village="V", telephone="2")
+        self.assertEqual(self.resend("dev1:43")["status"], "ok")
+        self.assertEqual(SyncWorker(conf=self.conf).run_once(), 1)
+        row.refresh_from_db()
+        self.assertTrue(row.synced)
+        self.assertEqual(Patient.objects.filter(nom="Tardif").count(), 1)
+
+    def test_unsupported_operation_is_abandoned_and_stats_exposed(self):
+        SyncQueue.objects.create(model_name="Vaccination", object_id="", operation="CREATE", data={})
+        self.failed_create()
+        stats = self.client.get("/api/sync/queue/stats/").json()
+        self.assertEqual((stats["pending"], stats["dead"]), (2, 0))
+
+        worker = SyncWorker(conf=self.conf)
+        with self.assertLogs("apps.sync_worker", "ERROR"):
+            self.assertEqual(worker.run_once(), 2)
+        self.assertEqual(worker.abandoned, 1)
+        self.assertEqual(SyncQueue.objects.get(model_name="Vaccination").retry_count, 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sync_worker.prom")
+            worker.write_metrics(path)
+            text = Path(path).read_text()
+        self.assertIn("assistant_sync_worker_processed_total", text)
+        self.assertIn("assistant_sync_worker_queue_pending", text)
+
+        out = io.StringIO()
+        call_command("run_sync_worker", once=True, stdout=out)
+        self.assertIn("0 ligne(s) rejouée(s)", out.getvalue())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        self.patients = [Patient.objects.create(code=f"P-{i}", nom=f"N{i}", age=4, sexe="F", village="V", relais=self.relais)
+                         for i in range(30)]
+
+    def test_list_not_modified_without_serializing(self):
+        first = self.client.get("/api/patients/")
+        etag = first["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/patients/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(len(ctx.captured_queries), 1)  # l'agrégat seul
+
+        self.patients[3].nom = "Modifié"
+        self.patients[3].save()
+        changed = self.client.get("/api/patients/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+
+        # Une suppression change l'ETag, et la dernière tombe invalide If-Modified-Since
+        etag, last_modified = changed["ETag"], changed["Last-Modified"]
+        time.sleep(1)  # Last-Modified est à la seconde près
+        self.patients[0].delete()
+        self.assertEqual(self.client.get("/api/patients/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get("/api/patients/", HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_detail_and_pagination_have_distinct_validators(self):
+        url = f"/api/patients/{self.patients[1].id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get("/api/diagnostics/?page_size=10")["ETag"],
+                            self.client.get("/api/diagnostics/?page_size=20")["ETag"])
+
+    def test_editing_a_nested_patient_invalidates_diagnostics(self):
+        diag = DiagnosticPaludisme.objects.create(patient=self.patients[0], relais=self.relais, symptomes={},
+                                                  classification="SIMPLE", recommendation="ACT")
+        urls = ["/api/diagnostics/", f"/api/diagnostics/{diag.id}/"]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        resp = self.client.patch(f"/api/patients/{self.patients[0].id}/", {"nom": "Renommé"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        for url, etag in zip(urls, etags):
+            changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(changed.status_code, 200)
+            body = changed.json()
+            detail = (body["results"][0] if "results" in body else body)["patient_detail"]
+            self.assertEqual(detail["nom"], "Renommé")
+
+    def test_compression_above_threshold(self):
+        plain = self.client.get("/api/patients/")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        resp = self.client.get("/api/patients/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        self.assertEqual(gzip.decompress(resp.content), plain.content)
+        self.assertLess(len(resp.content), len(plain.content))
+
+        small = self.client.get(f"/api/patients/{self.patients[0].id}/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(small.has_header("Content-Encoding"))
+        # Export déjà compressé par la vue : pas de double compression
+        export = self.client.get("/api/export/triages/?gzip=true", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(export.has_header("Content-Encoding"))
+        streamed = self.client.get("/api/export/triages/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(streamed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(streamed.streaming_content)), b"")
+
+
+@skipUnless(msgpack, "module msgpack non installé")
+class MessagePackTests(TestCase):
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+
+    def post(self, url, data, keys=None):
+        media_type = "application/x-msgpack" + (f"; keys={keys}" if keys else "")
+        body = map_keys(data, WIRE_KEY_INDEXES[keys]) if keys else data
+        return self.client.post(url, msgpack.packb(body), content_type=media_type, HTTP_ACCEPT=media_type)
+
+    def unpack(self, resp, keys=None):
+        data = msgpack.unpackb(resp.content, strict_map_key=False)
+        return map_keys(data, dict(enumerate(WIRE_KEY_DICTIONARIES[keys]))) if keys else data
+
+    def test_triage_matches_json(self):
+        body = {"symptomes": {"fievre": True, "frissons": True}, "poids": 18.5, "rdt_result": "POS"}
+        expected = self.client.post("/api/triage/", body, content_type="application/json").json()
+        resp = self.post("/api/triage/", body)
+        self.assertEqual(resp["Content-Type"], "application/x-msgpack")
+        self.assertEqual(self.unpack(resp), expected)
+        self.assertEqual(self.unpack(self.post("/api/triage/", body, keys="v1"), keys="v1"), expected)
+
+    def test_triage_batch_matches_json(self):
+        body = {"records": [{"symptomes": {"fievre": True, "frissons": True}, "poids": 18.5, "rdt_result": "POS"},
+                            {"symptomes": {"toux": True}}]}
+        expected = self.client.post("/api/triage/batch/", body, content_type="application/json").json()
+        resp = self.post("/api/triage/batch/", body)
+        self.assertEqual((resp.status_code, resp["Content-Type"]), (200, "application/x-msgpack"))
+        self.assertEqual(self.unpack(resp), expected)
+        self.assertEqual(self.unpack(self.post("/api/triage/batch/", body, keys="v1"), keys="v1"), expected)
+
+    def test_sync_commit_and_pull_with_key_dictionary(self):
+        ops = {"operations": [
+            {"client_id": f"tmp-{i}", "model": "Patient", "operation": "CREATE",
+             "data": {"nom": f"N{i}", "age": 2, "sexe": "M", "village": "V", "relais": self.relais.id}}
+            for i in range(20)
+        ], "bulk": True}
+        resp = self.post("/api/sync/commit/", ops, keys="v1")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/x-msgpack; keys=v1")
+        results = self.unpack(resp, keys="v1")["results"]
+        self.assertEqual([r["status"] for r in results], ["ok"] * 20)
+        self.assertLess(len(msgpack.packb(map_keys(ops, WIRE_KEY_INDEXES["v1"]))), len(json.dumps(ops)) // 2)
+
+        with override_settings(SYNC_PULL_SAFETY_LAG=0):
+            pulled = self.unpack(self.client.get("/api/sync/pull/", HTTP_ACCEPT="application/x-msgpack"))
+        self.assertEqual(len(pulled["changes"]["Patient"]), 20)
+
+    def test_invalid_body(self):
+        resp = self.client.post("/api/triage/", b"\xc1", content_type="application/x-msgpack")
+        self.assertEqual(resp.status_code, 400)
+        # Clés de map tableau ou map : non hachables en Python
+        for url, body in (("/api/triage/", b"\x81\x92\x01\x02\x01"), ("/api/sync/commit/", b"\x81\x81\x01\x02\x01")):
+            resp = self.client.post(url, body, content_type="application/x-msgpack")
+            self.assertEqual(resp.status_code, 400)
+        resp = self.client.post("/api/triage/", msgpack.packb({}), content_type="application/x-msgpack; keys=v9")
+        self.assertEqual(resp.status_code, 400)
+
+
+class PatientCodeSequenceTests(TestCase):
+    def test_codes_are_per_relais_and_continue_after_existing_codes(self):
+        r1 = BaseRelais.objects.create(nom="R1", village="V", telephone="1")
+        r2 = BaseRelais.objects.create(nom="R2", village="V", telephone="2")
+        Patient.objects.create(code=f"P{r1.id}-7", nom="Ancien", age=1, sexe="F", village="V", relais=r1)
+        self.assertEqual(list(PatientCodeSequence.allocate(r1.id, 3)), [8, 9, 10])
+        self.assertEqual(list(PatientCodeSequence.allocate(r1.id)), [11])
+        self.assertEqual(list(PatientCodeSequence.allocate(r2.id, 2)), [1, 2])
+
+    def test_created_patient_gets_next_code_without_count(self):
+        relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        payload = {"nom": "N", "age": 2, "sexe": "M", "village": "V", "relais": relais.id}
+        with CaptureQueriesContext(connection) as ctx:
+            first = self.client.post("/api/patients/", payload, content_type="application/json").json()
+        second = self.client.post("/api/patients/", payload, content_type="application/json").json()
+        self.assertEqual((first["code"], second["code"]), (f"P{relais.id}-1", f"P{relais.id}-2"))
+        self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
+
+
+class FakeRedisServer(threading.Thread):
+    """Stand-in local du protocole Redis (GET / SET [PX] / DEL) pour tester RedisSessionStore."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+        self.data = {}
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        stream = conn.makefile("rb")
+        while True:
+            header = stream.readline()
+            if not header:
+                return
+            args = []
+            for _ in range(int(header[1:])):
+                length = int(stream.readline()[1:])
+                args.append(stream.read(length + 2)[:-2])
+            command = args[0].upper()
+            if command == b"SET":
+                expires = time.monotonic() + int(args[4]) / 1000 if len(args) > 4 else None
+                self.data[args[1]] = (args[2], expires)
+                conn.sendall(b"+OK\r\n")
+            elif command == b"GET":
+                value, expires = self.data.get(args[1], (None, None))
+                if value is None or (expires is not None and expires <= time.monotonic()):
+                    conn.sendall(b"$-1\r\n")
+                else:
+                    conn.sendall(b"$%d\r\n%s\r\n" % (len(value), value))
+            elif command == b"DEL":
+                conn.sendall(b":%d\r\n" % (1 if self.data.pop(args[1], None) else 0))
+
+    def stop(self):
+        self.listener.close()
+
+
+class SessionStoreTests(TestCase):
+    def test_locmem_lru_and_ttl_eviction(self):
+        store = LocMemSessionStore(ttl=60, max_entries=2)
+        store.set(1, {"a": 1})
+        store.set(2, {"a": 2})
+        store.get(1)
+        store.set(3, {"a": 3})
+        self.assertIsNone(store.get(2))
+        self.assertEqual(store.get(1), {"a": 1})
+        store.set(4, {"a": 4}, ttl=0)
+        self.assertIsNone(store.get(4))
+
+    def test_redis_store_against_local_stand_in(self):
+        server = FakeRedisServer()
+        server.start()
+        self.addCleanup(server.stop)
+        store = RedisSessionStore(ttl=60, location=f"redis://127.0.0.1:{server.port}/0")
+        store.set(7, {"answered": {"fievre": True}})
+        self.assertEqual(store.get(7), {"answered": {"fievre": True}})
+        store.delete(7)
+        self.assertIsNone(store.get(7))
+        store.set(8, {"x": 1}, ttl=0.001)
+        time.sleep(0.01)
+        self.assertIsNone(store.get(8))
+
+
+class InteractiveTriageTests(TestCase):
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        self.patient = Patient.objects.create(code="P-1", nom="N", age=4, sexe="F", village="V", relais=self.relais)
+
+    def start(self):
+        resp = self.client.post("/api/triage/start/", {"patient": self.patient.id, "relais": self.relais.id,
+                                                       "poids": 18.5, "rdt_result": "POS"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()["session_id"]
+
+    def answer(self, session_id, question, value):
+        return self.client.post(f"/api/triage/{session_id}/answer/", {"question": question, "value": value},
+                                content_type="application/json").json()
+
+    @override_settings(TRIAGE_SESSION_STORE={"CHECKPOINT_EVERY": 0})
+    def test_answers_stay_in_store_until_completion(self):
+        session_id = self.start()
+        answers = [("fievre", True), ("temperature", "38,9"), ("duree_fievre_jours", 2), ("frissons", "oui"),
+                   ("convulsions", False), ("prostration", False)]
+        with CaptureQueriesContext(connection) as ctx:
+            for question, value in answers:
+                self.assertFalse(self.answer(session_id, question, value)["completed"])
+        self.assertEqual(ctx.captured_queries, [])
+        final = self.answer(session_id, "incapacite_a_manger", False)
+        self.assertTrue(final["completed"])
+        self.assertTrue(final["diagnostic_created"])
+        session = TriageSession.objects.get(id=session_id)
+        self.assertTrue(session.completed)
+        self.assertEqual(session.answered["temperature"], 38.9)
+        self.assertEqual(session.final_output, final["final_output"])
+        self.assertEqual(self.answer(session_id, "toux", True)["detail"], "Session déjà terminée")
+
+    def answer_many(self, session_id, answers):
+        return self.client.post(f"/api/triage/{session_id}/answer/",
+                                {"answers": [{"question": q, "value": v} for q, v in answers]},
+                                content_type="application/json")
+
+    def test_multi_answer_matches_one_by_one_and_stops_on_danger_sign(self):
+        answers = [("fievre", True), ("frissons", True), ("convulsions", True), ("toux", False)]
+        one_by_one = self.start()
+        for question, value in answers[:3]:
+            expected = self.answer(one_by_one, question, value)
+        batched = self.start()
+        with patch("apps.interactive.triage", wraps=triage) as engine:
+            resp = self.answer_many(batched, answers).json()
+        self.assertEqual(engine.call_count, 1)
+        self.assertTrue(resp["completed"])
+        self.assertEqual((resp["applied"], resp["ignored"]), (3, ["toux"]))
+        self.assertEqual(resp["final_output"], expected["final_output"])
+        self.assertNotIn("toux", TriageSession.objects.get(id=batched).answered)
+
+    def test_multi_answer_rejects_invalid_value_before_applying(self):
+        session_id = self.start()
+        resp = self.answer_many(session_id, [("fievre", True), ("temperature", "chaud")])
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["question"], "temperature")
+        self.assertEqual(self.answer_many(session_id, [("fievre", True)]).json()["next_question"], "temperature")
+
+    def test_store_miss_resumes_from_write_through_row(self):
+        session_id = self.start()
+        self.answer(session_id, "fievre", True)
+        self.answer(session_id, "frissons", True)
+        get_session_store().delete(session_id)  # TTL, éviction ou requête servie par un autre worker
+        resp = self.answer(session_id, "temperature", 39)
+        self.assertFalse(resp["completed"])
+        self.assertEqual(TriageSession.objects.get(id=session_id).answered,
+                         {"fievre": True, "frissons": True, "temperature": 39.0})
+
+    @override_settings(TRIAGE_SESSION_STORE={"CHECKPOINT_EVERY": 0})
+    def test_store_miss_without_write_through_asks_client_to_resend(self):
+        session_id = self.start()
+        self.answer(session_id, "fievre", True)
+        get_session_store().delete(session_id)
+        for url in (f"/api/triage/{session_id}/answer/", f"/api/async/triage/{session_id}/answer/"):
+            get_session_store().delete(session_id)
+            resp = self.client.post(url, {"question": "frissons", "value": True}, content_type="application/json")
+            self.assertEqual(resp.status_code, 409)
+            self.assertEqual(resp.json()["answered"], {})
+        # Le client renvoie toutes ses réponses
+        resp = self.answer_many(session_id, [("fievre", True), ("frissons", True)])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["next_question"], next_question({"fievre": True, "frissons": True}))
+
+    @override_settings(TRIAGE_SESSION_STORE={"CHECKPOINT_EVERY": 2})
+    def test_checkpoint_interval_writes_through(self):
+        session_id = self.start()
+        self.answer(session_id, "fievre", True)
+        self.assertEqual(TriageSession.objects.get(id=session_id).answered, {})
+        self.answer(session_id, "frissons", True)
+        self.assertEqual(TriageSession.objects.get(id=session_id).answered, {"fievre": True, "frissons": True})
+
+
+class AsyncViewTests(TestCase):
+    """Les vues /api/async/ ont le même contrat que les vues DRF synchrones."""
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        self.patient = Patient.objects.create(code="P-1", nom="N", age=4, sexe="F", village="V", relais=self.relais)
+
+    def post(self, url, data):
+        return self.client.post(url, data, content_type="application/json")
+
+    def test_triage_matches_sync_view_and_saves(self):
+        body = {"symptomes": {"fievre": True, "frissons": True}, "poids": 18.5, "rdt_result": "POS",
+                "patient": self.patient.id, "save": True}
+        expected = self.post("/api/triage/", body).json()
+        resp = self.post("/api/async/triage/", body)
+        self.assertEqual(resp.status_code, 200)
+        result = resp.json()
+        self.assertEqual({k: v for k, v in result.items() if k != "session_id"},
+                         {k: v for k, v in expected.items() if k != "session_id"})
+        self.assertEqual(TriageSession.objects.get(id=result["session_id"]).patient_id, self.patient.id)
+        self.assertEqual(self.post("/api/async/triage/", {"rdt_result": "?"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/async/triage/", "{", content_type="application/json").status_code, 400)
+
+    def test_interactive_flow_until_completion(self):
+        start = self.post("/api/async/triage/start/", {"patient": self.patient.id, "relais": self.relais.id,
+                                                       "poids": 18.5, "rdt_result": "POS"})
+        self.assertEqual(start.status_code, 201)
+        session_id = start.json()["session_id"]
+        self.assertEqual(start.json()["question"], "fievre")
+        url = f"/api/async/triage/{session_id}/answer/"
+        self.assertFalse(self.post(url, {"question": "fievre", "value": True}).json()["completed"])
+        final = self.post(url, {"answers": [{"question": "convulsions", "value": True}]}).json()
+        self.assertTrue(final["completed"])
+        self.assertTrue(TriageSession.objects.get(id=session_id).completed)
+        self.assertEqual(self.post("/api/async/triage/999/answer/", {"question": "fievre", "value": True}).status_code, 404)
+
+    def test_sync_commit(self):
+        ops = [{"client_id": "tmp-1", "model": "Patient", "operation": "CREATE",
+                "data": {"nom": "A", "age": 2, "sexe": "M", "village": "V", "relais": self.relais.id}},
+               {"client_id": "bad", "model": "Vaccination", "operation": "CREATE", "data": {}}]
+        for bulk in (False, True):
+            resp = self.post("/api/async/sync/commit/", {"operations": ops, "bulk": bulk})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual([r["status"] for r in resp.json()["results"]], ["ok", "error"])
+        self.assertEqual(Patient.objects.filter(nom="A").count(), 2)
+
+    async def test_served_by_asgi_handler(self):
+        client = AsyncClient()
+        resp = await client.post("/api/async/triage/", {"symptomes": {"fievre": True}, "save": True},
+                                 content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(await TriageSession.objects.filter(id=resp.json()["session_id"]).aexists())
+
+
+class DecisionTreeTests(TestCase):
+    def test_all_trees_compile_and_resolve_by_disease(self):
+        for name in ["paludisme", "diarrhee", "malnutrition", "infection_respiratoire"]:
+            tree = get_tree(name)
+            self.assertEqual(tree.disease, name)
+            self.assertEqual(tree.current(tree.initial_state()).type, "question")
+        with self.assertRaises(TreeError):
+            get_tree("inconnu")
+
+    def test_malaria_scoring_and_severity(self):
+        tree = get_tree("malaria")
+        answers = {"fever_present": True, "temperature_value": 39, "duration_fever": 3,
+                   "other_symptoms": ["chills"], "rdt_available": False}
+        result = tree.result(tree.replay(answers))
+        self.assertEqual((result["outcome"], result["computed_score"]), ("test_needed", 7))
+        answers["other_symptoms"] = ["convulsions"]
+        self.assertEqual(tree.result(tree.replay(answers))["outcome"], "severe_referral")
+
+    def test_muac_rule_resolves_short_answer_name(self):
+        tree = get_tree("malnutrition")
+        state = tree.replay({"muac_available": True, "measure_muac": 11.2, "check_edema": False, "appetite_test": True})
+        self.assertEqual(tree.result(state)["outcome"], "severe_malnutrition")
+
+    def test_answer_validation(self):
+        tree = get_tree("malaria")
+        state = tree.initial_state()
+        tree.answer(state, "fever_present", "oui")
+        with self.assertRaises(ValueError):
+            tree.answer(state, "temperature_value", 50)
+        with self.assertRaises(ValueError):
+            tree.answer(state, "duration_fever", 2)
+
+    def test_reload_on_mtime_change(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "demo_tree.json"
+            spec = {"version": "1", "root": "q", "outcomes": {"a": {"label": "A"}, "b": {"label": "B"}},
+                    "nodes": {"q": {"type": "question", "input": {"type": "boolean"}, "next": {"true": "a", "false": "b"}},
+                              "a": {"type": "outcome", "outcome": "a"}, "b": {"type": "outcome", "outcome": "b"}}}
+            path.write_text(json.dumps(spec))
+            registry = TreeRegistry(tmp)
+            first = registry.get("demo")
+            self.assertIs(registry.get("demo"), first)
+            spec["version"] = "2"
+            path.write_text(json.dumps(spec))
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+            self.assertEqual(registry.get("demo").version, "2")
+            spec["nodes"]["q"]["next"] = {"true": "missing", "false": "b"}
+            path.write_text(json.dumps(spec))
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 2 * 10**9))
+            self.assertEqual(registry.get("demo").version, "2")  # dernière version valide
+            path.write_text("{")
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 3 * 10**9))
+            self.assertEqual(registry.get("demo").version, "2")
+            with self.assertRaises(TreeError):
+                TreeRegistry(tmp).get("demo")
+
+    def test_tree_name_cannot_escape_the_directory(self):
+        with self.assertRaises(TreeError):
+            get_tree("../decision_trees/malaria")
+        resp = self.client.post("/api/triage/start/", {"tree": "../../settings"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_interactive_tree_session(self):
+        resp = self.client.post("/api/triage/start/", {"tree": "paludisme"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        session_id = resp.json()["session_id"]
+        self.assertEqual(resp.json()["question"], "fever_present")
+        url = f"/api/triage/{session_id}/answer/"
+        bad = self.client.post(url, {"answers": [{"question": "fever_present", "value": True},
+                                                 {"question": "temperature_value", "value": 99}]},
+                               content_type="application/json")
+        self.assertEqual((bad.status_code, bad.json()["question"]), (400, "temperature_value"))
+        step = self.client.post(url, {"question": "fever_present", "value": True}, content_type="application/json").json()
+        self.assertEqual(step["next_question"], "temperature_value")
+        final = self.client.post(url, {"answers": [{"question": "temperature_value", "value": 38.2},
+                                                   {"question": "duration_fever", "value": 1},
+                                                   {"question": "other_symptoms", "value": ["headache"]},
+                                                   {"question": "rdt_available", "value": True},
+                                                   {"question": "rdt_result", "value": "positive"},
+                                                   {"question": "extra", "value": 1}]},
+                                 content_type="application/json").json()
+        self.assertTrue(final["completed"])
+        self.assertFalse(final["diagnostic_created"])
+        self.assertEqual((final["final_output"]["outcome"], final["ignored"]), ("uncomplicated", ["extra"]))
+        session = TriageSession.objects.get(id=session_id)
+        self.assertEqual((session.tree, session.completed), ("malaria", True))
+        self.assertEqual(DiagnosticPaludisme.objects.count(), 0)
+
+    def test_session_on_removed_node_conflicts(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(DECISION_TREES_DIR=tmp):
+            path = Path(tmp) / "demo_tree.json"
+            spec = {"version": "1", "root": "q", "outcomes": {"a": {"label": "A"}},
+                    "nodes": {"q": {"type": "question", "input": {"type": "boolean"}, "next": "a"},
+                              "a": {"type": "outcome", "outcome": "a"}}}
+            path.write_text(json.dumps(spec))
+            session_id = self.client.post("/api/triage/start/", {"tree": "demo"}, content_type="application/json").json()["session_id"]
+            # Même version, nœud renommé : la session ne peut pas poursuivre
+            spec["root"] = "q2"
+            spec["nodes"]["q2"] = spec["nodes"].pop("q")
+            path.write_text(json.dumps(spec))
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+            resp = self.client.post(f"/api/triage/{session_id}/answer/", {"question": "q", "value": True},
+                                    content_type="application/json")
+            self.assertEqual((resp.status_code, resp.json()["node"]), (409, "q"))
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        self.patients = [
+            Patient.objects.create(code=f"P-{v}", nom="N", age=4, sexe="F", village=v, relais=self.relais)
+            for v in ("Kara", "Bassar")
+        ]
+
+    def diag_op(self, i, patient, classification, result):
+        return {"client_id": f"d{i}", "model": "DiagnosticPaludisme", "operation": "CREATE",
+                "data": {"patient": patient.id, "relais": self.relais.id, "symptomes": {"fievre": True},
+                         "classification": classification, "test_result": result, "recommendation": "ACT"}}
+
+    def snapshot(self):
+        return sorted(DiagnosticDailyRollup.objects.values_list(
+            "day", "village", "relais_id", "classification", "total", "rdt_tested", "rdt_positive"))
+
+    def test_incremental_rollups_match_rebuild(self):
+        kara, bassar = self.patients
+        ops = [self.diag_op(0, kara, "SIMPLE", "POS"), self.diag_op(1, kara, "SIMPLE", "NEG"),
+               self.diag_op(2, bassar, "GRAVE", "POS"), self.diag_op(3, kara, "SIMPLE", None)]
+        for bulk in (False, True):
+            resp = self.client.post("/api/sync/commit/", {"operations": ops, "bulk": bulk}, content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+        diag = DiagnosticPaludisme.objects.filter(patient=kara).first()
+        resp = self.client.patch(f"/api/diagnostics/{diag.id}/", {"classification": "GRAVE"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        # Le patient déménage : ses diagnostics restent comptés dans son ancien village, y compris à la suppression
+        moved = self.client.patch(f"/api/patients/{bassar.id}/", {"village": "Sokodé"}, content_type="application/json")
+        self.assertEqual(moved.status_code, 200)
+        DiagnosticPaludisme.objects.filter(patient=bassar).first().delete()
+        self.client.post("/api/sync/commit/", {"operations": [self.diag_op(4, bassar, "GRAVE", "NEG")]},
+                         content_type="application/json")
+        incremental = self.snapshot()
+        self.assertEqual(rebuild(), len(incremental))
+        self.assertEqual(self.snapshot(), incremental)
+        kara_simple = DiagnosticDailyRollup.objects.get(village="Kara", classification="SIMPLE")
+        self.assertEqual((kara_simple.total, kara_simple.rdt_tested, kara_simple.rdt_positive), (5, 3, 1))
+        self.assertEqual(sorted(DiagnosticDailyRollup.objects.filter(classification="GRAVE").exclude(village="Kara")
+                                .values_list("village", "total")), [("Bassar", 1), ("Sokodé", 1)])
+
+    def test_stats_endpoint_reads_rollups_only(self):
+        kara, bassar = self.patients
+        ops = [self.diag_op(i, p, c, r) for i, (p, c, r) in
+               enumerate([(kara, "SIMPLE", "POS"), (kara, "SIMPLE", "NEG"), (bassar, "GRAVE", "POS")])]
+        self.client.post("/api/sync/commit/", {"operations": ops}, content_type="application/json")
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/stats/?group_by=village")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(all("apps_diagnosticpaludisme" not in q["sql"] for q in ctx.captured_queries))
+        body = resp.json()
+        self.assertEqual(body["rows"], [
+            {"village": "Bassar", "total": 1, "rdt_tested": 1, "rdt_positive": 1, "positivity_rate": 1.0},
+            {"village": "Kara", "total": 2, "rdt_tested": 2, "rdt_positive": 1, "positivity_rate": 0.5},
+        ])
+        self.assertEqual(body["totals"]["by_classification"], {"GRAVE": 1, "SIMPLE": 2})
+        self.assertEqual(self.client.get("/api/stats/?group_by=pays").status_code, 400)
+
+
+class OutbreakDetectorTests(TestCase):
+    def setUp(self):
+        outbreaks._detector = None
+        self.addCleanup(setattr, outbreaks, "_detector", None)
+
+    def test_spike_and_cusum_after_stable_baseline(self):
+        detector = outbreaks.get_detector()
+        today = timezone.localdate()
+        detector.observe([("Kara", today - timedelta(days=d), 1 + d % 2) for d in range(14, 0, -1)])
+        detector.observe([("Bassar", today - timedelta(days=d), 2) for d in range(14, 0, -1)])
+        self.assertEqual(detector.alerts(), [])
+        detector.observe([("Kara", today, 9)])
+        alert, = detector.alerts()
+        self.assertEqual((alert["village"], alert["today"]), ("Kara", 9))
+        self.assertEqual(set(alert["alerts"]), {"spike", "cusum"})
+        # Instantanés : un nouveau détecteur repart du même état
+        outbreaks._detector = None
+        self.assertEqual(outbreaks.get_detector().alerts(), [alert])
+
+    def test_workers_accumulate_into_the_same_row(self):
+        today = timezone.localdate()
+        relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        DiagnosticDailyRollup.objects.create(day=today - timedelta(days=2), village="Kara", relais=relais,
+                                             classification="SIMPLE", total=4)
+        first, second = outbreaks.OutbreakDetector(), outbreaks.OutbreakDetector()
+        first.seed({"Kara"})
+        self.assertEqual(OutbreakState.objects.get(village="Kara").state["today"], 4)
+        first.observe([("Kara", today, 2)])
+        second.observe([("Kara", today, 3), ("Bassar", today, 1)])
+        states = dict(OutbreakState.objects.values_list("village", "state"))
+        self.assertEqual((states["Kara"]["today"], states["Kara"]["window"][0]), (5, 4))
+        self.assertEqual(states["Bassar"]["today"], 1)
+        self.assertEqual([a["today"] for a in first.alerts(include_all=True)], [5, 1])
+
+    def test_edits_are_not_new_cases(self):
+        relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        patient = Patient.objects.create(code="P-1", nom="N", age=4, sexe="F", village="Kara", relais=relais)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post("/api/diagnostics/", {"patient": patient.id, "relais": relais.id, "symptomes": {},
+                                                          "classification": "SIMPLE", "recommendation": "ACT"},
+                                    content_type="application/json")
+        for text in ("ACT 1", "ACT 2", "ACT 3"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f"/api/diagnostics/{resp.json()['id']}/", {"recommendation": text},
+                                  content_type="application/json")
+        self.assertEqual(OutbreakState.objects.get(village="Kara").state["today"], 1)
+        self.assertEqual(DiagnosticDailyRollup.objects.get(village="Kara").total, 1)
+
+    def test_detector_callback_is_robust(self):
+        # Les diagnostics sont déjà validés : un échec du détecteur est journalisé, pas renvoyé au client
+        with transaction.atomic():
+            outbreaks.observe_cases_on_commit([("Kara", timezone.localdate(), 1)])
+            _, _, robust = connection.run_on_commit[-1]
+        self.assertTrue(robust)
+
+    def test_fed_by_committed_diagnostics(self):
+        relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        patient = Patient.objects.create(code="P-1", nom="N", age=4, sexe="F", village="Kara", relais=relais)
+        ops = [{"client_id": f"d{i}", "model": "DiagnosticPaludisme", "operation": "CREATE",
+                "data": {"patient": patient.id, "relais": relais.id, "symptomes": {}, "classification": c,
+                         "recommendation": "-"}} for i, c in enumerate(["SIMPLE", "GRAVE", "NON_SUSPECT"])]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/sync/commit/", {"operations": ops, "bulk": True}, content_type="application/json")
+        self.assertEqual(OutbreakState.objects.get(village="Kara").state["today"], 2)
+        body = self.client.get("/api/outbreaks/alerts/?all=1").json()
+        self.assertEqual([(a["village"], a["today"], a["alerts"]) for a in body["alerts"]], [("Kara", 2, [])])
+        self.assertEqual(self.client.get("/api/outbreaks/alerts/").json(), {"alerts": []})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+        patients = [Patient.objects.create(code=f"P-{v}", nom="Secret", age=4, sexe="F", village=v, relais=relais)
+                    for v in ("Kara", "Bassar")]
+        DiagnosticPaludisme.objects.bulk_create([
+            DiagnosticPaludisme(patient=patients[i % 2], relais=relais, village=patients[i % 2].village, symptomes={"fievre": True, "n": i},
+                                classification="GRAVE" if i % 3 == 0 else "SIMPLE", recommendation="ACT")
+            for i in range(30)
+        ])
+        TriageSession.objects.create(patient=None, symptomes={}, engine_output={"hypotheses": []}, answered={})
+
+    def read(self, resp):
+        self.assertTrue(resp.streaming)
+        return b"".join(resp.streaming_content)
+
+    def test_ndjson_export_streams_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx, patch("apps.exports.FLUSH_BYTES", 256):
+            resp = self.client.get("/api/export/diagnostics/?village=Kara&classification=SIMPLE")
+            chunks = list(resp.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+        self.assertEqual(len(rows), 10)
+        self.assertEqual({(r["village"], r["classification"], r["patient_code"]) for r in rows}, {("Kara", "SIMPLE", "P-Kara")})
+        self.assertTrue(all(r["symptomes"]["fievre"] for r in rows))
+        self.assertNotIn("Secret", json.dumps(rows))
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson; charset=utf-8")
+
+    def test_csv_gzip_export(self):
+        resp = self.client.get("/api/export/triages/?format=csv&gzip=true")
+        self.assertEqual(resp["Content-Type"], "application/gzip")
+        self.assertIn(".csv.gz", resp["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(self.read(resp)).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(json.loads(rows[0]["engine_output"]), {"hypotheses": []})
+        self.assertEqual(rows[0]["patient_code"], "")
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get("/api/export/patients/").status_code, 404)
+        self.assertEqual(self.client.get("/api/export/triages/?classification=SIMPLE").status_code, 400)
+        self.assertEqual(self.client.get("/api/export/diagnostics/?start=hier").status_code, 400)
+
+
+class ImportRegistryTests(TestCase):
+    def write(self, tmp, name, content):
+        path = Path(tmp) / name
+        if name.endswith(".gz"):
+            path.write_bytes(gzip.compress(content.encode()))
+        else:
+            path.write_text(content, encoding="utf-8")
+        return str(path)
+
+    def test_import_relais_then_patients_with_error_report(self):
+        BaseRelais.objects.create(nom="Ama", village="Kara", telephone="1")
+        with tempfile.TemporaryDirectory() as tmp:
+            relais = self.write(tmp, "relais.csv", "nom,village,telephone\nAma,Kara,1\nKofi,Bassar,2\nSans,,3\n")
+            out = io.StringIO()
+            call_command("import_registry", relais, "--model", "relais", stdout=out)
+            self.assertIn("1 créée(s), 1 déjà présente(s), 1 erreur(s)", out.getvalue())
+            self.assertIn("lignes/s", out.getvalue())
+
+            lines = [{"nom": f"N{i}", "age": 3, "sexe": "F", "village": "Bassar", "relais_nom": "kofi", "relais_village": "BASSAR"}
+                     for i in range(25)]
+            lines.insert(5, {"nom": "X", "age": "?", "sexe": "F", "village": "Kara", "relais_nom": "Ama", "relais_village": "Kara"})
+            lines.append({"nom": "Y", "age": 1, "sexe": "M", "village": "Kara", "relais_nom": "Inconnu", "relais_village": "Kara"})
+            patients = self.write(tmp, "patients.ndjson.gz", "\n".join(json.dumps(l) for l in lines) + '\n{oops\n"oops"\n5\n[1]\n')
+            errors = str(Path(tmp) / "report.csv")
+            with CaptureQueriesContext(connection) as ctx:
+                call_command("import_registry", patients, "--chunk-size", "10", "--errors", errors, stdout=io.StringIO())
+            report = list(csv.DictReader(open(errors, encoding="utf-8")))
+        kofi = BaseRelais.objects.get(nom="Kofi")
+        codes = sorted(Patient.objects.filter(relais=kofi).values_list("code", flat=True), key=lambda c: int(c.split("-")[1]))
+        self.assertEqual(codes, [f"P{kofi.id}-{i}" for i in range(1, 26)])
+        self.assertEqual([r["ligne"] for r in report], ["6", "27", "28", "29", "30", "31"])
+        self.assertIn("Relais inconnu", report[1]["erreur"])
+        self.assertIn("Objet JSON attendu", report[3]["erreur"])
+        # Chargement des relais puis au plus 8 requêtes par bloc (savepoints compris), quel que soit le nombre de lignes
+        self.assertLessEqual(len(ctx.captured_queries), 1 + 8 * 3)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_generator_is_seeded_and_keeps_code_sequences_consistent(self):
+        from benchmarks.generator import generate, population_sizes
+
+        sizes = generate(600, seed=7)
+        self.assertEqual(sizes, population_sizes(600))
+        self.assertEqual(Patient.objects.count(), 600)
+        self.assertEqual(DiagnosticPaludisme.objects.count(), 1200)
+        self.assertEqual(TriageSession.objects.count(), 600)
+        self.assertEqual(sum(DiagnosticDailyRollup.objects.values_list("total", flat=True)), 1200)
+        first = list(Patient.objects.order_by("id").values_list("code", "age", "sexe")[:20])
+        classifications = list(DiagnosticPaludisme.objects.order_by("id").values_list("classification", flat=True))
+
+        Patient.objects.all().delete()
+        BaseRelais.objects.all().delete()
+        generate(600, seed=7)
+        relais = BaseRelais.objects.order_by("id").first()
+        self.assertEqual([(c.split("-")[1], a, s) for c, a, s in Patient.objects.order_by("id").values_list("code", "age", "sexe")[:20]],
+                         [(c.split("-")[1], a, s) for c, a, s in first])
+        self.assertEqual(list(DiagnosticPaludisme.objects.order_by("id").values_list("classification", flat=True)), classifications)
+        # Le compteur reprend après les codes générés
+        last = Patient.objects.filter(relais=relais).count()
+        self.assertEqual(list(PatientCodeSequence.allocate(relais.id)), [last + 1])
+
+    def test_compare_flags_latency_memory_and_query_regressions(self):
+        from benchmarks.suite import compare, summarize
+
+        case = {**summarize([1_000_000] * 9 + [2_000_000]), "queries": 2, "peak_kib": 100.0}
+        self.assertEqual((case["p50_ms"], case["p95_ms"], case["max_ms"]), (1.0, 2.0, 2.0))
+        baseline = {"scales": {"10k": {"GET /api/relais/": case, "GET /api/patients/": {"skipped": "..."}}}}
+        slower = {"scales": {"10k": {
+            "GET /api/relais/": {**case, "p95_ms": 2.3, "queries": 3, "peak_kib": 130.0},
+            "GET /api/patients/": case,
+            "nouveau": case,
+        }}}
+        self.assertEqual(compare(baseline, baseline, 0.2), [])
+        self.assertEqual(compare(slower, baseline, 0.2), [
+            ("10k/GET /api/relais/", "peak_kib", 100.0, 130.0),
+            ("10k/GET /api/relais/", "queries", 2, 3),
+        ])
+        self.assertEqual(len(compare(slower, baseline, 0.1)), 2)  # +0,3 ms : sous le seuil absolu
+        self.assertEqual(len(compare(slower, baseline, 0.1, min_delta_ms=0.1)), 3)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        REGISTRY.reset()
+        self.relais = BaseRelais.objects.create(nom="R", village="V", telephone="1")
+
+    def metrics(self):
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        return resp.content.decode()
+
+    def test_records_latency_queries_size_and_engine_time_per_url_name(self):
+        size = len(self.client.get("/api/relais/").content)
+        self.client.post("/api/triage/", {"symptomes": {"fievre": True}}, content_type="application/json")
+        self.client.get("/api/inconnu/")
+        body = self.metrics()
+        self.assertIn('assistant_http_requests_total{view="relais-list",method="GET",status="200"} 1', body)
+        self.assertIn('assistant_http_requests_total{view="triage",method="POST",status="200"} 1', body)
+        self.assertIn('assistant_http_requests_total{view="unmatched",method="GET",status="404"} 1', body)
+        self.assertIn('assistant_http_request_duration_seconds_count{view="relais-list",method="GET"} 1', body)
+        # Liste : agrégat de l'ETag + SELECT des relais
+        self.assertIn('assistant_db_queries_per_request_bucket{view="relais-list",le="2"} 1', body)
+        self.assertIn('assistant_db_queries_per_request_bucket{view="relais-list",le="1"} 0', body)
+        self.assertIn(f'assistant_http_response_size_bytes_sum{{view="relais-list"}} {size}.000000', body)
+        self.assertIn('assistant_engine_duration_seconds_count{view="triage"} 1', body)
+        self.assertNotIn('assistant_engine_duration_seconds_count{view="relais-list"}', body)
+        self.assertNotIn('view="metrics"', body)
+
+    async def test_async_views_count_queries_and_engine_time(self):
+        client = AsyncClient()
+        await client.post("/api/async/triage/", {"symptomes": {"fievre": True}, "save": True}, content_type="application/json")
+        body = REGISTRY.render()
+        self.assertIn('assistant_engine_duration_seconds_count{view="async-triage"} 1', body)
+        self.assertIn('assistant_db_queries_per_request_bucket{view="async-triage",le="0"} 0', body)
+
+    def test_slow_requests_are_profiled_when_enabled(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with override_settings(METRICS={"PROFILE_SLOW_MS": 0, "PROFILE_SAMPLE_RATE": 1.0, "PROFILE_DIR": tmp}):
+                self.client.get("/api/relais/")
+            profiles = list(Path(tmp).glob("*-relais-list-*.prof"))
+            self.assertEqual(len(profiles), 1)
+        self.assertIn("assistant_profiles_written_total 1", REGISTRY.render())
+
+    def test_disabled(self):
+        with override_settings(METRICS={"ENABLED": False}):
+            self.client.get("/api/relais/")
+        self.assertNotIn("relais-list", REGISTRY.render())
+
+
+class ProtocolSearchTests(TestCase):
+    def search(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return [r["id"] for r in resp.json()["results"]]
+
+    def test_accent_and_spelling_folding(self):
+        for q in ("arthémisinine", "artemisinine", "ARTÉMISININE"):
+            self.assertEqual(self.search(f"/api/protocols/search?q={q}"), ["MALARIA_TREATMENT"])
+        self.assertEqual(self.search("/api/protocols/search/?q=diarrhee%20zinc")[0], "DIARRHEA_TREATMENT")
+        self.assertEqual(self.search("/api/protocols/search?q=moustiquaires"), ["MALARIA_PREVENTION"])
+
+    def test_ranking_prefix_and_filters(self):
+        resp = self.client.get("/api/protocols/search", {"q": "convulsions"}).json()
+        self.assertEqual(resp["count"], 3)
+        scores = [r["score"] for r in resp["results"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(self.search("/api/protocols/search?q=pneumo"), ["ARI_TREATMENT"])
+        self.assertEqual(self.search("/api/protocols/search?q=convulsions&disease=grossesse"), ["PREGNANCY_DANGER_SIGNS"])
+        self.assertEqual(self.search("/api/protocols/search?q=convulsions&limit=1"), ["MALARIA_TREATMENT"])
+        self.assertEqual(self.search("/api/protocols/search?q=de%20la"), [])
+        self.assertEqual(self.client.get("/api/protocols/search").status_code, 400)
+
+    def test_index_rebuilt_when_file_changes(self):
+        from .protocols import get_store
+
+        protocol = {"id": "X", "disease": "d", "category": "c", "title": "Phénomène", "content": "", "keywords": []}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "protocols.json"
+            path.write_text(json.dumps({"protocols": [protocol]}), encoding="utf-8")
+            with override_settings(CARE_PROTOCOLS_FILE=path):
+                self.assertEqual(self.search("/api/protocols/search?q=fenomene"), ["X"])
+                index = get_store().index()
+                self.assertIs(get_store().index(), index)
+                path.write_text(json.dumps({"protocols": [{**protocol, "id": "Y"}]}), encoding="utf-8")
+                os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+                self.assertEqual(self.search("/api/protocols/search?q=fenomene"), ["Y"])
+                # Fichier en cours d'édition puis absent : le dernier index valide reste servi
+                path.write_text("{", encoding="utf-8")
+                os.utime(path, ns=(time.time_ns(), time.time_ns() + 2_000_000_000))
+                self.assertEqual(self.search("/api/protocols/search?q=fenomene"), ["Y"])
+                path.unlink()
+                self.assertEqual(self.search("/api/protocols/search?q=fenomene"), ["Y"])
+            with override_settings(CARE_PROTOCOLS_FILE=Path(tmp) / "absent.json"):
+                self.assertEqual(self.client.get("/api/protocols/search?q=fenomene").status_code, 503)
@@ -1,7 +1,9 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 from drf_spectacular.views import SpectacularSwaggerView, SpectacularRedocView
-from .views import PatientViewSet,BaseRelaisViewSet, DiagnosticPaludismeViewSet, TriageSessionViewSet, TriageAPIView, InteractiveTriageStartAPIView, InteractiveTriageAnswerAPIView, SyncCommitAPIView
+from django.views.decorators.csrf import csrf_exempt
+from .async_views import AsyncInteractiveAnswerView, AsyncInteractiveStartView, AsyncSyncCommitView, AsyncTriageView
+from .views import PatientViewSet,BaseRelaisViewSet, DiagnosticPaludismeViewSet, TriageSessionViewSet, TriageAPIView, TriageBatchAPIView, InteractiveTriageStartAPIView, InteractiveTriageAnswerAPIView, SyncCommitAPIView, SyncPullAPIView, SyncQueueStatsAPIView, StatsAPIView, OutbreakAlertsAPIView, ExportAPIView, ProtocolSearchAPIView
 
 router = DefaultRouter()
 router.register(r'patients', PatientViewSet, basename='patient' )
@@ -12,9 +14,21 @@ router.register(r'triages', TriageSessionViewSet, basename='triagesession')
 urlpatterns = [
     path('', include(router.urls)),
     path('triage/', TriageAPIView.as_view(), name='triage'),
+	path('triage/batch/', TriageBatchAPIView.as_view(), name='triage-batch'),
 	path('triage/start/', InteractiveTriageStartAPIView.as_view(), name='triage-start'),
 	path('triage/<int:session_id>/answer/', InteractiveTriageAnswerAPIView.as_view(), name='triage-answer'),
 	path('sync/commit/', SyncCommitAPIView.as_view(), name='sync-commit'),
+	path('sync/pull/', SyncPullAPIView.as_view(), name='sync-pull'),
+	path('sync/queue/stats/', SyncQueueStatsAPIView.as_view(), name='sync-queue-stats'),
+	path('stats/', StatsAPIView.as_view(), name='stats'),
+	path('outbreaks/alerts/', OutbreakAlertsAPIView.as_view(), name='outbreak-alerts'),
+	path('export/<slug:dataset>/', ExportAPIView.as_view(), name='export'),
+	re_path(r'^protocols/search/?$', ProtocolSearchAPIView.as_view(), name='protocol-search'),
+	# Variantes asynchrones (ASGI) : même contrat, voir apps/async_views.py ; exemptées CSRF comme les vues DRF
+	path('async/triage/', csrf_exempt(AsyncTriageView.as_view()), name='async-triage'),
+	path('async/triage/start/', csrf_exempt(AsyncInteractiveStartView.as_view()), name='async-triage-start'),
+	path('async/triage/<int:session_id>/answer/', csrf_exempt(AsyncInteractiveAnswerView.as_view()), name='async-triage-answer'),
+	path('async/sync/commit/', csrf_exempt(AsyncSyncCommitView.as_view()), name='async-sync-commit'),
     path('schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),  # root -> docs
     path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 ]
\ No newline at end of file
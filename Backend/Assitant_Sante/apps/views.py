@@ -9,6 +9,8 @@ from .serializers import (
 	TriageSessionSerializer,
 	TriageRequestSerializer,
 	TriageResponseSerializer,
+	TriageBatchRequestSerializer,
+	TriageBatchResponseSerializer,
 	InteractiveStartSerializer,
 	InteractiveStartResponseSerializer,
 	InteractiveAnswerSerializer,
@@ -16,11 +18,34 @@ from .serializers import (
 	InteractiveAnswerFinalResponseSerializer,
 	SyncBatchRequestSerializer,
 	SyncBatchResponseSerializer,
+	SyncPullResponseSerializer,
+	StatsQuerySerializer,
+	StatsResponseSerializer,
+	OutbreakAlertsResponseSerializer,
+	ExportQuerySerializer,
+	SyncQueueStatsSerializer,
+	ProtocolSearchQuerySerializer,
+	ProtocolSearchResponseSerializer,
 )
 from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .decision_engine import triage, next_question, is_completed
+from rest_framework.settings import api_settings
+from .pagination import DiagnosticCursorPagination
+from .conditional import ConditionalGetMixin
+from .interactive import SessionStateLost, answer_session, first_question, load_state, start_session
+from .decision_trees import TreeError, get_tree
+from .exports import EXPORTS, export_queryset, stream_rows
+from .outbreaks import get_detector
+from .protocols import ProtocolsUnavailable, search_protocols
+from .parsers import BINARY_PARSERS
+from .renderers import BINARY_RENDERERS, CSVRenderer, NDJSONRenderer
+from .rollups import query_stats
+from .sync_worker import queue_stats
+from .sync import InvalidCursor, PULL_DEFAULT_LIMIT, apply_operations, apply_operations_bulk, pull_changes
+from .decision_engine import triage, triage_batch
 try:
 	from drf_spectacular.utils import extend_schema  # type: ignore[import]
 except Exception:
@@ -32,7 +57,12 @@ except Exception:
 		return decorator
 
 
-class BaseRelaisViewSet(viewsets.ModelViewSet):
+# Endpoints des clients mobiles : JSON ou MessagePack (si le module est installé), au choix du client
+WIRE_PARSERS = [*api_settings.DEFAULT_PARSER_CLASSES, *BINARY_PARSERS]
+WIRE_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, *BINARY_RENDERERS]
+
+
+class BaseRelaisViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = BaseRelais.objects.all()
     serializer_class = BaseRelaisSerializer
 
@@ -45,13 +75,16 @@ class PatientViewSet(BaseRelaisViewSet):
 
 class DiagnosticPaludismeViewSet(BaseRelaisViewSet):
 	serializer_class = DiagnosticPaludismeSerializer
+	pagination_class = DiagnosticCursorPagination
+	conditional_related = ('patient',)  # patient_detail
 
 	def get_queryset(self):
-		return DiagnosticPaludisme.objects.all().order_by('-date')
+		# patient_detail est imbriqué : joindre patient et relais évite une requête par ligne
+		return DiagnosticPaludisme.objects.select_related('patient', 'relais').order_by('-date', '-id')
 
 	@action(detail=False, methods=['get'], url_path='patient/(?P<patient_id>[^/.]+)/latest')
 	def latest_for_patient(self, request, patient_id=None):
-		diag = DiagnosticPaludisme.objects.filter(patient_id=patient_id).order_by('-date').first()
+		diag = DiagnosticPaludisme.objects.select_related('patient', 'relais').filter(patient_id=patient_id).order_by('-date').first()
 		if not diag:
 			return Response({'detail': 'Aucun diagnostic'}, status=404)
 		serializer = self.get_serializer(diag)
@@ -72,6 +105,8 @@ class SyncQueueViewSet(BaseRelaisViewSet):
 	description="Calcul immédiat des hypothèses à partir du paquet de symptômes. Option save=true pour stocker la session.")
 class TriageAPIView(generics.GenericAPIView):
 	serializer_class = TriageRequestSerializer
+	parser_classes = WIRE_PARSERS
+	renderer_classes = WIRE_RENDERERS
 
 	def post(self, request):
 		ser = self.get_serializer(data=request.data)
@@ -96,6 +131,40 @@ class TriageAPIView(generics.GenericAPIView):
 		return Response(result, status=200)
 
 
+@extend_schema(
+	request=TriageBatchRequestSerializer,
+	responses={200: TriageBatchResponseSerializer},
+	summary="Triage par lot",
+	description="Calcule les hypothèses de N paquets de symptômes en une requête (score vectorisé). Option save=true pour stocker toutes les sessions avec un seul bulk_create.")
+class TriageBatchAPIView(generics.GenericAPIView):
+	serializer_class = TriageBatchRequestSerializer
+	parser_classes = WIRE_PARSERS
+	renderer_classes = WIRE_RENDERERS
+
+	def post(self, request):
+		ser = self.get_serializer(data=request.data)
+		ser.is_valid(raise_exception=True)
+		records = ser.validated_data['records']
+		results = triage_batch(
+			(rec.get('symptomes', {}), rec.get('poids'), rec.get('rdt_result')) for rec in records
+		)
+		if ser.validated_data.get('save') and records:
+			sessions = TriageSession.objects.bulk_create([
+				TriageSession(
+					patient_id=rec.get('patient'),
+					relais_id=rec.get('relais'),
+					symptomes=rec.get('symptomes', {}),
+					engine_output=result,
+					rdt_result=rec.get('rdt_result'),
+					poids_utilise=rec.get('poids'),
+				)
+				for rec, result in zip(records, results)
+			])
+			for session, result in zip(sessions, results):
+				result['session_id'] = session.id
+		return Response({'results': results}, status=200)
+
+
 class TriageSessionViewSet(BaseRelaisViewSet):
 	serializer_class = TriageSessionSerializer
 
@@ -115,6 +184,12 @@ class InteractiveTriageStartAPIView(generics.GenericAPIView):
 		ser = self.get_serializer(data=request.data)
 		ser.is_valid(raise_exception=True)
 		data = ser.validated_data
+		tree = None
+		if data.get('tree'):
+			try:
+				tree = get_tree(data['tree'])
+			except TreeError as e:
+				return Response({'detail': str(e)}, status=400)
 		session = TriageSession.objects.create(
 			patient_id=data.get('patient'),
 			relais_id=data.get('relais'),
@@ -123,155 +198,32 @@ class InteractiveTriageStartAPIView(generics.GenericAPIView):
 			rdt_result=data.get('rdt_result'),
 			poids_utilise=data.get('poids'),
 			answered={},
+			tree=tree.key if tree else '',
 		)
-		first_q = next_question(session.answered)
-		return Response({"session_id": session.id, "question": first_q}, status=201)
+		state = start_session(session)
+		return Response(first_question(session.id, state), status=201)
 
 
 @extend_schema(
 	request=InteractiveAnswerSerializer,
 	responses={200: InteractiveAnswerFinalResponseSerializer},
-	summary="Répondre à une question",
-	description="Enregistre une réponse et renvoie la suivante ou le diagnostic final.")
+	summary="Répondre à une ou plusieurs questions",
+	description="Enregistre une réponse (`question`/`value`) ou une liste ordonnée (`answers`) en un seul aller-retour. Les réponses sont appliquées dans l'ordre jusqu'à la complétion (ex. signe de danger) ; le moteur n'est appelé qu'une fois. Renvoie la question suivante ou le diagnostic final.")
 class InteractiveTriageAnswerAPIView(generics.GenericAPIView):
+	"""L'état vit dans le store de sessions ; la base n'est écrite qu'à la complétion (ou aux checkpoints)."""
 	serializer_class = InteractiveAnswerSerializer
 
 	def post(self, request, session_id: int):
 		ser = self.get_serializer(data=request.data)
 		ser.is_valid(raise_exception=True)
-		data = ser.validated_data
 		try:
-			session = TriageSession.objects.get(id=session_id)
-		except TriageSession.DoesNotExist:
+			state = load_state(session_id)
+		except SessionStateLost as e:
+			return Response(e.payload(), status=409)
+		if state is None:
 			return Response({'detail': 'Session introuvable'}, status=404)
-
-		if session.completed:
-			return Response({'detail': 'Session déjà terminée', 'final_output': session.final_output}, status=200)
-
-		question = data.get('question')
-		raw_value = data.get('value')
-		if question is None:
-			return Response({'detail': 'question requise'}, status=400)
-
-		# Validation & conversion des types attendus
-		QUESTION_TYPES = {
-			'fievre': 'bool',
-			'frissons': 'bool',
-			'temperature': 'number',
-			'duree_fievre_jours': 'number',
-			'convulsions': 'bool',
-			'prostration': 'bool',
-			'incapacite_a_manger': 'bool',
-			'toux': 'bool',
-			'diarrhee': 'bool',
-			'vomissements': 'bool',
-			'paludisme_recent': 'bool',
-		}
-
-		expected_type = QUESTION_TYPES.get(question)
-		if expected_type is None:
-			return Response({'detail': f'Question inconnue: {question}'}, status=400)
-
-		def to_bool(v):
-			if isinstance(v, bool):
-				return v
-			if isinstance(v, str):
-				if v.lower() in ['true','1','oui','vrai','yes','y']:
-					return True
-				if v.lower() in ['false','0','non','faux','no','n']:
-					return False
-			if isinstance(v, (int, float)):
-				return bool(v)
-			raise ValueError('Valeur bool invalide')
-
-		def to_number(v):
-			if isinstance(v, (int,float)):
-				return float(v)
-			if isinstance(v, str):
-				return float(v.replace(',', '.'))
-			raise ValueError('Valeur numérique invalide')
-
-		try:
-			if expected_type == 'bool':
-				value = to_bool(raw_value)
-			else:
-				value = to_number(raw_value)
-		except ValueError as e:
-			return Response({'detail': str(e)}, status=400)
-
-		# Enregistrer la réponse
-		answered = session.answered or {}
-		answered[question] = value
-		session.answered = answered
-
-		# Mettre à jour le snapshot des symptômes (symptômes cumulés)
-		symptomes = session.symptomes or {}
-		symptomes[question] = value
-		session.symptomes = symptomes
-
-		# Vérifier la complétion
-		completed_flag = is_completed(answered)
-		session.completed = completed_flag
-
-		if completed_flag:
-			result = triage(symptomes, poids=session.poids_utilise, rdt_result=session.rdt_result)
-			session.engine_output = result
-			session.final_output = result
-			session.save()
-
-			# Auto création DiagnosticPaludisme si palu suspecté
-			hypotheses = result.get('hypotheses', [])
-			top_code = hypotheses[0]['code'] if hypotheses else None
-			if top_code in ['PALU_SIMPLE','PALU_GRAVE']:
-				classification = 'GRAVE' if (top_code == 'PALU_GRAVE' or result.get('danger_signs')) else 'SIMPLE'
-				try:
-					DiagnosticPaludisme.objects.create(
-						patient=session.patient,
-						relais=session.relais,
-						symptomes=session.symptomes,
-						test_type='RDT' if session.rdt_result else 'NONE',
-						test_result=session.rdt_result,
-						classification=classification,
-						danger_signs={'signs': result.get('danger_signs', [])},
-						recommendation=result.get('recommendation'),
-						protocol_version='v1',
-					)
-				except Exception as diag_err:
-					# On retourne quand même le résultat, mais avec info erreur diag
-					return Response({
-						'completed': True,
-						'final_output': result,
-						'session_id': session.id,
-						'diagnostic_created': False,
-						'diagnostic_error': str(diag_err),
-					}, status=200)
-				return Response({
-					'completed': True,
-					'final_output': result,
-					'session_id': session.id,
-					'diagnostic_created': True,
-				}, status=200)
-
-			return Response({
-				'completed': True,
-				'final_output': result,
-				'session_id': session.id,
-				'diagnostic_created': False,
-			}, status=200)
-		else:
-			# aperçu des hypothèses provisoires
-			preview = triage(symptomes, poids=session.poids_utilise, rdt_result=session.rdt_result)
-			session.engine_output = preview
-			next_q = next_question(answered)
-			session.save()
-			return Response({
-				'completed': False,
-				'next_question': next_q,
-				'preview_hypotheses': preview.get('hypotheses'),
-				'danger_signs': preview.get('danger_signs'),
-				'session_id': session.id
-			}, status=200)
-
+		payload, status_code = answer_session(session_id, state, ser.validated_data)
+		return Response(payload, status=status_code)
 
 
 @extend_schema(
@@ -287,88 +239,127 @@ class SyncCommitAPIView(views.APIView):
 	  "operations": [
 		 {"client_id": "tmp-1", "model": "Patient", "operation": "CREATE", "data": {...}},
 		 {"client_id": "tmp-2", "model": "DiagnosticPaludisme", "operation": "CREATE", "data": {...}}
-	  ]
+	  ],
+	  "bulk": false
 	}
+
+	Avec "bulk": true, les opérations sont groupées par modèle et type puis appliquées avec
+	bulk_create / bulk_update (voir `apps.sync.apply_operations_bulk`).
+
+	Le lot peut aussi être envoyé en MessagePack (`Content-Type: application/x-msgpack`,
+	`; keys=v1` pour les clés indexées, voir `apps.renderers`).
 	"""
+	parser_classes = WIRE_PARSERS
+	renderer_classes = WIRE_RENDERERS
 
 	def post(self, request):
 		serializer = SyncBatchRequestSerializer(data=request.data)
 		serializer.is_valid(raise_exception=True)
 		ops = serializer.validated_data['operations']
 
-		results = []
-
-		# Essayez d'appliquer toutes les opérations dans une transaction de base de données pour maintenir l'atomicité autant que possible
-		with transaction.atomic():
-			for op in ops:
-				client_id = op.get('client_id')
-				model_name = op.get('model')
-				operation = op.get('operation')
-				data = op.get('data')
-				idemp = op.get('idempotency_key')
-
-				res = {'client_id': client_id, 'status': 'error'}
-
-				try:
-					if model_name == 'Patient':
-						if operation == 'CREATE':
-							# validate relais existence via serializer
-							ser = PatientSerializer(data=data)
-							ser.is_valid(raise_exception=True)
-							obj = ser.save()
-							SyncQueue.objects.create(model_name='Patient', object_id=str(obj.id), operation='CREATE', data=data, synced=True)
-							res.update({'status': 'ok', 'server_id': obj.id})
-						elif operation == 'UPDATE':
-							obj = Patient.objects.get(id=data.get('id'))
-							ser = PatientSerializer(obj, data=data, partial=True)
-							ser.is_valid(raise_exception=True)
-							ser.save()
-							SyncQueue.objects.create(model_name='Patient', object_id=str(obj.id), operation='UPDATE', data=data, synced=True)
-							res.update({'status': 'ok', 'server_id': obj.id})
-						elif operation == 'DELETE':
-							obj = Patient.objects.get(id=data.get('id'))
-							obj.delete()
-							SyncQueue.objects.create(model_name='Patient', object_id=str(data.get('id')), operation='DELETE', data=data, synced=True)
-							res.update({'status': 'ok'})
-						else:
-							res.update({'error': 'Unknown operation'})
-
-					elif model_name == 'DiagnosticPaludisme':
-						if operation == 'CREATE':
-							ser = DiagnosticPaludismeSerializer(data=data)
-							ser.is_valid(raise_exception=True)
-							obj = ser.save()
-							SyncQueue.objects.create(model_name='DiagnosticPaludisme', object_id=str(obj.id), operation='CREATE', data=data, synced=True)
-							res.update({'status': 'ok', 'server_id': obj.id})
-						else:
-							res.update({'error': 'Only CREATE supported for DiagnosticPaludisme in batch'})
-
-					elif model_name == 'TriageSession':
-						if operation == 'CREATE':
-							ser = TriageSessionSerializer(data=data)
-							ser.is_valid(raise_exception=True)
-							obj = ser.save()
-							SyncQueue.objects.create(model_name='TriageSession', object_id=str(obj.id), operation='CREATE', data=data, synced=True)
-							res.update({'status': 'ok', 'server_id': obj.id})
-						elif operation == 'UPDATE':
-							obj = TriageSession.objects.get(id=data.get('id'))
-							ser = TriageSessionSerializer(obj, data=data, partial=True)
-							ser.is_valid(raise_exception=True)
-							ser.save()
-							SyncQueue.objects.create(model_name='TriageSession', object_id=str(obj.id), operation='UPDATE', data=data, synced=True)
-							res.update({'status': 'ok', 'server_id': obj.id})
-						else:
-							res.update({'error': 'Unsupported operation for TriageSession'})
-
-					else:
-						res.update({'error': f'Unsupported model: {model_name}'})
-
-				except Exception as e:
-					# enregistrer l'échec dans SyncQueue pour le débogage
-					SyncQueue.objects.create(model_name=model_name, object_id=str(data.get('id') or ''), operation=operation, data=data, synced=False)
-					res.update({'status': 'error', 'error': str(e)})
-
-				results.append(res)
+		if serializer.validated_data.get('bulk'):
+			results = apply_operations_bulk(ops)
+		else:
+			results = apply_operations(ops)
 
 		return Response({'results': results}, status=200)
 
+
+@extend_schema(
+	responses={200: SyncPullResponseSerializer},
+	summary="Pull incrémental",
+	description="Retourne les Patient, BaseRelais, DiagnosticPaludisme et TriageSession modifiés après le curseur `since`, plus les suppressions (`deleted`). Pages bornées par `limit` ; renvoyer `next` tant que `has_more` est vrai, puis le conserver pour la synchronisation suivante.")
+class SyncPullAPIView(views.APIView):
+	renderer_classes = WIRE_RENDERERS
+
+	def get(self, request):
+		try:
+			limit = int(request.query_params.get('limit', PULL_DEFAULT_LIMIT))
+			page = pull_changes(request.query_params.get('since') or None, limit=limit)
+		except (InvalidCursor, ValueError) as e:
+			return Response({'detail': str(e)}, status=400)
+		return Response(page, status=200)
+
+
+@extend_schema(
+	parameters=[StatsQuerySerializer],
+	responses={200: StatsResponseSerializer},
+	summary="Statistiques paludisme",
+	description="Comptes par jour / village / relais / classification et taux de positivité RDT, lus dans les agrégats journaliers (30 derniers jours par défaut). `group_by` : dimensions séparées par des virgules.")
+class StatsAPIView(views.APIView):
+
+	def get(self, request):
+		ser = StatsQuerySerializer(data=request.query_params)
+		ser.is_valid(raise_exception=True)
+		data = ser.validated_data
+		stats = query_stats(data['start'], data['end'], village=data.get('village'), relais=data.get('relais'),
+			group_by=data['group_by'])
+		return Response(stats, status=200)
+
+
+@extend_schema(
+	responses={200: SyncQueueStatsSerializer},
+	summary="État de la file de rejeu",
+	description="Profondeur de SyncQueue pour le worker `run_sync_worker` : opérations en échec en attente, éligibles au rejeu (backoff écoulé), abandonnées, et âge de la plus ancienne.")
+class SyncQueueStatsAPIView(views.APIView):
+
+	def get(self, request):
+		return Response(queue_stats(), status=200)
+
+
+@extend_schema(
+	responses={200: OutbreakAlertsResponseSerializer},
+	summary="Alertes de flambée",
+	description="Villages dont le nombre de cas suspects du jour dépasse la ligne de base (pic, EWMA) ou dont la dérive cumulée (CUSUM) dépasse le seuil. `?all=1` renvoie l'état de tous les villages.")
+class OutbreakAlertsAPIView(views.APIView):
+
+	def get(self, request):
+		include_all = request.query_params.get('all', '').lower() in ('1', 'true', 'oui')
+		return Response({'alerts': get_detector().alerts(include_all=include_all)}, status=200)
+
+
+@extend_schema(
+	parameters=[ProtocolSearchQuerySerializer],
+	responses={200: ProtocolSearchResponseSerializer},
+	summary="Recherche dans les protocoles de soins",
+	description="Recherche plein texte (index inversé, classement BM25) dans `assets/protocols/care_protocols.json`, insensible aux accents et aux graphies th/t, ph/f. Le dernier mot est aussi cherché comme préfixe. Filtres `disease` et `category`. 503 si le fichier n'a jamais pu être chargé.")
+class ProtocolSearchAPIView(views.APIView):
+
+	def get(self, request):
+		ser = ProtocolSearchQuerySerializer(data=request.query_params)
+		ser.is_valid(raise_exception=True)
+		data = ser.validated_data
+		try:
+			results = search_protocols(data['q'], limit=data['limit'], disease=data.get('disease'), category=data.get('category'))
+		except ProtocolsUnavailable as e:
+			return Response({'detail': str(e)}, status=503)
+		return Response({'query': data['q'], 'count': len(results), 'results': results}, status=200)
+
+
+@extend_schema(
+	parameters=[ExportQuerySerializer],
+	responses={(200, 'application/x-ndjson'): None, (200, 'text/csv'): None},
+	summary="Export complet en flux",
+	description="Export de `diagnostics` ou `triages` ligne par ligne (NDJSON par défaut, `?format=csv`), colonnes JSON incluses. Filtres `start`/`end` (dates), `village`, `classification` (diagnostics) ; `gzip=true` compresse à la volée.")
+class ExportAPIView(views.APIView):
+	renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+	def get(self, request, dataset):
+		if dataset not in EXPORTS:
+			return Response({'detail': f'Export inconnu: {dataset}'}, status=404)
+		ser = ExportQuerySerializer(data=request.query_params)
+		ser.is_valid(raise_exception=True)
+		data = ser.validated_data
+		if data.get('classification') and dataset != 'diagnostics':
+			return Response({'classification': ['Filtre réservé aux diagnostics']}, status=400)
+		queryset, columns = export_queryset(dataset, start=data.get('start'), end=data.get('end'),
+			village=data.get('village'), classification=data.get('classification'))
+		renderer = request.accepted_renderer
+		filename = f'{dataset}-{timezone.localdate():%Y%m%d}.{renderer.format}'
+		if data['gzip']:
+			content_type, filename = 'application/gzip', filename + '.gz'
+		else:
+			content_type = f'{renderer.media_type}; charset={renderer.charset}'
+		response = StreamingHttpResponse(stream_rows(queryset, columns, renderer, compress=data['gzip']), content_type=content_type)
+		response['Content-Disposition'] = f'attachment; filename="{filename}"'
+		return response
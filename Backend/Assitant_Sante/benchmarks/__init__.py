@@ -0,0 +1 @@
+"""Micro-benchmarks du backend (lancer depuis Backend/Assitant_Sante : `python -m benchmarks.<module>`)."""
@@ -0,0 +1,152 @@
+"""Test de charge : vues synchrones sous gunicorn (WSGI) vs vues /api/async/ sous uvicorn (ASGI).
+
+Chaque serveur est lancé en sous-processus sur la base de développement (`python manage.py migrate`
+au préalable), puis `--clients` clients concurrents envoient des requêtes pendant `--duration`
+secondes. `--upload-delay` simule une liaison mobile lente : les en-têtes sont envoyés, puis le
+corps après ce délai. Sous WSGI, chaque requête occupe un thread pendant l'envoi ; sous ASGI,
+l'attente se fait dans la boucle d'événements.
+
+uvicorn et gunicorn ne font pas partie des dépendances : un serveur absent est ignoré.
+
+Usage :
+    python -m benchmarks.bench_asgi_wsgi [--clients 50] [--duration 10] [--upload-delay 0.2]
+                                         [--workers 1] [--threads 8]
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# (nom, chemin synchrone, chemin asynchrone, corps)
+SCENARIOS = [
+    ("triage", "/api/triage/", "/api/async/triage/", {
+        "symptomes": {"fievre": True, "frissons": True, "temperature": 38.9}, "poids": 18.5, "rdt_result": "POS",
+    }),
+    ("triage+save", "/api/triage/", "/api/async/triage/", {
+        "symptomes": {"fievre": True, "vomissements": True}, "poids": 12, "save": True,
+    }),
+    ("sync commit", "/api/sync/commit/", "/api/async/sync/commit/", {
+        "bulk": True,
+        "operations": [
+            {"model": "TriageSession", "operation": "CREATE",
+             "data": {"symptomes": {"fievre": True}, "engine_output": {}}}
+            for _ in range(20)
+        ],
+    }),
+]
+
+SERVERS = {
+    # nom -> (module requis, commande, variante des vues servie)
+    "gunicorn (WSGI)": ("gunicorn", lambda port, args: [
+        sys.executable, "-m", "gunicorn", "Assitant_Sante.wsgi:application", "--bind", f"127.0.0.1:{port}",
+        "--workers", str(args.workers), "--worker-class", "gthread", "--threads", str(args.threads),
+        "--log-level", "warning",
+    ], "sync"),
+    "uvicorn (ASGI)": ("uvicorn", lambda port, args: [
+        sys.executable, "-m", "uvicorn", "Assitant_Sante.asgi:application", "--host", "127.0.0.1",
+        "--port", str(port), "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+    ], "async"),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_listening(port: int, timeout=20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"serveur non démarré sur le port {port}")
+
+
+async def post(port: int, path: str, body: bytes, upload_delay: float) -> int:
+    """Un POST HTTP/1.1 sur une connexion neuve ; renvoie le code de statut."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write((
+            f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        ).encode("ascii"))
+        if upload_delay:
+            await writer.drain()
+            await asyncio.sleep(upload_delay)
+        writer.write(body)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def load(port: int, path: str, body: bytes, clients: int, duration: float, upload_delay: float) -> dict:
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await post(port, path, body, upload_delay)
+            except OSError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float("nan")
+
+    return {"rps": len(latencies) / elapsed, "p50": pct(0.50), "p95": pct(0.95), "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--upload-delay", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="threads par worker gunicorn (gthread)")
+    args = parser.parse_args()
+
+    env = {**os.environ, "DJANGO_DEBUG": "False", "DJANGO_ALLOWED_HOSTS": "127.0.0.1"}
+    print(f"{args.clients} clients, {args.duration:.0f}s par scénario, délai d'envoi {args.upload_delay * 1000:.0f} ms")
+    print(f"{'serveur':<16} {'scénario':<12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'erreurs':>8}")
+    for name, (module, command, flavour) in SERVERS.items():
+        if importlib.util.find_spec(module) is None:
+            print(f"{name:<16} ignoré : {module} non installé")
+            continue
+        port = free_port()
+        proc = subprocess.Popen(command(port, args), env=env)
+        try:
+            wait_listening(port)
+            for label, sync_path, async_path, payload in SCENARIOS:
+                path = async_path if flavour == "async" else sync_path
+                r = asyncio.run(load(port, path, json.dumps(payload).encode(), args.clients, args.duration, args.upload_delay))
+                print(f"{name:<16} {label:<12} {r['rps']:9,.0f} {r['p50']:9.1f} {r['p95']:9.1f} {r['errors']:8}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
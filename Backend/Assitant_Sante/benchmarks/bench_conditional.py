@@ -0,0 +1,82 @@
+"""Octets transférés et temps serveur : réponse complète, compressée (gzip / brotli) et 304 (If-None-Match).
+
+Les requêtes passent par toute la pile Django (middlewares compris) via le client de test, sur une
+base de test en mémoire remplie de `--patients` patients et `--diagnostics` diagnostics.
+
+Usage :
+    python -m benchmarks.bench_conditional [--patients 2000] [--diagnostics 5000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import time
+
+
+def seed(patients: int, diagnostics: int) -> None:
+    from apps.models import BaseRelais, DiagnosticPaludisme, Patient
+
+    rng = random.Random(42)
+    relais = BaseRelais.objects.bulk_create([BaseRelais(nom=f"R{i}", village=f"V{i % 10}", telephone=str(i)) for i in range(20)])
+    rows = Patient.objects.bulk_create([
+        Patient(code=f"P-{i}", nom=f"Patient {i}", age=rng.randint(0, 80), sexe=rng.choice("MF"),
+                village=f"V{i % 10}", relais=rng.choice(relais))
+        for i in range(patients)
+    ])
+    DiagnosticPaludisme.objects.bulk_create([
+        DiagnosticPaludisme(patient=p, relais=p.relais, symptomes={"fievre": True, "frissons": rng.random() < 0.5},
+                            classification=rng.choice(["SIMPLE", "GRAVE", "NON_SUSPECT"]), test_result="POS",
+                            recommendation="ACT selon le poids")
+        for p in (rng.choice(rows) for _ in range(diagnostics))
+    ])
+
+
+def measure(client, url, repeat, **headers) -> tuple:
+    """(octets du corps, temps serveur médian en ms)."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        resp = client.get(url, **headers)
+        timings.append(time.perf_counter() - started)
+    body = b"".join(resp.streaming_content) if resp.streaming else resp.content
+    timings.sort()
+    return resp.status_code, len(body), timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--diagnostics", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Assitant_Sante.settings")
+    import django
+
+    django.setup()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    from apps.middleware import brotli
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, serialize=False)
+    seed(args.patients, args.diagnostics)
+    client = Client()
+
+    variants = [("complète", {}), ("gzip", {"HTTP_ACCEPT_ENCODING": "gzip"})]
+    if brotli is not None:
+        variants.append(("brotli", {"HTTP_ACCEPT_ENCODING": "br, gzip"}))
+    print(f"{args.patients} patients, {args.diagnostics} diagnostics, médiane sur {args.repeat} requêtes")
+    print(f"{'endpoint':<34} {'réponse':<10} {'statut':>6} {'octets':>10} {'ms':>8}")
+    for url in ("/api/relais/", "/api/patients/", "/api/diagnostics/?page_size=500"):
+        etag = client.get(url)["ETag"]
+        for label, headers in variants + [("304", {"HTTP_IF_NONE_MATCH": etag, "HTTP_ACCEPT_ENCODING": "gzip"})]:
+            status, size, ms = measure(client, url, args.repeat, **headers)
+            print(f"{url:<34} {label:<10} {status:>6} {size:>10,} {ms:8.2f}")
+    if brotli is None:
+        print("brotli non installé (pip install brotli) : gzip seul")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Débit du sync commit en écritures concurrentes, selon le profil de base de données.
+
+Chaque profil tourne dans un sous-processus sur une base de test neuve (fichier temporaire pour
+SQLite, base `test_<nom>` pour PostgreSQL). `--threads` threads, chacun avec sa connexion,
+appliquent `--batches` lots de `--size` créations de patients via `apply_operations_bulk`.
+
+Profils :
+- sqlite-legacy : SQLite sans options (journal rollback, BEGIN différé), l'ancienne configuration ;
+- sqlite : profil SQLite de settings.py (WAL, synchronous=NORMAL, timeout, mmap, BEGIN IMMEDIATE) ;
+- postgres : profil PostgreSQL (DJANGO_DB_ENGINE=postgres et variables DJANGO_DB_*), si psycopg est installé.
+
+Usage :
+    python -m benchmarks.bench_db_concurrency [--threads 8] [--batches 20] [--size 25]
+                                              [--profiles sqlite-legacy,sqlite,postgres]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = ("sqlite-legacy", "sqlite", "postgres")
+
+
+def run_profile(profile, args) -> dict:
+    """Exécuté dans le sous-processus : configure la base, puis lance les threads écrivains."""
+    import django
+    from django.conf import settings
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Assitant_Sante.settings")
+    db = settings.DATABASES["default"]
+    if profile.startswith("sqlite"):
+        db["TEST"] = {"NAME": os.path.join(args.tmpdir, f"{profile}.sqlite3")}
+        if profile == "sqlite-legacy":
+            db["OPTIONS"] = {}
+    django.setup()
+
+    from django.db import OperationalError, connection, connections
+    from apps.models import BaseRelais, Patient
+    from apps.sync import apply_operations_bulk
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    relais = [BaseRelais.objects.create(nom=f"R{i}", village="V", telephone=str(i)) for i in range(args.threads)]
+    connections.close_all()
+
+    ok = errors = 0
+    latencies = []
+    lock = threading.Lock()
+
+    def writer(relais_id):
+        nonlocal ok, errors
+        for b in range(args.batches):
+            ops = [
+                {"client_id": f"{relais_id}-{b}-{i}", "model": "Patient", "operation": "CREATE",
+                 "data": {"nom": f"N{i}", "age": 3, "sexe": "F", "village": "V", "relais": relais_id}}
+                for i in range(args.size)
+            ]
+            started = time.perf_counter()
+            try:
+                results = apply_operations_bulk(ops)
+                good = sum(r["status"] == "ok" for r in results)
+            except OperationalError:
+                good = 0
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                ok += good
+                errors += args.size - good
+        connections.close_all()
+
+    threads = [threading.Thread(target=writer, args=(r.id,)) for r in relais]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    stored = Patient.objects.count()
+    connection.creation.destroy_test_db(verbosity=0)
+    latencies.sort()
+    return {
+        "rows_per_s": ok / elapsed,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "ok": ok,
+        "errors": errors,
+        "stored": stored,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--size", type=int, default=25)
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--run", choices=PROFILES, help=argparse.SUPPRESS)
+    parser.add_argument("--tmpdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_profile(args.run, args)))
+        return
+
+    print(f"{args.threads} threads x {args.batches} lots x {args.size} créations")
+    print(f"{'profil':<14} {'lignes/s':>10} {'p95 lot ms':>11} {'ok':>7} {'erreurs':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for profile in args.profiles.split(","):
+            env = dict(os.environ)
+            if profile == "postgres":
+                if importlib.util.find_spec("psycopg") is None and importlib.util.find_spec("psycopg2") is None:
+                    print(f"{profile:<14} ignoré : psycopg non installé")
+                    continue
+                env["DJANGO_DB_ENGINE"] = "postgres"
+            else:
+                env["DJANGO_DB_ENGINE"] = "sqlite"
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_db_concurrency", "--run", profile, "--tmpdir", tmpdir,
+                 "--threads", str(args.threads), "--batches", str(args.batches), "--size", str(args.size)],
+                env=env, capture_output=True, text=True,
+            )
+            if proc.returncode:
+                print(f"{profile:<14} échec : {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"{profile:<14} {r['rows_per_s']:10,.0f} {r['p95_ms']:11.1f} {r['ok']:7} {r['errors']:8}")
+
+
+if __name__ == "__main__":
+    main()
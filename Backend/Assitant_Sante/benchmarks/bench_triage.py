@@ -0,0 +1,56 @@
+"""Micro-benchmark : `compute_hypotheses` (référence) vs moteur compilé.
+
+Usage :
+    python -m benchmarks.bench_triage [--number 20000]
+"""
+import argparse
+import random
+import timeit
+
+from apps.decision_engine import ENGINE, QUESTION_PRIORITIES, compute_hypotheses, triage
+
+
+def sample_inputs(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    inputs = []
+    for _ in range(count):
+        symptoms = {}
+        for q in QUESTION_PRIORITIES:
+            if rng.random() < 0.7:
+                symptoms[q] = round(rng.uniform(36, 41), 1) if q == "temperature" else rng.random() < 0.4
+        inputs.append((symptoms, rng.choice([None, 9.0, 18.5, 42.0]), rng.choice([None, "POS", "NEG"])))
+    return inputs
+
+
+def bench(fn, inputs, number: int) -> float:
+    """Retourner le nombre d'appels par seconde."""
+    n = len(inputs)
+
+    def run():
+        for i in range(number):
+            symptoms, poids, rdt = inputs[i % n]
+            fn(symptoms, poids, rdt)
+
+    elapsed = min(timeit.repeat(run, number=1, repeat=3))
+    return number / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    inputs = sample_inputs(1000)
+    for symptoms, poids, rdt in inputs:
+        assert compute_hypotheses(symptoms, poids, rdt) == triage(symptoms, poids, rdt)
+
+    before = bench(compute_hypotheses, inputs, args.number)
+    compiled = bench(ENGINE.triage, inputs, args.number)
+    after = bench(triage, inputs, args.number)
+    print(f"compute_hypotheses (avant) : {before:12,.0f} appels/s")
+    print(f"moteur compilé             : {compiled:12,.0f} appels/s")
+    print(f"triage() (+ temps moteur)  : {after:12,.0f} appels/s")
+    print(f"accélération               : x{after / before:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Taille et temps de parse / rendu : JSON vs MessagePack vs MessagePack + dictionnaire de clés (keys=v1).
+
+Charges représentatives : un lot /api/sync/commit/ de `--ops` opérations (patients, diagnostics,
+sessions de triage) et une réponse /api/triage/. Tailles brutes et après gzip (transport compressé).
+
+Usage :
+    python -m benchmarks.bench_wire_format [--ops 500] [--number 200]
+"""
+import argparse
+import gzip
+import io
+import os
+import random
+import timeit
+
+
+def sync_batch(count: int, seed: int = 42) -> dict:
+    from apps.decision_engine import QUESTION_PRIORITIES, triage
+
+    rng = random.Random(seed)
+    ops = []
+    for i in range(count):
+        symptoms = {q: rng.random() < 0.4 for q in QUESTION_PRIORITIES if rng.random() < 0.7}
+        kind = i % 3
+        if kind == 0:
+            ops.append({"client_id": f"tmp-{i}", "model": "Patient", "operation": "CREATE", "idempotency_key": f"dev-1:{i}",
+                        "data": {"nom": f"Patient {i}", "age": rng.randint(0, 80), "sexe": rng.choice("MF"),
+                                 "village": f"Village {i % 12}", "relais": 1 + i % 20, "poids_kg": "18.50"}})
+        elif kind == 1:
+            ops.append({"client_id": f"tmp-{i}", "model": "DiagnosticPaludisme", "operation": "CREATE", "idempotency_key": f"dev-1:{i}",
+                        "data": {"patient": 1 + i, "relais": 1 + i % 20, "symptomes": symptoms, "test_type": "RDT",
+                                 "test_result": rng.choice(["POS", "NEG"]), "classification": "SIMPLE",
+                                 "danger_signs": {}, "recommendation": "Initier traitement ACT selon poids."}})
+        else:
+            ops.append({"client_id": f"tmp-{i}", "model": "TriageSession", "operation": "CREATE", "idempotency_key": f"dev-1:{i}",
+                        "data": {"patient": 1 + i, "relais": 1 + i % 20, "symptomes": symptoms,
+                                 "engine_output": triage(symptoms, 18.5, "POS"), "rdt_result": "POS", "poids_utilise": "18.50"}})
+    return {"operations": ops, "bulk": True}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Assitant_Sante.settings")
+    import django
+
+    django.setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from apps.decision_engine import triage
+    from apps.parsers import MessagePackParser
+    from apps.renderers import MessagePackRenderer, msgpack
+
+    if msgpack is None:
+        print("msgpack non installé (pip install msgpack)")
+        return
+
+    formats = [
+        ("JSON", JSONRenderer(), JSONParser(), "application/json"),
+        ("MessagePack", MessagePackRenderer(), MessagePackParser(), "application/x-msgpack"),
+        ("MessagePack keys=v1", MessagePackRenderer(), MessagePackParser(), "application/x-msgpack; keys=v1"),
+    ]
+    payloads = [
+        (f"sync commit ({args.ops} ops)", sync_batch(args.ops), max(1, args.number // 10)),
+        ("réponse triage", triage({"fievre": True, "frissons": True, "temperature": 38.9}, 18.5, "POS"), args.number * 50),
+    ]
+    print(f"{'charge':<24} {'format':<20} {'octets':>9} {'gzip':>8} {'rendu µs':>10} {'parse µs':>10}")
+    for label, data, number in payloads:
+        for name, renderer, parser_, media_type in formats:
+            body = renderer.render(data, media_type, {})
+            render = min(timeit.repeat(lambda: renderer.render(data, media_type, {}), number=number, repeat=3)) / number
+            parse = min(timeit.repeat(lambda: parser_.parse(io.BytesIO(body), media_type, {}), number=number, repeat=3)) / number
+            assert parser_.parse(io.BytesIO(body), media_type, {}) == JSONParser().parse(io.BytesIO(JSONRenderer().render(data)))
+            print(f"{label:<24} {name:<20} {len(body):>9,} {len(gzip.compress(body)):>8,} {render * 1e6:>10.1f} {parse * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Générateur reproductible de population synthétique : relais, patients, diagnostics, sessions de triage.
+
+Pour une graine donnée, le contenu généré est identique d'une exécution à l'autre. Les lignes sont
+insérées par `bulk_create` en lots de `batch_size`, sans signaux. Les agrégats journaliers sont
+ensuite reconstruits par `rebuild()`. Les codes patients suivent le schéma `P{relais}-{n}`, et les
+compteurs `PatientCodeSequence` sont positionnés en conséquence.
+
+Tailles (`population_sizes`) : 1 relais pour 500 patients, 2 diagnostics et 1 session par patient.
+"""
+import random
+from itertools import islice
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}  # nombre de patients
+
+VILLAGES = [f"Village {i}" for i in range(60)]
+CLASSIFICATIONS = (["NON_SUSPECT"] * 12) + (["SIMPLE"] * 7) + ["GRAVE"]
+
+
+def population_sizes(patients: int) -> dict:
+    return {
+        "relais": max(1, patients // 500),
+        "patients": patients,
+        "diagnostics": patients * 2,
+        "sessions": patients,
+    }
+
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def random_symptoms(rng, questions) -> dict:
+    symptoms = {}
+    for q in questions:
+        if rng.random() < 0.6:
+            symptoms[q] = round(rng.uniform(36.0, 40.5), 1) if q == "temperature" else (
+                rng.randint(0, 7) if q == "duree_fievre_jours" else rng.random() < 0.35)
+    return symptoms
+
+
+def generate(patients: int, seed: int = 42, batch_size: int = 5000, rollups: bool = True) -> dict:
+    """Insérer une population de `patients` patients ; renvoie les effectifs créés."""
+    from apps.decision_engine import QUESTION_PRIORITIES, triage
+    from apps.models import BaseRelais, DiagnosticPaludisme, Patient, PatientCodeSequence, TriageSession
+    from apps.rollups import rebuild
+
+    rng = random.Random(seed)
+    sizes = population_sizes(patients)
+
+    relais = BaseRelais.objects.bulk_create([
+        BaseRelais(nom=f"Relais {i}", village=VILLAGES[i % len(VILLAGES)], telephone=f"+22670{i:06d}")
+        for i in range(sizes["relais"])
+    ], batch_size=batch_size)
+    relais_villages = [(r.id, r.village) for r in relais]
+
+    # (id patient, id relais, village) gardés en mémoire : deux entiers et une chaîne partagée par patient
+    patient_rows = []
+    next_code = {}
+    for batch in batched(range(patients), batch_size):
+        objects = []
+        for _ in batch:
+            relais_id, village = rng.choice(relais_villages)
+            n = next_code.get(relais_id, 1)
+            next_code[relais_id] = n + 1
+            objects.append(Patient(
+                code=PatientCodeSequence.format_code(relais_id, n), nom=f"Patient {relais_id}-{n}", age=rng.choice([rng.randint(0, 5), rng.randint(6, 80)]),
+                sexe=rng.choice("MF"), village=village, relais_id=relais_id,
+                poids_kg=round(rng.uniform(3.0, 80.0), 2) if rng.random() < 0.8 else None,
+            ))
+        patient_rows += [(p.id, p.relais_id, p.village) for p in Patient.objects.bulk_create(objects)]
+    PatientCodeSequence.objects.bulk_create(
+        [PatientCodeSequence(relais_id=relais_id, next_value=n) for relais_id, n in next_code.items()],
+        batch_size=batch_size,
+    )
+
+    for batch in batched(range(sizes["diagnostics"]), batch_size):
+        objects = []
+        for _ in batch:
+            patient_id, relais_id, village = rng.choice(patient_rows)
+            classification = rng.choice(CLASSIFICATIONS)
+            objects.append(DiagnosticPaludisme(
+                patient_id=patient_id, relais_id=relais_id, village=village, symptomes=random_symptoms(rng, QUESTION_PRIORITIES),
+                test_type="RDT", test_result=rng.choice(["POS", "NEG"]) if classification != "NON_SUSPECT" else "NEG",
+                classification=classification, recommendation="Initier traitement ACT selon poids.",
+            ))
+        DiagnosticPaludisme.objects.bulk_create(objects)
+
+    for batch in batched(range(sizes["sessions"]), batch_size):
+        objects = []
+        for _ in batch:
+            patient_id, relais_id, _ = rng.choice(patient_rows)
+            symptoms = random_symptoms(rng, QUESTION_PRIORITIES)
+            poids = round(rng.uniform(5.0, 70.0), 1)
+            rdt = rng.choice([None, "POS", "NEG"])
+            completed = rng.random() < 0.9
+            output = triage(symptoms, poids=poids, rdt_result=rdt)
+            objects.append(TriageSession(
+                patient_id=patient_id, relais_id=relais_id, symptomes=symptoms, engine_output=output, rdt_result=rdt,
+                poids_utilise=poids, answered=symptoms, completed=completed, final_output=output if completed else None,
+            ))
+        TriageSession.objects.bulk_create(objects)
+
+    if rollups:
+        rebuild()
+    return sizes
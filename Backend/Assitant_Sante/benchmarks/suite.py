@@ -0,0 +1,299 @@
+"""Suite de performance de bout en bout sur une population synthétique (benchmarks.generator).
+
+Pour chaque échelle (`--scales`), la base de test est vidée et remplie, puis chaque cas est mesuré :
+    triage()                      appel direct du moteur, symptômes tirés au hasard (graine fixe)
+    POST /api/triage/             même charge à travers la pile Django
+    session interactive           start puis une réponse par question jusqu'à la complétion
+    POST /api/sync/commit/        lots de `--batch-sizes` opérations, modes unitaire et bulk
+    GET listes                    relais, patients, diagnostics (curseur), triages, pull, 304
+
+Chaque cas est d'abord exécuté une fois sous CaptureQueriesContext et tracemalloc (requêtes SQL,
+pic mémoire Python). Les latences sont ensuite chronométrées sans instrumentation. Le résultat est
+écrit en JSON (`--output`). Avec `--baseline`, il est comparé à une référence : p95 ou pic mémoire
+au-delà de `--threshold` (écart de p95 d'au moins `--min-delta-ms`), ou requêtes plus nombreuses = régression (code retour 1 avec
+`--fail-on-regression`). `--save-baseline` écrit le résultat comme nouvelle référence. Les listes
+non paginées (patients, triages) sont ignorées au-delà de `--max-unpaginated` lignes.
+
+Usage :
+    python -m benchmarks.suite [--scales 10k] [--seed 42] [--output results.json]
+                               [--baseline benchmarks/baseline.json] [--threshold 0.2] [--min-delta-ms 1] [--fail-on-regression]
+    python -m benchmarks.suite --scales 1k,10k,100k --db-file /tmp/bench.sqlite3
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from .generator import SCALES, generate
+
+DEFAULT_BATCH_SIZES = "1,10,100,500"
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(samples, pct):
+    """Rang le plus proche sur des échantillons triés."""
+    rank = max(0, min(len(samples) - 1, round(pct / 100 * len(samples) + 0.5) - 1))
+    return samples[rank]
+
+
+def summarize(timings_ns) -> dict:
+    samples = sorted(t / 1e6 for t in timings_ns)
+    summary = {f"p{pct}_ms": round(percentile(samples, pct), 4) for pct in PERCENTILES}
+    summary.update(runs=len(samples), mean_ms=round(sum(samples) / len(samples), 4), max_ms=round(samples[-1], 4))
+    return summary
+
+
+def measure(operation, runs: int, warmup: int = 1) -> dict:
+    """Requêtes et pic mémoire d'une exécution instrumentée, puis latences de `runs` exécutions."""
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    for _ in range(warmup):
+        operation()
+    reset_queries()  # journal borné (9000 entrées) : le vider pour que le décompte reste exact
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as ctx:
+        operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter_ns()
+        operation()
+        timings.append(time.perf_counter_ns() - started)
+    return {**summarize(timings), "queries": len(ctx.captured_queries), "peak_kib": round(peak / 1024, 1)}
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float = 1.0) -> list:
+    """Régressions par rapport à la référence : [(échelle/cas, métrique, référence, mesure)].
+
+    Un écart de latence inférieur à `min_delta_ms` est ignoré (bruit sur les cas sub-milliseconde).
+    """
+    regressions = []
+    for scale, cases in results["scales"].items():
+        for name, case in cases.items():
+            ref = baseline.get("scales", {}).get(scale, {}).get(name)
+            if not ref or "skipped" in case or "skipped" in ref:
+                continue
+            if case["p95_ms"] > ref["p95_ms"] * (1 + threshold) and case["p95_ms"] - ref["p95_ms"] >= min_delta_ms:
+                regressions.append((f"{scale}/{name}", "p95_ms", ref["p95_ms"], case["p95_ms"]))
+            if case["peak_kib"] > ref["peak_kib"] * (1 + threshold):
+                regressions.append((f"{scale}/{name}", "peak_kib", ref["peak_kib"], case["peak_kib"]))
+            if case["queries"] > ref["queries"]:
+                regressions.append((f"{scale}/{name}", "queries", ref["queries"], case["queries"]))
+    return regressions
+
+
+def triage_cases(rng, client, runs) -> dict:
+    from apps.decision_engine import QUESTION_PRIORITIES, triage
+
+    from .generator import random_symptoms
+
+    inputs = [(random_symptoms(rng, QUESTION_PRIORITIES), round(rng.uniform(5, 70), 1), rng.choice([None, "POS", "NEG"]))
+              for _ in range(256)]
+    cursor = iter(range(sys.maxsize))
+
+    def call():
+        symptoms, poids, rdt = inputs[next(cursor) % len(inputs)]
+        triage(symptoms, poids=poids, rdt_result=rdt)
+
+    def post():
+        symptoms, poids, rdt = inputs[next(cursor) % len(inputs)]
+        resp = client.post("/api/triage/", {"symptomes": symptoms, "poids": poids, "rdt_result": rdt}, content_type="application/json")
+        assert resp.status_code == 200, resp.content
+
+    return {"triage()": measure(call, runs * 10), "POST /api/triage/": measure(post, runs)}
+
+
+def interactive_case(rng, client, relais_ids, runs) -> dict:
+    def session():
+        resp = client.post("/api/triage/start/", {"relais": rng.choice(relais_ids), "poids": 18.5, "rdt_result": "POS"},
+                           content_type="application/json")
+        assert resp.status_code == 201, resp.content
+        session_id, question = resp.json()["session_id"], resp.json()["question"]
+        while question:
+            value = round(rng.uniform(37, 40), 1) if question == "temperature" else (
+                rng.randint(0, 5) if question == "duree_fievre_jours" else rng.random() < 0.2)
+            resp = client.post(f"/api/triage/{session_id}/answer/", {"question": question, "value": value},
+                               content_type="application/json")
+            assert resp.status_code == 200, resp.content
+            question = None if resp.json()["completed"] else resp.json()["next_question"]
+
+    return {"session interactive": measure(session, runs)}
+
+
+def sync_commit_cases(rng, client, relais_ids, patient_ids, batch_sizes, total_ops) -> dict:
+    counter = iter(range(sys.maxsize))
+
+    def batch(size, bulk):
+        ops = []
+        for _ in range(size):
+            i = next(counter)
+            if i % 2:
+                ops.append({"client_id": f"bench-{i}", "model": "Patient", "operation": "CREATE", "idempotency_key": f"bench:{i}",
+                            "data": {"nom": f"Bench {i}", "age": rng.randint(0, 80), "sexe": rng.choice("MF"),
+                                     "village": f"Village {i % 60}", "relais": rng.choice(relais_ids)}})
+            else:
+                patient_id = rng.choice(patient_ids)
+                ops.append({"client_id": f"bench-{i}", "model": "DiagnosticPaludisme", "operation": "CREATE",
+                            "idempotency_key": f"bench:{i}",
+                            "data": {"patient": patient_id, "relais": rng.choice(relais_ids), "symptomes": {"fievre": True},
+                                     "test_type": "RDT", "test_result": rng.choice(["POS", "NEG"]), "classification": "SIMPLE",
+                                     "recommendation": "Initier traitement ACT selon poids."}})
+        return {"operations": ops, "bulk": bulk}
+
+    cases = {}
+    for size in batch_sizes:
+        for bulk in (False, True):
+            def commit(size=size, bulk=bulk):
+                resp = client.post("/api/sync/commit/", batch(size, bulk), content_type="application/json")
+                assert resp.status_code == 200, resp.content
+                assert all(r["status"] == "ok" for r in resp.json()["results"]), resp.content
+
+            cases[f"POST /api/sync/commit/ x{size}{' bulk' if bulk else ''}"] = measure(commit, max(3, total_ops // size))
+    return cases
+
+
+def list_cases(client, sizes, runs, max_unpaginated) -> dict:
+    endpoints = [
+        ("/api/relais/", sizes["relais"]),
+        ("/api/patients/", sizes["patients"]),
+        ("/api/diagnostics/?page_size=50", None),
+        ("/api/diagnostics/?page_size=500", None),
+        ("/api/triages/", sizes["sessions"]),
+        ("/api/sync/pull/?limit=500", None),
+    ]
+    cases = {}
+    for url, rows in endpoints:
+        if rows is not None and rows > max_unpaginated:
+            cases[f"GET {url}"] = {"skipped": f"{rows} lignes non paginées > --max-unpaginated"}
+            continue
+
+        def get(url=url):
+            resp = client.get(url)
+            assert resp.status_code == 200, resp.status_code
+
+        cases[f"GET {url}"] = measure(get, runs)
+    etag = client.get("/api/relais/")["ETag"]
+    cases["GET /api/relais/ 304"] = measure(lambda: client.get("/api/relais/", HTTP_IF_NONE_MATCH=etag), runs)
+    return cases
+
+
+def metadata(args) -> dict:
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": f"{connection.vendor} {connection.Database.sqlite_version if connection.vendor == 'sqlite' else ''}".strip(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "runs": args.runs,
+        "batch_sizes": args.batch_sizes,
+        "sync_ops": args.sync_ops,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="10k", help=f"échelles séparées par des virgules : {', '.join(SCALES)} ou un nombre de patients")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=50, help="exécutions chronométrées par cas")
+    parser.add_argument("--batch-sizes", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--sync-ops", type=int, default=500, help="opérations sync par taille de lot")
+    parser.add_argument("--max-unpaginated", type=int, default=20_000)
+    parser.add_argument("--db-file", help="base SQLite de test sur disque (défaut : en mémoire)")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolérance relative sur p95 et pic mémoire")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="écart de p95 ignoré en dessous de ce seuil")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--save-baseline", action="store_true", help="écrire aussi le résultat dans --baseline")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Assitant_Sante.settings")
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    from apps.models import BaseRelais, Patient
+
+    setup_test_environment()
+    settings.SYNC_PULL_SAFETY_LAG = 0  # population tout juste générée : la servir au pull mesuré
+    if args.db_file:
+        connection.settings_dict["TEST"]["NAME"] = args.db_file
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    client = Client()
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    results = {"meta": metadata(args), "scales": {}}
+    try:
+        for scale in args.scales.split(","):
+            patients = SCALES.get(scale.lower()) or int(scale)
+            call_command("flush", interactive=False, verbosity=0)
+            started = time.perf_counter()
+            sizes = generate(patients, seed=args.seed)
+            print(f"[{scale}] {sizes} générés en {time.perf_counter() - started:.1f} s")
+            rng = random.Random(args.seed)
+            relais_ids = list(BaseRelais.objects.values_list("id", flat=True))
+            patient_ids = list(Patient.objects.values_list("id", flat=True)[:10_000])
+            cases = {}
+            cases.update(triage_cases(rng, client, args.runs))
+            cases.update(interactive_case(rng, client, relais_ids, args.runs))
+            cases.update(sync_commit_cases(rng, client, relais_ids, patient_ids, batch_sizes, args.sync_ops))
+            cases.update(list_cases(client, sizes, args.runs, args.max_unpaginated))
+            results["scales"][scale] = cases
+            print(f"{'cas':<44} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'requêtes':>9} {'pic KiB':>10}")
+            for name, case in cases.items():
+                if "skipped" in case:
+                    print(f"{name:<44} ignoré : {case['skipped']}")
+                else:
+                    print(f"{name:<44} {case['p50_ms']:>9.3f} {case['p95_ms']:>9.3f} {case['p99_ms']:>9.3f} "
+                          f"{case['queries']:>9} {case['peak_kib']:>10.1f}")
+    finally:
+        if args.db_file:
+            connection.creation.destroy_test_db(verbosity=0)
+
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2, ensure_ascii=False)
+    print(f"Résultats : {args.output}")
+    if not args.baseline:
+        return
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, ensure_ascii=False)
+        print(f"Référence enregistrée : {args.baseline}")
+        return
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    for key in ("seed", "runs", "batch_sizes", "sync_ops"):
+        if baseline["meta"].get(key) != results["meta"][key]:
+            print(f"Attention : {key} = {results['meta'][key]}, référence mesurée avec {baseline['meta'].get(key)}")
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for case, metric, ref, value in regressions:
+        print(f"RÉGRESSION {case} {metric} : {ref} -> {value}")
+    if not regressions:
+        print(f"Aucune régression (tolérance {args.threshold:.0%}) par rapport à {args.baseline}")
+    elif args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
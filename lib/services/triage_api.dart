@@ -41,4 +41,22 @@ class TriageApiClient {
     }
     throw Exception('Answer failed: ${resp.statusCode} ${resp.body}');
   }
+
+  /// Envoie plusieurs réponses (dans l'ordre) en un seul aller-retour.
+  /// Le serveur s'arrête dès que la session est terminée (ex. signe de danger) :
+  /// `applied` / `ignored` indiquent ce qui a été pris en compte.
+  Future<Map<String, dynamic>> answerMany({required int sessionId, required List<MapEntry<String, dynamic>> answers}) async {
+    final uri = Uri.parse('$baseUrl/triage/$sessionId/answer/');
+    final resp = await _client.post(
+      uri,
+      headers: {'Content-Type': 'application/json'},
+      body: jsonEncode({
+        'answers': [for (final a in answers) {'question': a.key, 'value': a.value}],
+      }),
+    );
+    if (resp.statusCode >= 200 && resp.statusCode < 300) {
+      return jsonDecode(resp.body) as Map<String, dynamic>;
+    }
+    throw Exception('Answer failed: ${resp.statusCode} ${resp.body}');
+  }
 }